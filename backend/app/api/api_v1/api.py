@@ -1,21 +1,50 @@
-from fastapi import APIRouter
-from typing import List
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional
+import asyncio
+import json
 import os
+import time
 from pathlib import Path
 import uuid
 from datetime import datetime
 from fastapi import UploadFile, File, HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from ...core.config import settings
+from ...core.metrics import registry
+from ...services.emotion_aggregates import get_emotion_aggregator
+from ...services.model_manager import model_manager
+from ...services.uploads import UploadTooLargeError, save_upload
 from .endpoints import analyze as analyze_endpoint
+from .endpoints import profiling as profiling_endpoint
+from .endpoints import sessions as sessions_endpoint
 
 api_router = APIRouter()
 api_router.include_router(analyze_endpoint.router, prefix="/analyze", tags=["analyze"])
+api_router.include_router(profiling_endpoint.router, prefix="/admin/profile", tags=["admin"])
+api_router.include_router(sessions_endpoint.router, prefix="/sessions", tags=["analytics"])
 
 @api_router.get("/health", tags=["health"])
 async def health_check():
+    """Liveness: the process is up. Does not depend on the model."""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@api_router.get("/ready", tags=["health"])
+async def readiness_check():
+    """
+    Readiness: the model is loaded and warmed up.
+    Returns 503 while loading or after a failed load so load balancers hold traffic back.
+    """
+    status = model_manager.status()
+    status["timestamp"] = datetime.utcnow().isoformat()
+    return JSONResponse(status_code=200 if model_manager.ready else 503, content=status)
+
+@api_router.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the in-process metrics registry."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @api_router.post("/process-video/", tags=["video"])
 async def process_video(file: UploadFile = File(...)):
     """
@@ -28,10 +57,8 @@ async def process_video(file: UploadFile = File(...)):
         filename = f"{uuid.uuid4()}{file_ext}"
         file_path = Path("uploads") / filename
         
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Stream the upload to disk in chunks instead of reading it into memory first
+        await run_in_threadpool(save_upload, file.file, str(file_path), settings.MAX_UPLOAD_SIZE)
         
         # TODO: Process video and extract emotions
         # This is a placeholder response
@@ -41,22 +68,92 @@ async def process_video(file: UploadFile = File(...)):
             "emotion_data": []
         }
         
+    except UploadTooLargeError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
 @api_router.get("/emotion-summary/", tags=["analytics"])
-async def get_emotion_summary():
+async def get_emotion_summary(request: Request, response: Response, time_window_hours: float = 24):
     """
     Get a summary of detected emotions over time.
+    
+    Aggregates are shared by all worker processes, so every worker returns the
+    same summary (lagging live traffic by at most AGGREGATES_FLUSH_INTERVAL).
+    Send the ETag back as If-None-Match to get a 304 while nothing changed, and
+    the returned cursor to /emotion-summary/delta to fetch only what changed.
     """
-    # TODO: Implement actual emotion summary
-    return {
-        "summary": {
-            "total_frames": 0,
-            "emotion_distribution": {},
-            "timeline": []
-        }
-    }
+    aggregator = get_emotion_aggregator()
+    etag = await run_in_threadpool(aggregator.etag, time_window_hours)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    summary = await run_in_threadpool(aggregator.get_summary, time_window_hours)
+    response.headers["ETag"] = etag
+    return summary
+
+@api_router.get("/emotion-summary/delta", tags=["analytics"])
+async def get_emotion_summary_delta(request: Request, response: Response, cursor: int, time_window_hours: float = 24):
+    """
+    Timeline buckets and distribution changed since ``cursor``.
+    
+    Returns the next cursor; buckets in the response replace those with the
+    same timestamp, and buckets before ``window_start`` should be dropped.
+    """
+    aggregator = get_emotion_aggregator()
+    etag = await run_in_threadpool(aggregator.etag, time_window_hours, cursor)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    delta = await run_in_threadpool(aggregator.get_delta, cursor, time_window_hours)
+    response.headers["ETag"] = etag
+    return delta
+
+@api_router.get("/emotion-summary/stream", tags=["analytics"])
+async def stream_emotion_summary(request: Request, cursor: Optional[int] = None, time_window_hours: float = 24):
+    """
+    Server-sent events with summary deltas, replacing polling.
+    
+    Without a cursor (or Last-Event-ID on reconnect) the first event is the
+    full summary ("summary"); after that a "delta" event is pushed whenever
+    new detections are flushed. Each event id is the cursor it brings the
+    client up to.
+    """
+    aggregator = get_emotion_aggregator()
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    
+    async def events():
+        nonlocal cursor
+        if cursor is None:
+            summary = await run_in_threadpool(aggregator.get_summary, time_window_hours)
+            cursor = summary["cursor"]
+            yield f"event: summary\nid: {cursor}\ndata: {json.dumps(summary)}\n\n"
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            if await run_in_threadpool(aggregator.current_version) != cursor:
+                delta = await run_in_threadpool(aggregator.get_delta, cursor, time_window_hours)
+                if delta["cursor"] != cursor:
+                    cursor = delta["cursor"]
+                    last_sent = time.monotonic()
+                    yield f"event: delta\nid: {cursor}\ndata: {json.dumps(delta)}\n\n"
+            elif time.monotonic() - last_sent >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.AGGREGATES_FLUSH_INTERVAL)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @api_router.get("/export-csv/")
 async def export_emotion_data():
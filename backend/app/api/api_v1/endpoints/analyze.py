@@ -1,21 +1,65 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query
-from fastapi.responses import JSONResponse
-import cv2
-import numpy as np
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
 import logging
-from typing import Dict, Any
+from itertools import chain
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from ....services.emotion_detector import get_emotion_detector
+from ....services.model_manager import model_manager
+from ....services.overload import FULL_QUALITY, OverloadedError, QuotaExceededError, get_inference_executor
+from ....services.scheduler import client_address, parse_networks
+from ....services.uploads import UploadTooLargeError, upload_buffer
 from ....core.config import settings
 
+# Service modules pull in torch, mediapipe and OpenCV. They are imported inside
+# the handlers so that importing the app (and answering liveness probes) stays fast.
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _get_detector():
+    """Return the loaded emotion detector, or fail fast with 503 until the background loader has it ready."""
+    if model_manager.ready:
+        return model_manager.detector
+    # Never load the model here: it would block the event loop for every other request
+    if model_manager.state == model_manager.FAILED:
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {model_manager.error}")
+    raise HTTPException(
+        status_code=503,
+        detail="Model is still loading, retry shortly",
+        headers={"Retry-After": "5"},
+    )
+
+def _overloaded_response(e: OverloadedError) -> JSONResponse:
+    """503 telling the client to back off while the inference queue drains, or 429 when it is over its own quota."""
+    if isinstance(e, QuotaExceededError):
+        return JSONResponse(
+            status_code=429,
+            content={"status": "rate_limited", "message": str(e)},
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))},
+        )
+    return JSONResponse(
+        status_code=503,
+        content={"status": "overloaded", "message": str(e)},
+        headers={"Retry-After": str(int(e.retry_after + 0.5))},
+    )
+
+def _client_id(request: Request) -> str:
+    """Who a request is scheduled and rate limited as: its sender, behind any trusted proxies."""
+    peer = request.client.host if request.client else None
+    address = client_address(peer, request.headers.get("x-forwarded-for"), parse_networks(settings.TRUSTED_PROXIES))
+    return address or "anonymous"
+
 @router.post("/")
 async def analyze_image(
+    request: Request,
     file: UploadFile = File(...),
-    model_path: str = Query(..., description="Path to the emotion detection model"),
+    model_path: Optional[str] = Query(None, description="Ignored: the server's configured model (MODEL_PATH) is used; kept for existing clients"),
+    face_backend: str = Query(settings.FACE_BACKEND, description="Face detector backend, or 'auto' for the cheapest suitable one"),
+    landmarks: bool = Query(False, description="Include dense facial landmarks in the response"),
+    quality_gate: bool = Query(settings.QUALITY_GATE_ENABLED, description="Reject blurry or badly exposed images before inference"),
+    stream_id: Optional[str] = Query(None, max_length=128, description="Id of the live stream this frame belongs to; still frames reuse the last result"),
 ) -> Dict[str, Any]:
     """
     Analyze an image for emotion recognition using MediaPipe for face detection
@@ -23,49 +67,137 @@ async def analyze_image(
     
     Args:
         file: The image file to analyze
-        model_path: Path to the TorchScript model file
+        model_path: Ignored; results always come from the model the server loaded
+        face_backend: Face detector backend name or "auto"
+        landmarks: Whether dense landmarks are needed (selects a landmark-capable backend)
+        quality_gate: Whether to run the frame quality checks first
+        stream_id: Client-chosen id for frames polled from one camera; a frame that
+            has not meaningfully changed since the stream's last analyzed one gets
+            that result back, marked ``reused``, and the stream's predictions are
+            smoothed over time, bypassing the result cache. Without it each
+            image is classified on its own
         
     Returns:
         JSON response containing emotion detection results
     """
+    from ....services.face_backends import FaceRequirements, resolve_backend_name
+    from ....services.frame_change import get_stream_registry, record_reuse
+    from ....services.frame_decoder import FrameDecodeError, decode_frame
+    from ....services.frame_quality import assess_frame
+    from ....services.result_cache import content_key, get_result_cache
+    
+    # Landmark requests need a mesh-capable backend; plain analysis only needs a bbox
+    requirements = FaceRequirements(min_landmarks=68 if landmarks else 0)
     try:
-        # Read and decode the image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)  # Read as BGR
-        
-        if img is None:
-            raise HTTPException(status_code=400, detail="Could not decode image")
+        resolve_backend_name(requirements, face_backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    detector = _get_detector()
+
+    try:
+        # The spooled upload is hashed and decoded in place, without reading it into a bytes copy;
+        # identical bytes with identical parameters hit the result cache
+        cache_key = None
+        with upload_buffer(file.file, settings.MAX_UPLOAD_SIZE) as contents:
+            # A stream's result depends on its history, not only on the bytes
+            if settings.RESULT_CACHE_ENABLED and not stream_id:
+                # Keyed on the model actually serving, so loading another one invalidates the entries
+                cache_key = content_key(
+                    contents, detector.model_id, face_backend=face_backend, landmarks=landmarks, quality_gate=quality_gate
+                )
+                cached = get_result_cache().get(cache_key)
+                if cached is not None:
+                    return JSONResponse(
+                        content={**cached, "cached": True, "timestamp": datetime.utcnow().isoformat()},
+                        headers={"X-Cache": "HIT"},
+                    )
             
-        # Convert to RGB for MediaPipe
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            # Decode straight to RGB at the working resolution (JPEG or raw frame payload)
+            try:
+                img_rgb = decode_frame(contents, max_dim=settings.MAX_IMAGE_DIM)
+            except FrameDecodeError as e:
+                return JSONResponse(status_code=400, content={
+                    "status": "error",
+                    "message": str(e),
+                    "error_type": type(e).__name__
+                })
+        
+        # Frames that would only come out as invalid_face or "uncertain" never reach the inference queue
+        quality = assess_frame(img_rgb) if quality_gate else None
+        if quality is not None and not quality.ok:
+            logger.info("Rejected low-quality image: %s", ", ".join(quality.reasons))
+            content = {
+                "status": "success",
+                "emotion": "low_quality",
+                "confidence": 0.0,
+                "message": f"Image rejected before analysis: {', '.join(quality.reasons)}",
+                "quality": quality.to_dict(),
+            }
+            if cache_key is not None:
+                get_result_cache().put(cache_key, content)
+            return JSONResponse(
+                content={**content, "timestamp": datetime.utcnow().isoformat()},
+                headers={"X-Cache": "MISS"} if cache_key is not None else None,
+            )
         
-        # Initialize detector with the specified model
-        detector = get_emotion_detector(model_path)
+        stream = get_stream_registry().get(stream_id) if stream_id and settings.FRAME_REUSE_ENABLED else None
+        if stream is not None:
+            # Kept per request: other frames of the stream may be compared while this one is analyzed
+            reusable, signature = stream.unchanged(img_rgb)
+            if reusable:
+                record_reuse("http")
+                return JSONResponse(content={**stream.result, "reused": True, "timestamp": datetime.utcnow().isoformat()})
         
-        # Run emotion prediction
-        emotion, confidence, all_faces = detector.predict_emotion(img_rgb)
+        # Run emotion prediction on the inference thread at the quality the current load allows
+        try:
+            (emotion, confidence, all_faces), profile = await get_inference_executor().run(
+                lambda profile: detector.predict_emotion(
+                    img_rgb, requirements=requirements, face_backend=face_backend, profile=profile,
+                    stream=f"http:{stream_id}" if stream_id else None,
+                ),
+                client=_client_id(request),
+            )
+        except OverloadedError as e:
+            logger.warning("Shedding analyze request: %s", e)
+            return _overloaded_response(e)
         
         if not all_faces:
             logger.warning("No faces detected in the uploaded image")
-            return JSONResponse(status_code=200, content={
+            content = {
                 "status": "success",
                 "emotion": "no_face",
                 "confidence": 0.0,
                 "message": "No faces detected in the image",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-        logger.info(f"Detected emotion: {emotion} with confidence {confidence:.2f}")
+                "reason": emotion,
+            }
+        else:
+            if stream_id:
+                # Frames of a stream report the prediction smoothed with the stream's history
+                emotion, confidence = all_faces[0]["emotion"], all_faces[0]["confidence"]
+            logger.info("Detected emotion: %s with confidence %.2f", emotion, confidence)
+            content = {
+                "status": "success",
+                "emotion": emotion.lower(),  # Ensure consistent lowercase emotion names
+                "confidence": float(confidence),  # Convert numpy float to Python float
+                "all_faces": all_faces,
+            }
+        content["quality_profile"] = profile.name
+        if stream is not None and all_faces:
+            stream.update(content, signature)
+        elif stream is not None:
+            stream.reset()
+        
+        # Degraded results would otherwise keep being served after the load has passed
+        if cache_key is not None and profile == FULL_QUALITY:
+            get_result_cache().put(cache_key, content)
         
-        return JSONResponse(content={
-            "status": "success",
-            "emotion": emotion.lower(),  # Ensure consistent lowercase emotion names
-            "confidence": float(confidence),  # Convert numpy float to Python float
-            "all_faces": all_faces,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        return JSONResponse(
+            content={**content, "timestamp": datetime.utcnow().isoformat()},
+            headers={"X-Cache": "MISS"} if cache_key is not None else None,
+        )
 
+    except UploadTooLargeError:
+        raise
     except Exception as e:
         error_msg = f"Error processing image: {str(e)}"
         logger.error(error_msg, exc_info=True)
@@ -77,3 +209,96 @@ async def analyze_image(
                 "error_type": str(type(e).__name__)
             }
         )
+
+
+@router.post("/bulk")
+async def analyze_bulk(
+    request: Request,
+    files: List[UploadFile] = File(..., description="Images and/or zip/tar archives of images"),
+    model_path: Optional[str] = Query(None, description="Ignored: the server's configured model (MODEL_PATH) is used; kept for existing clients"),
+    face_backend: str = Query(settings.FACE_BACKEND, description="Face detector backend, or 'auto' for the cheapest suitable one"),
+    landmarks: bool = Query(False, description="Include dense facial landmarks in the response"),
+    quality_gate: bool = Query(settings.QUALITY_GATE_ENABLED, description="Reject blurry or badly exposed images before inference"),
+) -> StreamingResponse:
+    """
+    Analyze many images in one request.
+    
+    Accepts any mix of image files and zip/tar archives. Archive entries are read
+    as a stream, decoded in parallel and classified in batched forward passes.
+    Results are streamed back as newline-delimited JSON, one object per image as
+    soon as its batch finishes, followed by a final ``{"summary": ...}`` object.
+    
+    Args:
+        files: Uploaded images and/or archives
+        model_path: Ignored; results always come from the model the server loaded
+        face_backend: Face detector backend name or "auto"
+        landmarks: Whether dense landmarks are needed (selects a landmark-capable backend)
+        quality_gate: Whether to run the frame quality checks on each image first
+        
+    Returns:
+        application/x-ndjson stream of per-image results
+    """
+    from ....services.bulk_analysis import analyze_entries, iter_upload_entries
+    from ....services.face_backends import FaceRequirements, resolve_backend_name
+    
+    requirements = FaceRequirements(min_landmarks=68 if landmarks else 0)
+    try:
+        resolve_backend_name(requirements, face_backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    detector = _get_detector()
+    executor = get_inference_executor()
+    if executor.controller.shedding:
+        return _overloaded_response(OverloadedError(retry_after=max(1.0, executor.controller.ewma)))
+    entries = chain.from_iterable(
+        iter_upload_entries(upload.filename, upload.file, settings.MAX_UPLOAD_SIZE) for upload in files
+    )
+    
+    def ndjson():
+        try:
+            for result in analyze_entries(
+                entries, detector, requirements, face_backend,
+                executor=executor, quality_gate=quality_gate, client=_client_id(request),
+            ):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            logger.error(f"Bulk analysis failed: {str(e)}", exc_info=True)
+            yield json.dumps({"status": "error", "message": str(e), "error_type": type(e).__name__}) + "\n"
+    
+    # Starlette iterates sync generators in its threadpool, keeping the event loop free
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/backends")
+async def list_face_backends() -> Dict[str, Any]:
+    """
+    List the face detector backends available in this deployment, cheapest first.
+    """
+    from ....services.face_backends import available_backends
+    
+    return {"default": settings.FACE_BACKEND, "available": available_backends()}
+
+
+@router.get("/overload")
+async def overload_status() -> Dict[str, Any]:
+    """
+    Current quality profile, inference queue depth and recent degradation/recovery transitions.
+    """
+    return get_inference_executor().status()
+
+
+@router.get("/cache")
+async def cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters and occupancy of the analysis result caches.
+    """
+    from ....services.result_cache import get_face_cache, get_result_cache
+    
+    face_cache = get_face_cache()
+    return {
+        "enabled": settings.RESULT_CACHE_ENABLED,
+        "result_cache": get_result_cache().stats(),
+        "face_cache": face_cache.stats() if face_cache is not None else None,
+    }
@@ -0,0 +1,111 @@
+import secrets
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from ....core.config import settings
+from ....services.model_manager import model_manager
+from ....services.profiler import ProfilerBusyError, get_profiler
+
+# Profiles are per worker process: with several workers, each request profiles whichever one it lands on.
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Allow only requests carrying ``Authorization: Bearer <ADMIN_TOKEN>``; hide the endpoints when no token is set."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+CONTENT_TYPES = {"collapsed": ("text/plain", "folded"), "chrome": ("application/json", "json")}
+
+
+def _session(session_id: str):
+    session = get_profiler().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"No profiling session {session_id}")
+    return session
+
+
+def _busy(e: ProfilerBusyError) -> JSONResponse:
+    return JSONResponse(status_code=409, content={"status": "busy", "message": str(e)})
+
+
+@router.post("/cpu", status_code=202)
+async def start_cpu_profile(
+    seconds: float = Query(10.0, gt=0, description="How long to sample, capped at PROFILE_MAX_SECONDS"),
+    interval: float = Query(settings.PROFILE_SAMPLE_INTERVAL, ge=0.001, le=1.0, description="Seconds between samples"),
+) -> Dict[str, Any]:
+    """
+    Sample the Python stacks of every thread in this worker for the next ``seconds``.
+
+    Returns the session at once; poll ``GET /{id}`` and download the result
+    from ``GET /{id}/download`` when it is done.
+    """
+    try:
+        return get_profiler().start_cpu(seconds, interval).summary()
+    except ProfilerBusyError as e:
+        return _busy(e)
+
+
+@router.post("/torch", status_code=202)
+async def start_torch_profile(
+    calls: int = Query(10, gt=0, description="predict_emotion calls to profile, capped at PROFILE_MAX_CALLS"),
+) -> Dict[str, Any]:
+    """
+    Run the torch profiler around each of the next ``calls`` ``predict_emotion`` calls.
+
+    The session ends with an error if the calls do not arrive within
+    PROFILE_MAX_SECONDS; any calls profiled until then are kept.
+    """
+    detector = model_manager.detector
+    if detector is None:
+        raise HTTPException(status_code=503, detail="Model is not loaded", headers={"Retry-After": "5"})
+    try:
+        return get_profiler().start_torch(detector, calls).summary()
+    except ProfilerBusyError as e:
+        return _busy(e)
+
+
+@router.get("/")
+async def list_profiles() -> List[Dict[str, Any]]:
+    """Recent profiling sessions of this worker, newest first."""
+    return get_profiler().list()
+
+
+@router.get("/{session_id}")
+async def get_profile(
+    session_id: str,
+    wait: float = Query(0.0, ge=0, le=120, description="Seconds to wait for the session to finish"),
+) -> Dict[str, Any]:
+    """Status and summary of a session: top sampled frames, or per-op model timings."""
+    session = _session(session_id)
+    if wait:
+        await run_in_threadpool(session.done.wait, wait)
+    return session.summary()
+
+
+@router.get("/{session_id}/download")
+async def download_profile(
+    session_id: str,
+    format: str = Query("chrome", description="'collapsed' (flamegraph.pl, speedscope) or 'chrome' (chrome://tracing, Perfetto)"),
+) -> Response:
+    """Download a finished session as a flamegraph-compatible or Chrome trace file."""
+    session = _session(session_id)
+    if not session.done.is_set():
+        raise HTTPException(status_code=409, detail="Profiling session is still running")
+    if format not in session.formats:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(session.formats)}")
+    media_type, extension = CONTENT_TYPES[format]
+    body = await run_in_threadpool(session.render, format)
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="profile-{session.kind}-{session.id}.{extension}"'},
+    )
@@ -0,0 +1,31 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from ....services.session_analytics import get_session_analytics
+from .profiling import require_admin
+
+# Sessions are per worker process: with several workers, a live session is only known to the worker holding its WebSocket.
+
+# Session reports are health data about identifiable people: admin only, like the profiler
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/")
+async def list_sessions() -> Dict[str, List[Dict[str, Any]]]:
+    """Live WebSocket sessions of this worker and recently finished ones, newest first."""
+    return get_session_analytics().list()
+
+
+@router.get("/{session_id}")
+async def get_session(session_id: str) -> Dict[str, Any]:
+    """
+    Analytics of one session: transitions, dwell times, rolling entropy and negative-affect episodes.
+
+    A live session is reported as of now; a finished one by its final report.
+    The id is sent to the client as ``session_id`` with every WebSocket result.
+    """
+    report = get_session_analytics().get(session_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No session {session_id}")
+    return report
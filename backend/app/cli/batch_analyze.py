@@ -0,0 +1,306 @@
+"""
+Offline batch emotion analysis for folders of images and videos.
+
+Walks a directory tree, fans files out over a process pool (one EmotionDetector
+per worker) and writes one row per image / sampled video frame to Parquet part
+files in the output directory. A SQLite manifest records completed files, so an
+interrupted run picks up where it left off when started again.
+
+Usage (from the backend directory):
+    python -m app.cli.batch_analyze /data/sessions --output results/ --jobs 8
+    python -m app.cli.batch_analyze /data/sessions --output results/ --video-stride 15
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+EMOTION_COLUMNS = ["neutral", "happiness", "sadness", "surprise", "fear", "disgust", "anger"]
+COLUMNS = [
+    "path", "frame_index", "timestamp_s", "status", "emotion", "confidence",
+    "bbox_left", "bbox_top", "bbox_width", "bbox_height",
+] + [f"p_{name}" for name in EMOTION_COLUMNS]
+
+# Per-process detector, created by the pool initializer
+_detector = None
+
+
+def iter_media_files(root: str) -> Iterator[str]:
+    """Yield image and video paths under root in a stable order, without listing the whole tree up front."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable directory {directory}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
+                yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+class Manifest:
+    """SQLite record of completed files; lookups don't need the full list in memory."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completed (path TEXT PRIMARY KEY, part TEXT, rows INTEGER, completed_at TEXT)"
+        )
+        self.conn.commit()
+
+    def is_done(self, path: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM completed WHERE path = ?", (path,)).fetchone() is not None
+
+    def mark_done(self, entries: List[tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO completed (path, part, rows, completed_at) VALUES (?, ?, ?, ?)", entries
+            )
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM completed").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class PartWriter:
+    """
+    Buffers result rows and writes them as Parquet part files.
+
+    Each flush closes a complete part file before the files it covers are marked
+    done in the manifest, so a crash never leaves completed work in a corrupt file.
+    """
+
+    def __init__(self, output_dir: str, manifest: Manifest, rows_per_part: int):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa, self._pq = pa, pq
+        self.output_dir = output_dir
+        self.manifest = manifest
+        self.rows_per_part = rows_per_part
+        # Down to the microsecond: a resumed run must never overwrite the parts of the one before it
+        self.run_id = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+        self.part_index = 0
+        self.rows: List[Dict[str, Any]] = []
+        self.files: List[tuple] = []
+        self.schema = pa.schema(
+            [("path", pa.string()), ("frame_index", pa.int32()), ("timestamp_s", pa.float64()),
+             ("status", pa.string()), ("emotion", pa.string()), ("confidence", pa.float32())]
+            + [(name, pa.int32()) for name in ("bbox_left", "bbox_top", "bbox_width", "bbox_height")]
+            + [(f"p_{name}", pa.float32()) for name in EMOTION_COLUMNS]
+        )
+
+    def add(self, path: str, rows: List[Dict[str, Any]]) -> None:
+        self.rows.extend(rows)
+        self.files.append((path, len(rows)))
+        if len(self.rows) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.files:
+            return
+        part = f"part-{self.run_id}-{self.part_index:05d}.parquet"
+        if self.rows:
+            columns = {name: [row.get(name) for row in self.rows] for name in COLUMNS}
+            table = self._pa.Table.from_pydict(columns, schema=self.schema)
+            tmp_path = os.path.join(self.output_dir, part + ".tmp")
+            self._pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, os.path.join(self.output_dir, part))
+            self.part_index += 1
+        completed_at = datetime.utcnow().isoformat()
+        self.manifest.mark_done([(path, part if n else None, n, completed_at) for path, n in self.files])
+        self.rows.clear()
+        self.files.clear()
+
+
+def _init_worker(model_path: str, threads: int, max_dim: int) -> None:
+    global _detector
+    import torch
+    from ..services.emotion_detector import EmotionDetector
+
+    torch.set_num_threads(threads)
+    logging.getLogger("app").setLevel(logging.ERROR)
+    _detector = EmotionDetector(model_path)
+    _detector.max_dim = max_dim
+
+
+def _row(path: str, frame_index: int, timestamp: float, prediction: tuple) -> Dict[str, Any]:
+    emotion, confidence, faces = prediction
+    row: Dict[str, Any] = {"path": path, "frame_index": frame_index, "timestamp_s": timestamp}
+    if not faces:
+        row.update(status=emotion, emotion=None, confidence=None)
+        return row
+    face = faces[0]
+    bbox = face["bounding_box"]
+    row.update(
+        status="ok",
+        emotion=face["emotion"],
+        confidence=float(face["confidence"]),
+        bbox_left=bbox["left"], bbox_top=bbox["top"], bbox_width=bbox["width"], bbox_height=bbox["height"],
+    )
+    for name in EMOTION_COLUMNS:
+        row[f"p_{name}"] = face["all_emotions"].get(name, 0.0) / 100.0
+    return row
+
+
+def analyze_file(path: str, video_stride: int) -> List[Dict[str, Any]]:
+    """Analyze one image or video in a worker process; returns its result rows."""
+    import cv2
+    from ..services.frame_decoder import decode_image
+
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in IMAGE_EXTENSIONS:
+            with open(path, "rb") as f:
+                frame = decode_image(f.read(), max_dim=_detector.max_dim)
+            if frame is None:
+                return [{"path": path, "frame_index": 0, "status": "decode_error"}]
+            return [_row(path, 0, 0.0, _detector.predict_batch([frame])[0])]
+
+        # Videos: consecutive frames of one stream, so temporal smoothing applies
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            return [{"path": path, "frame_index": 0, "status": "decode_error"}]
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        rows = []
+        index = 0
+        try:
+            while True:
+                # grab() skips decoding frames we don't sample
+                if not cap.grab():
+                    break
+                if index % video_stride == 0:
+                    ok, frame = cap.retrieve()
+                    if ok:
+                        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        rows.append(_row(path, index, index / fps, _detector.predict_emotion(rgb, stream=path)))
+                index += 1
+        finally:
+            cap.release()
+            _detector.smoother.reset(path)
+        return rows or [{"path": path, "frame_index": 0, "status": "empty_video"}]
+    except Exception as e:
+        logger.error(f"Failed to analyze {path}: {e}")
+        return [{"path": path, "frame_index": 0, "status": f"error: {type(e).__name__}"}]
+
+
+class Progress:
+    """Single-line progress display with throughput, redrawn at most a few times per second."""
+
+    def __init__(self, stream=sys.stderr, interval: float = 0.5):
+        self.stream = stream
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_draw = 0.0
+        self.files = 0
+        self.rows = 0
+        self.skipped = 0
+
+    def update(self, files: int = 0, rows: int = 0, skipped: int = 0, force: bool = False) -> None:
+        self.files += files
+        self.rows += rows
+        self.skipped += skipped
+        now = time.perf_counter()
+        if force or now - self.last_draw >= self.interval:
+            self.last_draw = now
+            elapsed = now - self.start
+            rate = self.files / elapsed if elapsed > 0 else 0.0
+            self.stream.write(
+                f"\r{self.files} files ({self.rows} rows) | {rate:.1f} files/s | "
+                f"{self.skipped} already done | {elapsed:.0f}s elapsed"
+            )
+            self.stream.flush()
+
+    def close(self) -> None:
+        self.update(force=True)
+        self.stream.write("\n")
+
+
+def run(args: argparse.Namespace) -> int:
+    os.makedirs(args.output, exist_ok=True)
+    # Leading underscore: Parquet dataset readers skip the manifest when reading the directory
+    manifest = Manifest(args.manifest or os.path.join(args.output, "_manifest.sqlite"))
+    writer = PartWriter(args.output, manifest, args.rows_per_part)
+    progress = Progress()
+    window = args.jobs * 4  # bounded number of in-flight files keeps memory constant
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.jobs,
+            initializer=_init_worker,
+            initargs=(args.model_path, args.threads_per_job, args.max_dim),
+        ) as pool:
+            pending = {}
+            for path in iter_media_files(args.input):
+                if manifest.is_done(path):
+                    progress.update(skipped=1)
+                    continue
+                pending[pool.submit(analyze_file, path, args.video_stride)] = path
+                while len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        rows = future.result()
+                        writer.add(pending.pop(future), rows)
+                        progress.update(files=1, rows=len(rows))
+            for future in list(pending):
+                rows = future.result()
+                writer.add(pending.pop(future), rows)
+                progress.update(files=1, rows=len(rows))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; completed files are kept and will be skipped on the next run")
+        return 130
+    finally:
+        writer.flush()
+        progress.close()
+        manifest.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Directory of images and/or videos")
+    parser.add_argument("--output", required=True, help="Output directory for Parquet part files")
+    parser.add_argument("--manifest", help="Manifest path (default: <output>/_manifest.sqlite)")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH, help="TorchScript model to use")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--threads-per-job", type=int, default=1, help="Torch threads per worker")
+    parser.add_argument("--video-stride", type=int, default=10, help="Analyze every Nth video frame")
+    parser.add_argument("--max-dim", type=int, default=settings.MAX_IMAGE_DIM, help="Working resolution (long side)")
+    parser.add_argument("--rows-per-part", type=int, default=50000, help="Rows per Parquet part file")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.video_stride < 1:
+        parser.error("--video-stride must be at least 1")
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        parser.error("Parquet output needs pyarrow: pip install pyarrow")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Compare emotion backbones on a video or a set of images.
+
+Each frame is decoded, face-detected and preprocessed once; the batched face
+tensor is then run through every model concurrently. Prints per-model latency,
+pairwise agreement and confusion matrices against the first model.
+
+Usage (from the backend directory):
+    python -m app.cli.compare_backbones clip.mp4 --model ../EMO-AffectNetModel/backbone_models
+    python -m app.cli.compare_backbones /data/faces --model a=models/a.pth --model b=models/b.pth --report cmp.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+from .batch_analyze import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, iter_media_files
+
+logger = logging.getLogger(__name__)
+
+
+def iter_frames(path: str, video_stride: int, max_dim: int) -> Iterator[np.ndarray]:
+    """Yield RGB frames from an image, a video (every Nth frame) or a directory of both."""
+    import cv2
+    from ..services.frame_decoder import decode_image
+
+    paths = iter_media_files(path) if os.path.isdir(path) else [path]
+    for media in paths:
+        ext = os.path.splitext(media)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            with open(media, "rb") as f:
+                frame = decode_image(f.read(), max_dim=max_dim)
+            if frame is None:
+                logger.warning(f"Could not decode {media}")
+                continue
+            yield frame
+        elif ext in VIDEO_EXTENSIONS:
+            cap = cv2.VideoCapture(media)
+            index = 0
+            try:
+                while cap.grab():
+                    if index % video_stride == 0:
+                        ok, frame = cap.retrieve()
+                        if ok:
+                            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    index += 1
+            finally:
+                cap.release()
+
+
+def run(args: argparse.Namespace) -> int:
+    from ..services.backbone_comparison import BackboneComparison, discover_backbones
+
+    models = discover_backbones(args.model or [settings.MODEL_PATH])
+    if len(models) < 2:
+        logger.warning(f"Only {len(models)} backbone found; agreement needs at least two")
+    for name, path in models.items():
+        print(f"{name}: {path}")
+
+    comparison = BackboneComparison(models, args.face_backend, args.threads_per_model)
+    batch: List[np.ndarray] = []
+    try:
+        for frame in iter_frames(args.input, args.video_stride, args.max_dim):
+            batch.append(frame)
+            if len(batch) >= args.batch_size:
+                comparison.compare(batch)
+                batch.clear()
+                if args.limit and comparison.report.frames >= args.limit:
+                    break
+        if batch:
+            comparison.compare(batch)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; reporting the frames compared so far")
+    finally:
+        comparison.close()
+
+    print()
+    print(comparison.report.format())
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(comparison.report.to_dict(), f, indent=2)
+        print(f"\nReport written to {args.report}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Video, image, or directory of images and videos")
+    parser.add_argument(
+        "--model", action="append",
+        help="name=path, a model file or a directory of torchscript_model_*.pth; repeatable. "
+             "The first model is the reference (default: MODEL_PATH only)",
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE, help="Frames per shared batch")
+    parser.add_argument("--video-stride", type=int, default=5, help="Use every Nth video frame")
+    parser.add_argument("--limit", type=int, help="Stop after this many frames")
+    parser.add_argument("--max-dim", type=int, default=settings.MAX_IMAGE_DIM, help="Working resolution (long side)")
+    parser.add_argument("--face-backend", help="Face detector backend (default: FACE_BACKEND)")
+    parser.add_argument("--threads-per-model", type=int, help="Torch threads per model (default: cores / models)")
+    parser.add_argument("--report", help="Write the full report, including all confusion matrices, as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    logging.getLogger("app.services").setLevel(logging.ERROR)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Build and query the expression embedding store.
+
+``add`` runs face detection on a folder of images and stores the backbone's
+penultimate-layer features of each face, tagged with a session name; ``build``
+trains the IVF index; ``query`` finds the most similar stored expressions to an
+image or to a stored vector.
+
+Usage (from the backend directory):
+    python -m app.cli.embeddings add /data/session_042 --session session_042
+    python -m app.cli.embeddings build
+    python -m app.cli.embeddings query face.jpg -k 20
+    python -m app.cli.embeddings query --id 1234 --nprobe 32
+    python -m app.cli.embeddings stats
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+from .batch_analyze import IMAGE_EXTENSIONS, Progress, iter_media_files
+
+logger = logging.getLogger(__name__)
+
+
+def _detector(model_path: str):
+    from ..services.emotion_detector import EmotionDetector
+    return EmotionDetector(model_path)
+
+
+def _load_image(path: str) -> Optional[np.ndarray]:
+    from ..services.frame_decoder import decode_image
+    with open(path, "rb") as f:
+        return decode_image(f.read(), max_dim=settings.MAX_IMAGE_DIM)
+
+
+def _open_store(path: str, dim: Optional[int] = None):
+    from ..services.vector_store import VectorStore
+    return VectorStore(path, dim)
+
+
+def add(args: argparse.Namespace) -> int:
+    detector = _detector(args.model_path)
+    store = None
+    progress = Progress()
+    session = args.session or os.path.basename(os.path.normpath(args.input))
+    paths = [p for p in iter_media_files(args.input) if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS]
+
+    try:
+        for start in range(0, len(paths), args.batch_size):
+            batch = paths[start:start + args.batch_size]
+            frames = [_load_image(path) for path in batch]
+            results = detector.embed_batch(frames, batch_size=args.batch_size)
+            vectors, items = [], []
+            for path, (status, embedding, bbox) in zip(batch, results):
+                if embedding is None:
+                    logger.debug(f"No embedding for {path}: {status}")
+                    continue
+                vectors.append(embedding)
+                items.append({
+                    "path": path,
+                    "session": session,
+                    "bbox": bbox,
+                    "source": detector.embedding_source,
+                    "added_at": datetime.utcnow().isoformat(),
+                })
+            if vectors:
+                if store is None:
+                    store = _open_store(args.store, len(vectors[0]))
+                store.add(np.stack(vectors), items)
+            progress.update(files=len(batch), rows=len(vectors))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; vectors added so far are kept")
+        return 130
+    finally:
+        progress.close()
+    if store is not None and store.indexed_count:
+        print(f"{store.count - store.indexed_count} vectors are not in the index yet; run `build` to add them")
+    return 0
+
+
+def build(args: argparse.Namespace) -> int:
+    store = _open_store(args.store)
+    start = time.perf_counter()
+    summary = store.build_index(nlist=args.nlist, train_size=args.train_size, iterations=args.iterations)
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+def query(args: argparse.Namespace) -> int:
+    store = _open_store(args.store)
+    if args.id is not None:
+        vector = np.asarray(store.vectors[args.id], dtype=np.float32)
+    else:
+        status, vector, _ = _detector(args.model_path).embed_batch([_load_image(args.image)])[0]
+        if vector is None:
+            print(f"No embedding for {args.image}: {status}", file=sys.stderr)
+            return 1
+
+    start = time.perf_counter()
+    matches = store.search(vector, k=args.k, nprobe=args.nprobe)[0]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for rank, (vector_id, score) in enumerate(matches, 1):
+        item = store.item(vector_id)
+        print(f"{rank:>3}  {score:.4f}  #{vector_id:<9} {item.get('session', ''):<20} {item.get('path', '')}")
+    print(f"{len(matches)} matches in {elapsed_ms:.1f}ms over {store.count} vectors (nprobe={args.nprobe})")
+    return 0
+
+
+def stats(args: argparse.Namespace) -> int:
+    print(json.dumps(_open_store(args.store).stats(), indent=2))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=str(settings.EMBEDDING_STORE_DIR), help="Vector store directory")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH, help="TorchScript model to use")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="Embed the faces in a folder of images")
+    add_parser.add_argument("input", help="Directory of images")
+    add_parser.add_argument("--session", help="Session name stored with each vector (default: folder name)")
+    add_parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE, help="Images per forward pass")
+    add_parser.set_defaults(func=add)
+
+    build_parser = commands.add_parser("build", help="Train the IVF index over the whole store")
+    build_parser.add_argument("--nlist", type=int, help="Inverted lists (default: about 4 * sqrt(vectors))")
+    build_parser.add_argument("--train-size", type=int, default=100_000, help="Vectors sampled for k-means")
+    build_parser.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+    build_parser.set_defaults(func=build)
+
+    query_parser = commands.add_parser("query", help="Find the most similar stored expressions")
+    target = query_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("image", nargs="?", help="Image whose face to search for")
+    target.add_argument("--id", type=int, help="Search for a stored vector instead")
+    query_parser.add_argument("-k", type=int, default=10, help="Matches to return")
+    query_parser.add_argument("--nprobe", type=int, default=settings.EMBEDDING_NPROBE, help="Inverted lists to scan")
+    query_parser.set_defaults(func=query)
+
+    stats_parser = commands.add_parser("stats", help="Show store and index sizes")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,13 +28,112 @@ class Settings(BaseSettings):
         "LANDMARK_MODEL_PATH", 
         str(Path("models/shape_predictor_68_face_landmarks.dat"))
     )
+    OPENCV_DNN_PROTO_PATH: str = os.getenv("OPENCV_DNN_PROTO_PATH", str(Path("models/deploy.prototxt")))
+    OPENCV_DNN_MODEL_PATH: str = os.getenv(
+        "OPENCV_DNN_MODEL_PATH",
+        str(Path("models/res10_300x300_ssd_iter_140000.caffemodel"))
+    )
+    
+    # Inference
+    MAX_IMAGE_DIM: int = int(os.getenv("MAX_IMAGE_DIM", 640))  # frames are decoded/resized to this long side
+    
+    BULK_BATCH_SIZE: int = int(os.getenv("BULK_BATCH_SIZE", 16))  # images per forward pass for bulk analysis
+    BULK_DECODE_WORKERS: int = int(os.getenv("BULK_DECODE_WORKERS", min(8, os.cpu_count() or 1)))
+    
+    # Postprocessing: override rules on the class probabilities, and per-stream temporal smoothing of live frames
+    LOW_CONFIDENCE_FALLBACKS: str = os.getenv("LOW_CONFIDENCE_FALLBACKS", "anger:neutral")  # "emotion:label,..." reported instead of "uncertain" below the minimum confidence
+    RUNNER_UP_OVERRIDES: str = os.getenv("RUNNER_UP_OVERRIDES", "anger:0.7:0.8")  # "emotion:below:ratio,..." the runner-up wins if within ratio of a top score under below
+    SMOOTHING_MODE: str = os.getenv("SMOOTHING_MODE", "window")  # "window" (recency-weighted mean), "ema" or "off"
+    SMOOTHING_WINDOW: int = int(os.getenv("SMOOTHING_WINDOW", 5))  # frames averaged in window mode
+    SMOOTHING_MIN_HISTORY: int = int(os.getenv("SMOOTHING_MIN_HISTORY", 3))  # frames seen before a stream's output is smoothed
+    SMOOTHING_ALPHA: float = float(os.getenv("SMOOTHING_ALPHA", 0.5))  # weight of the newest frame in ema mode
+    SMOOTHING_MAX_STREAMS: int = int(os.getenv("SMOOTHING_MAX_STREAMS", 1024))  # least recently seen streams are forgotten beyond this
+    
+    # Overload control: quality degrades step by step as inference queue wait grows, then requests are shed
+    OVERLOAD_TARGET_WAIT: float = float(os.getenv("OVERLOAD_TARGET_WAIT", 0.1))  # seconds of queue wait tolerated at full quality
+    OVERLOAD_SHED_WAIT: float = float(os.getenv("OVERLOAD_SHED_WAIT", 2.0))  # beyond this at the cheapest profile, reject with 503
+    OVERLOAD_DWELL: float = float(os.getenv("OVERLOAD_DWELL", 1.0))  # seconds above a threshold before degrading
+    OVERLOAD_COOLDOWN: float = float(os.getenv("OVERLOAD_COOLDOWN", 5.0))  # seconds of headroom before restoring quality
+    INFERENCE_MAX_QUEUE: int = int(os.getenv("INFERENCE_MAX_QUEUE", 64))  # jobs waiting for the model before shedding
+    
+    # Inference scheduling: live frames, then interactive requests, then batch work; fair shares per client within each
+    SCHEDULER_LIVE_FPS: float = float(os.getenv("SCHEDULER_LIVE_FPS", 30))  # frames per second per WebSocket session; 0 = unlimited
+    SCHEDULER_INTERACTIVE_RATE: float = float(os.getenv("SCHEDULER_INTERACTIVE_RATE", 10))  # single-image requests per second per client
+    SCHEDULER_BATCH_RATE: float = float(os.getenv("SCHEDULER_BATCH_RATE", 0))  # bulk images per second per client; bulk streams are slowed, not rejected
+    SCHEDULER_LIVE_DEADLINE: float = float(os.getenv("SCHEDULER_LIVE_DEADLINE", 0.5))  # seconds a live frame may wait before it is dropped; 0 = never
+    SCHEDULER_CLIENT_WEIGHTS: str = os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")  # "client=weight,..." fair-share weights, default 1
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")  # addresses/networks whose X-Forwarded-For names the client (e.g. the Next.js server)
+    
+    # Frame quality gate: cheap checks that reject frames before face detection and inference
+    QUALITY_GATE_ENABLED: bool = os.getenv("QUALITY_GATE_ENABLED", "true").lower() == "true"
+    QUALITY_MIN_SHARPNESS: float = float(os.getenv("QUALITY_MIN_SHARPNESS", 25.0))  # Laplacian variance at 160px; sharp faces score in the hundreds
+    QUALITY_MIN_BRIGHTNESS: float = float(os.getenv("QUALITY_MIN_BRIGHTNESS", 30.0))  # mean gray level
+    QUALITY_MAX_BRIGHTNESS: float = float(os.getenv("QUALITY_MAX_BRIGHTNESS", 220.0))
+    QUALITY_MAX_CLIPPED: float = float(os.getenv("QUALITY_MAX_CLIPPED", 0.5))  # fraction of pixels crushed to black or blown to white
+    QUALITY_MAX_MOTION_COHERENCE: float = float(os.getenv("QUALITY_MAX_MOTION_COHERENCE", 0.4))  # 0-1, higher = stronger directional smear
+    QUALITY_MAX_FACE_YAW: float = float(os.getenv("QUALITY_MAX_FACE_YAW", 0.7))  # nose offset in half eye distances; ~0.7 is 45 degrees
+    
+    # Live streams: still frames reuse the last result instead of being analyzed again
+    FRAME_REUSE_ENABLED: bool = os.getenv("FRAME_REUSE_ENABLED", "true").lower() == "true"
+    FRAME_REUSE_PIXEL_DELTA: float = float(os.getenv("FRAME_REUSE_PIXEL_DELTA", 8.0))  # gray levels a 32x32 signature cell must move
+    FRAME_REUSE_MAX_CHANGED: float = float(os.getenv("FRAME_REUSE_MAX_CHANGED", 0.002))  # fraction of changed cells still treated as the same frame
+    FRAME_REUSE_MAX_AGE: float = float(os.getenv("FRAME_REUSE_MAX_AGE", 2.0))  # seconds; results are refreshed at least this often
+    FRAME_REUSE_MAX_STREAMS: int = int(os.getenv("FRAME_REUSE_MAX_STREAMS", 1024))  # HTTP polling streams tracked per worker
+    
+    # Face detection
+    FACE_BACKEND: str = os.getenv("FACE_BACKEND", "auto")  # "auto" picks the cheapest backend that meets the request's needs
+    MEDIAPIPE_DETECTION_MODEL: int = int(os.getenv("MEDIAPIPE_DETECTION_MODEL", 0))  # 0 = short range (<2m, same as FaceMesh), 1 = full range
     
     # File Uploads
     UPLOAD_DIR: Path = Path(os.getenv("UPLOAD_DIR", "uploads"))
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))  # 10MB
+    MAX_BULK_UPLOAD_SIZE: int = int(os.getenv("MAX_BULK_UPLOAD_SIZE", 536870912))  # 512MB per bulk request; each image still capped at MAX_UPLOAD_SIZE
+    
+    # Result caching
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", 33554432))  # 32MB
+    RESULT_CACHE_TTL: float = float(os.getenv("RESULT_CACHE_TTL", 300))  # seconds
+    FACE_CACHE_ENABLED: bool = os.getenv("FACE_CACHE_ENABLED", "false").lower() == "true"  # reuse model output for near-identical face crops
+
+    # Expression embeddings (research): penultimate backbone features and their similarity index
+    EMBEDDING_STORE_DIR: Path = Path(os.getenv("EMBEDDING_STORE_DIR", "embeddings"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))  # face crops per forward pass
+    EMBEDDING_NPROBE: int = int(os.getenv("EMBEDDING_NPROBE", 8))  # IVF lists scanned per query; more = better recall, slower
+
+    # Debugging: save every classified face crop (off by default; the directory is capped)
+    DEBUG_SAVE_FACES: bool = os.getenv("DEBUG_SAVE_FACES", "false").lower() == "true"
+    DEBUG_FACES_DIR: Path = Path(os.getenv("DEBUG_FACES_DIR", "debug_faces"))
+    DEBUG_FACES_MAX_FILES: int = int(os.getenv("DEBUG_FACES_MAX_FILES", 500))  # oldest crops are deleted beyond this
+    
+    # Emotion summary aggregates, shared by all worker processes on the host through one SQLite file
+    AGGREGATES_DB_PATH: Path = Path(os.getenv("AGGREGATES_DB_PATH", "data/emotion_aggregates.sqlite"))
+    AGGREGATES_FLUSH_INTERVAL: float = float(os.getenv("AGGREGATES_FLUSH_INTERVAL", 1.0))  # seconds; summaries lag by at most this
+    AGGREGATES_RETENTION_HOURS: float = float(os.getenv("AGGREGATES_RETENTION_HOURS", 48))
+    
+    # Per-session analytics of live WebSocket sessions (/api/v1/sessions), kept per worker process
+    ANALYTICS_WINDOW_SECONDS: float = float(os.getenv("ANALYTICS_WINDOW_SECONDS", 30))  # time constant of rolling entropy and switch rate
+    ANALYTICS_MAX_GAP: float = float(os.getenv("ANALYTICS_MAX_GAP", 5.0))  # seconds without a detection that end the current dwell
+    ANALYTICS_NEGATIVE_EMOTIONS: str = os.getenv("ANALYTICS_NEGATIVE_EMOTIONS", "sadness,fear,disgust,anger")
+    ANALYTICS_EPISODE_TAU: float = float(os.getenv("ANALYTICS_EPISODE_TAU", 5.0))  # seconds; time constant of the negative share
+    ANALYTICS_EPISODE_ENTER: float = float(os.getenv("ANALYTICS_EPISODE_ENTER", 0.6))  # negative share that opens an episode
+    ANALYTICS_EPISODE_EXIT: float = float(os.getenv("ANALYTICS_EPISODE_EXIT", 0.4))  # ... and that closes it
+    ANALYTICS_EPISODE_MIN_SECONDS: float = float(os.getenv("ANALYTICS_EPISODE_MIN_SECONDS", 10))  # shorter episodes are not reported
+    ANALYTICS_MAX_REPORTS: int = int(os.getenv("ANALYTICS_MAX_REPORTS", 256))  # finished session reports kept
+    
+    # Admin endpoints (profiling); disabled unless a token is set
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")  # sent as "Authorization: Bearer <token>"
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", 60))  # longest CPU profile; also how long a torch session waits for calls
+    PROFILE_MAX_CALLS: int = int(os.getenv("PROFILE_MAX_CALLS", 100))  # most predict_emotion calls one torch session profiles
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))  # seconds between stack samples
     
     # WebSocket
     WEBSOCKET_PATH: str = os.getenv("WEBSOCKET_PATH", "/ws/emotion")
+    # Session recording for replay (benchmarks/replay.py); off unless a directory is set. Recordings contain faces
+    SESSION_RECORD_DIR: str = os.getenv("SESSION_RECORD_DIR", "")
+    SESSION_RECORD_FRACTION: float = float(os.getenv("SESSION_RECORD_FRACTION", 1.0))  # share of sessions recorded
+    SESSION_RECORD_MAX_BYTES: int = int(os.getenv("SESSION_RECORD_MAX_BYTES", 67108864))  # 64MB per session; later frames are not recorded
+    SESSION_RECORD_MAX_FILES: int = int(os.getenv("SESSION_RECORD_MAX_FILES", 100))  # oldest recordings are deleted beyond this
     
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -42,6 +141,10 @@ class Settings(BaseSettings):
         "LOG_FORMAT", 
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
+    LOG_JSON: bool = os.getenv("LOG_JSON", "false").lower() == "true"  # one JSON object per line instead of LOG_FORMAT
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # records beyond this are dropped rather than blocking
+    # "event=N": keep one in N records of a high-frequency event
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "emotion_probs=100,prediction=10,debug_face=100,no_face=50")
     
     @property
     def is_production(self) -> bool:
@@ -0,0 +1,151 @@
+"""
+Non-blocking, structured, sampled logging.
+
+Request and inference threads only put LogRecords on a bounded queue; a
+listener thread formats them and writes to stdout. Messages use %-style
+arguments so nothing is formatted unless a record is actually emitted, and
+high-frequency events (per-frame probability dumps, debug crops) are sampled
+with ``sampled(event)`` before a record is even created.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .metrics import registry
+
+_dropped = registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_sample_rates(spec: str) -> Dict[str, int]:
+    """Parse "event=N,event2=M" into {event: N}; N means one record in N is kept."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = max(1, int(rate))
+    return rates
+
+
+class EventSampler:
+    """Deterministic 1-in-N sampling per event name; events without a rate are always kept."""
+
+    def __init__(self, rates: Dict[str, int]):
+        self.rates = rates
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str) -> bool:
+        rate = self.rates.get(event, 1)
+        if rate == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(event, 0)
+            self._counts[event] = count + 1
+        return count % rate == 0
+
+
+sampled = EventSampler(parse_sample_rates(settings.LOG_SAMPLE_RATES))
+
+
+def log_event(logger: logging.Logger, level: int, event: str, msg: str, *args: Any, **fields: Any) -> None:
+    """
+    Log a structured, sampled event.
+
+    Nothing is built or formatted when the level is disabled or the event is
+    sampled out. ``fields`` become top-level keys in JSON output.
+
+    Example:
+        log_event(logger, logging.INFO, "prediction", "Final prediction: %s (%.2f)", emotion, conf, emotion=emotion)
+    """
+    if logger.isEnabledFor(level) and sampled(event):
+        fields["event"] = event
+        logger.log(level, msg, *args, extra=fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, plus any ``extra=`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and never formats on the calling thread.
+
+    The stock handler formats the message in ``prepare()``, i.e. on the
+    inference thread; here the record goes onto the queue untouched and the
+    listener thread does all formatting. When the queue is full the record is
+    dropped and counted instead of stalling the caller. Objects passed as
+    log arguments are formatted later, so callers must not mutate them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped.inc()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    json_format: bool = settings.LOG_JSON,
+    queue_size: int = settings.LOG_QUEUE_SIZE,
+    stream=None,
+) -> None:
+    """
+    Route all logging through a bounded queue to a background writer thread.
+
+    Safe to call more than once; the previous listener is stopped first.
+    """
+    global _listener, _handler
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(settings.LOG_FORMAT))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+
+def shutdown_logging() -> None:
+    """Detach the queue handler, flush queued records and stop the writer thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
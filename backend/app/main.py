@@ -2,118 +2,56 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, File, UploadFile, H
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import uvicorn
-from app.services.emotion_detector import get_emotion_detector
+from contextlib import asynccontextmanager
+from app.services.emotion_aggregates import get_emotion_aggregator
+from app.services.session_analytics import get_session_analytics
+from app.services.model_manager import model_manager
+from app.services.overload import OverloadedError, get_inference_executor
+from app.services.uploads import MULTIPART_OVERHEAD, UploadLimitMiddleware
+import logging
 import os
 from typing import List, Dict, Any, Optional
 import json
 import asyncio
-import cv2
-import numpy as np
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
-from pydantic import BaseModel
+from datetime import datetime
 
 from .api.api_v1.api import api_router
 from .core.config import settings
+from .core.logs import setup_logging, shutdown_logging
 
-# In-memory storage for emotion data
-class EmotionData(BaseModel):
-    timestamp: datetime
-    emotion: str
-    confidence: float
-
-class EmotionStorage:
-    def __init__(self, max_entries: int = 1000):
-        self.data: List[EmotionData] = []
-        self.max_entries = max_entries
-        self.emotion_counts = defaultdict(int)
-        self.emotion_confidences = defaultdict(list)
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path("uploads")
+STATIC_DIR = Path("static")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup/shutdown hook.
     
-    def add_data(self, emotion: str, confidence: float):
-        """Add new emotion data point"""
-        data_point = EmotionData(
-            timestamp=datetime.utcnow(),
-            emotion=emotion,
-            confidence=confidence
-        )
-        self.data.append(data_point)
-        self.emotion_counts[emotion] += 1
-        self.emotion_confidences[emotion].append(confidence)
-        
-        # Keep only the most recent entries
-        if len(self.data) > self.max_entries:
-            old_data = self.data.pop(0)
-            self.emotion_counts[old_data.emotion] -= 1
-            if self.emotion_counts[old_data.emotion] == 0:
-                del self.emotion_counts[old_data.emotion]
-            self.emotion_confidences[old_data.emotion].pop(0)
-            if not self.emotion_confidences[old_data.emotion]:
-                del self.emotion_confidences[old_data.emotion]
+    Model loading and warmup run in a background thread so the process can
+    answer liveness checks immediately; /api/v1/ready reports when inference
+    is available. Logging goes through a queue to a writer thread, so request
+    and inference threads never block on stdout; emotion aggregates are
+    flushed to the shared SQLite store by another background thread.
+    """
+    setup_logging()
     
-    def get_summary(self, time_window_hours: int = 24) -> Dict[str, Any]:
-        """Get summary of emotion data within the specified time window"""
-        now = datetime.utcnow()
-        time_threshold = now - timedelta(hours=time_window_hours)
-        
-        # Filter data within time window
-        recent_data = [d for d in self.data if d.timestamp >= time_threshold]
-        
-        # Calculate distribution
-        distribution = {}
-        for emotion, count in self.emotion_counts.items():
-            if count > 0:
-                avg_confidence = (
-                    sum(self.emotion_confidences[emotion]) / 
-                    len(self.emotion_confidences[emotion])
-                )
-                distribution[emotion] = {
-                    'count': count,
-                    'avg_confidence': round(avg_confidence, 2)
-                }
-        
-        # Prepare timeline data (group by minute)
-        timeline = []
-        if recent_data:
-            current_minute = recent_data[0].timestamp.replace(second=0, microsecond=0)
-            minute_data = {}
-            
-            for entry in recent_data:
-                entry_minute = entry.timestamp.replace(second=0, microsecond=0)
-                if entry_minute != current_minute:
-                    timeline.append({
-                        'timestamp': current_minute.isoformat(),
-                        **minute_data
-                    })
-                    current_minute = entry_minute
-                    minute_data = {}
-                
-                if entry.emotion not in minute_data:
-                    minute_data[entry.emotion] = 0
-                minute_data[entry.emotion] += 1
-            
-            # Add the last minute
-            if minute_data:
-                timeline.append({
-                    'timestamp': current_minute.isoformat(),
-                    **minute_data
-                })
-        
-        return {
-            'summary': {
-                'total_frames': len(recent_data),
-                'emotion_distribution': distribution,
-                'timeline': timeline
-            }
-        }
-
-# Initialize storage
-emotion_storage = EmotionStorage()
+    # Create necessary directories if they don't exist
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    STATIC_DIR.mkdir(exist_ok=True)
+    
+    model_manager.start(str(settings.MODEL_PATH))
+    get_emotion_aggregator().start()
+    yield
+    get_emotion_aggregator().stop()
+    shutdown_logging()
 
 app = FastAPI(
     title="Mental Health Recognition App",
     description="Mental Health Recognition App",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -125,18 +63,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads while they stream in, before they are spooled or parsed
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/api/v1/analyze/bulk": settings.MAX_BULK_UPLOAD_SIZE,
+        "/api/v1/analyze/": settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        "/api/v1/process-video/": settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+    },
+)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
-# Create necessary directories if they don't exist
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
-STATIC_DIR = Path("static")
-STATIC_DIR.mkdir(exist_ok=True)
-
-# Mount static files directory
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+# Mount static files directory (created at startup)
+app.mount("/static", StaticFiles(directory=str(STATIC_DIR), check_dir=False), name="static")
 
 # WebSocket connection manager
 class ConnectionManager:
@@ -148,7 +89,9 @@ class ConnectionManager:
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        # Tolerates repeated calls: every exit path of the endpoint ends up here
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
 
     async def broadcast(self, message: str):
         for connection in self.active_connections:
@@ -156,64 +99,142 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-# Initialize emotion detector
-emotion_detector = get_emotion_detector(str(settings.MODEL_PATH))
-
 # WebSocket endpoint for real-time processing
 @app.websocket("/ws/emotion")
 async def websocket_endpoint(websocket: WebSocket):
+    # Imported here: pulls in OpenCV, which would slow down app startup
+    from app.services.frame_decoder import FrameDecodeError, decode_frame
+    from app.services.frame_change import FrameChangeDetector, record_reuse
+    from app.services.frame_quality import assess_frame
+    from app.services.session_recording import RecordingWebSocket, start_recording
+    
+    executor = get_inference_executor()
+    aggregator = get_emotion_aggregator()
+    changes = FrameChangeDetector() if settings.FRAME_REUSE_ENABLED else None
+    # Each session is its own client for fair scheduling and the live frame rate quota
+    client = f"ws:{websocket.client.host}:{websocket.client.port}" if websocket.client else f"ws:{id(websocket)}"
+    frame_index = 0
+    last_result = None
+    
     await manager.connect(websocket)
+    # Running per-session statistics, queryable by admins at /api/v1/sessions/{session_id}
+    sessions = get_session_analytics()
+    analytics = sessions.start(client)
+    # Optionally capture the frames and replies for benchmarks/replay.py
+    recording = start_recording(client, {
+        "model_path": settings.MODEL_PATH,
+        "max_image_dim": settings.MAX_IMAGE_DIM,
+        "quality_gate": settings.QUALITY_GATE_ENABLED,
+        "frame_reuse": settings.FRAME_REUSE_ENABLED,
+    })
+    stream = RecordingWebSocket(websocket, recording) if recording is not None else websocket
     try:
         while True:
-            data = await websocket.receive_bytes()
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            data = await stream.receive_bytes()
+            if len(data) > settings.MAX_UPLOAD_SIZE:
+                await stream.send_json({"error": f"Frame exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes"})
+                continue
+            emotion_detector = model_manager.detector
+            if emotion_detector is None:
+                await stream.send_json({"error": "Model is still loading", "status": model_manager.state})
+                continue
+            
+            # Under load, cheaper profiles analyze only every Nth frame and repeat the
+            # last result for the others, without decoding them
+            frame_index += 1
+            skip = executor.controller.profile.frame_skip
+            if last_result is not None and skip > 1 and frame_index % skip:
+                await stream.send_json({**last_result, "skipped": True, "timestamp": datetime.utcnow().isoformat()})
+                continue
+            
+            # Decode JPEG or raw RGB/YUV payloads straight to RGB at the working resolution
+            try:
+                rgb_frame = decode_frame(data, max_dim=settings.MAX_IMAGE_DIM)
+            except FrameDecodeError:
+                rgb_frame = None
+            
+            # Blurry or badly exposed frames never reach the inference queue; the client
+            # keeps the last good result instead of flickering to "no face" or "uncertain"
+            quality = assess_frame(rgb_frame) if rgb_frame is not None and settings.QUALITY_GATE_ENABLED else None
+            if quality is not None and not quality.ok:
+                if last_result is not None:
+                    await stream.send_json({
+                        **last_result,
+                        "skipped": True,
+                        "low_quality": quality.reasons,
+                        "timestamp": datetime.utcnow().isoformat(),
+                    })
+                else:
+                    await stream.send_json({"error": "Low quality frame", "quality": quality.to_dict()})
+                continue
+            
+            # A still subject sends near-identical frames; reuse the result of the last analyzed one
+            reusable, signature = changes.unchanged(rgb_frame) if changes is not None and rgb_frame is not None else (False, None)
+            if reusable:
+                record_reuse("websocket")
+                # Still counted, so the emotion summary does not depend on how often frames are reused
+                aggregator.record(last_result["emotion"], last_result["confidence"])
+                analytics.observe(last_result["emotion"], last_result["confidence"])
+                await stream.send_json({**last_result, "reused": True, "timestamp": datetime.utcnow().isoformat()})
+                continue
             
-            if frame is not None:
+            if rgb_frame is not None:
                 try:
-                    # Convert BGR to RGB
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    # Detect emotion on the inference thread at the quality the current load allows
+                    (emotion, confidence, faces), profile = await executor.run(
+                        lambda profile: emotion_detector.predict_emotion(rgb_frame, profile=profile, stream=client),
+                        kind="live",
+                        client=client,
+                    )
                     
-                    # Detect emotion using the emotion detector
-                    result = emotion_detector.detect_emotion(rgb_frame)
-                    
-                    if result:
-                        emotion = result.emotion
-                        confidence = result.confidence
-                        
-                        # Store the emotion data
-                        emotion_storage.add_data(emotion, confidence)
+                    if faces:
+                        # The session's smoothed prediction, rather than this frame's raw top emotion
+                        emotion, confidence = faces[0]["emotion"], faces[0]["confidence"]
+                        # Store the emotion data (buffered; written to the shared store in the background)
+                        aggregator.record(emotion, confidence)
+                        analytics.observe(emotion, confidence)
                         
                         # Send the result back to the client
-                        emotion_data = {
+                        last_result = {
                             "emotion": emotion,
                             "confidence": confidence,
-                            "timestamp": datetime.utcnow().isoformat()
+                            "quality_profile": profile.name,
+                            "session_id": analytics.session_id,
                         }
-                        await websocket.send_json(emotion_data)
+                        await stream.send_json({**last_result, "timestamp": datetime.utcnow().isoformat()})
+                        if changes is not None:
+                            changes.update(last_result, signature)
                     else:
-                        await websocket.send_json({"error": "No face detected"})
-                        
+                        last_result = None
+                        if changes is not None:
+                            changes.reset()
+                        await stream.send_json({"error": "No face detected"})
+                
+                except OverloadedError as e:
+                    # Dropping the frame is the right call for live video; the client just sends the next one.
+                    # Also covers frames over the session's rate quota or past the live deadline
+                    await stream.send_json({"error": f"Frame dropped: {e}", "retry_after": e.retry_after})
                 except Exception as e:
-                    print(f"Error processing frame: {str(e)}")
-                    await websocket.send_json({"error": f"Error processing frame: {str(e)}"})
+                    logger.error("Error processing frame: %s", e, exc_info=True)
+                    await stream.send_json({"error": f"Error processing frame: {str(e)}"})
             else:
-                await websocket.send_json({"error": "Failed to decode frame"})
+                await stream.send_json({"error": "Failed to decode frame"})
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
-        await websocket.send_json({"error": f"WebSocket error: {str(e)}"})
+        logger.error("WebSocket error: %s", e, exc_info=True)
+        try:
+            await websocket.send_json({"error": f"WebSocket error: {str(e)}"})
+        except Exception:
+            pass  # the socket is already gone
+    finally:
         manager.disconnect(websocket)
-
-# Endpoint to get emotion summary
-@app.get("/api/v1/emotion-summary/")
-async def get_emotion_summary():
-    """
-    Get a summary of detected emotions over time.
-    """
-    return emotion_storage.get_summary()
+        sessions.finish(analytics.session_id)
+        if model_manager.detector is not None:
+            model_manager.detector.smoother.reset(client)
+        if recording is not None:
+            recording.close()
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,272 @@
+"""
+Compare several TorchScript emotion backbones on the same faces.
+
+Frames are decoded, face-detected and preprocessed once by a single
+EmotionDetector; the resulting batch tensor is then handed to every backbone,
+each forward pass running on its own thread (TorchScript releases the GIL).
+Per-model latency, label agreement and pairwise confusion matrices are
+accumulated in a ComparisonReport.
+"""
+import glob
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .emotion_detector import EmotionDetector, FaceCrop
+from .face_backends import FaceRequirements
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LABELS = [name.lower() for name in EmotionDetector.EMOTIONS.values()]
+
+# EMO-AffectNetModel/backbone_models/torchscript_model_<name>.pth
+_BACKBONE_FILE = re.compile(r"^torchscript_model_(?P<name>.+)\.pth?$")
+
+
+def discover_backbones(specs: Iterable[str]) -> Dict[str, str]:
+    """
+    Resolve model specs to {name: path}.
+
+    A spec is ``name=path``, a model file (named after the file, minus the
+    ``torchscript_model_`` prefix) or a directory of ``torchscript_model_*.pth``
+    files laid out like ``EMO-AffectNetModel/backbone_models``.
+    """
+    models: Dict[str, str] = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if sep:
+            models[name] = path
+        elif os.path.isdir(spec):
+            for path in sorted(glob.glob(os.path.join(spec, "*.pt*"))):
+                match = _BACKBONE_FILE.match(os.path.basename(path))
+                if match:
+                    models[match.group("name")] = path
+        else:
+            match = _BACKBONE_FILE.match(os.path.basename(spec))
+            models[match.group("name") if match else os.path.splitext(os.path.basename(spec))[0]] = spec
+    return models
+
+
+@dataclass
+class Backbone:
+    name: str
+    path: str
+    model: torch.nn.Module
+    dtype: torch.dtype
+
+
+@dataclass
+class ComparisonReport:
+    """Accumulates per-face labels and per-batch timings for a set of backbones."""
+    models: List[str]
+    labels: Dict[str, List[int]] = field(default_factory=dict)
+    latency: Dict[str, List[float]] = field(default_factory=dict)      # seconds per forward pass
+    batch_faces: List[int] = field(default_factory=list)
+    stages: Dict[str, float] = field(default_factory=dict)              # seconds spent in shared stages
+    frames: int = 0
+    no_face: int = 0
+
+    def __post_init__(self):
+        for name in self.models:
+            self.labels.setdefault(name, [])
+            self.latency.setdefault(name, [])
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_batch(self, predictions: Dict[str, np.ndarray], timings: Dict[str, float]) -> None:
+        faces = len(next(iter(predictions.values())))
+        self.batch_faces.append(faces)
+        for name in self.models:
+            self.labels[name].extend(int(label) for label in predictions[name])
+            self.latency[name].append(timings[name])
+
+    @property
+    def faces(self) -> int:
+        return sum(self.batch_faces)
+
+    def confusion(self, rows: str, cols: str) -> np.ndarray:
+        """Counts of faces labelled i by ``rows`` and j by ``cols``."""
+        matrix = np.zeros((len(LABELS), len(LABELS)), dtype=np.int64)
+        np.add.at(matrix, (np.asarray(self.labels[rows], dtype=np.int64), np.asarray(self.labels[cols], dtype=np.int64)), 1)
+        return matrix
+
+    def agreement(self) -> np.ndarray:
+        """Pairwise fraction of faces on which two models pick the same emotion."""
+        n = len(self.models)
+        matrix = np.ones((n, n))
+        if not self.faces:
+            return matrix
+        labels = np.array([self.labels[name] for name in self.models])
+        for i in range(n):
+            for j in range(i + 1, n):
+                matrix[i, j] = matrix[j, i] = float(np.mean(labels[i] == labels[j]))
+        return matrix
+
+    def unanimous(self) -> float:
+        """Fraction of faces on which every model agrees."""
+        if not self.faces:
+            return 0.0
+        labels = np.array([self.labels[name] for name in self.models])
+        return float(np.mean((labels == labels[0]).all(axis=0)))
+
+    def latency_stats(self, name: str) -> Dict[str, float]:
+        times = np.asarray(self.latency[name])
+        if not len(times):
+            return {}
+        return {
+            "batches": len(times),
+            "mean_ms": round(float(times.mean()) * 1000, 2),
+            "p50_ms": round(float(np.percentile(times, 50)) * 1000, 2),
+            "p95_ms": round(float(np.percentile(times, 95)) * 1000, 2),
+            "per_face_ms": round(float(times.sum()) / max(1, self.faces) * 1000, 3),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "models": self.models,
+            "frames": self.frames,
+            "faces": self.faces,
+            "no_face": self.no_face,
+            "labels": LABELS,
+            "shared_stages_seconds": {k: round(v, 3) for k, v in self.stages.items()},
+            "latency": {name: self.latency_stats(name) for name in self.models},
+            "label_distribution": {
+                name: dict(zip(LABELS, np.bincount(self.labels[name], minlength=len(LABELS)).tolist()))
+                for name in self.models
+            },
+            "agreement": {
+                a: {b: round(float(v), 4) for b, v in zip(self.models, row)}
+                for a, row in zip(self.models, self.agreement())
+            },
+            "unanimous": round(self.unanimous(), 4),
+            "confusion": {
+                f"{a}__vs__{b}": self.confusion(a, b).tolist()
+                for i, a in enumerate(self.models) for b in self.models[i + 1:]
+            },
+        }
+
+    def format(self) -> str:
+        """Plain-text summary: latency table, agreement matrix and the confusion matrix against the first model."""
+        width = max(12, *(len(name) + 2 for name in self.models))
+        lines = [f"{self.frames} frames, {self.faces} faces ({self.no_face} without a usable face)", ""]
+        lines.append(f"{'model':<{width}}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'ms/face':>10}")
+        for name in self.models:
+            stats = self.latency_stats(name)
+            if stats:
+                lines.append(
+                    f"{name:<{width}}{stats['mean_ms']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['per_face_ms']:>10}"
+                )
+        if self.stages:
+            lines.append("shared: " + ", ".join(f"{k} {v:.2f}s" for k, v in self.stages.items()))
+
+        lines += ["", "agreement" + " " * (width - 9) + "".join(f"{name[:9]:>10}" for name in self.models)]
+        for name, row in zip(self.models, self.agreement()):
+            lines.append(f"{name:<{width}}" + "".join(f"{v:>10.3f}" for v in row))
+        lines.append(f"unanimous: {self.unanimous():.3f}")
+
+        reference = self.models[0]
+        for other in self.models[1:]:
+            lines += ["", f"confusion: rows {reference}, columns {other}"]
+            lines.append(" " * 11 + "".join(f"{label[:8]:>9}" for label in LABELS))
+            for label, row in zip(LABELS, self.confusion(reference, other)):
+                lines.append(f"{label:<11}" + "".join(f"{v:>9}" for v in row))
+        return "\n".join(lines)
+
+
+def run_backbones(backbones: List[Backbone], batch: torch.Tensor, pool: ThreadPoolExecutor) -> Tuple[Dict[str, torch.Tensor], Dict[str, float]]:
+    """
+    Run one preprocessed batch through every backbone concurrently.
+
+    Returns:
+        Tuple of ({name: logits on the CPU}, {name: seconds for its forward pass})
+    """
+    def forward(backbone: Backbone) -> Tuple[torch.Tensor, float]:
+        start = time.perf_counter()
+        with torch.no_grad():
+            logits = backbone.model(batch.to(dtype=backbone.dtype)).float().cpu()
+        return logits, time.perf_counter() - start
+
+    futures = {backbone.name: pool.submit(forward, backbone) for backbone in backbones}
+    outputs, timings = {}, {}
+    for name, future in futures.items():
+        outputs[name], timings[name] = future.result()
+    return outputs, timings
+
+
+class BackboneComparison:
+    """
+    One shared decode/detect/preprocess pipeline fanned out to several backbones.
+
+    Args:
+        models: {name: TorchScript path}; the first model is the reference the
+            others are compared against and also backs the shared detector
+        face_backend: Face detector backend for the shared pipeline
+        threads_per_model: Torch intra-op threads per concurrent forward pass
+            (default: CPU count divided by the number of models)
+    """
+
+    def __init__(self, models: Dict[str, str], face_backend: Optional[str] = None, threads_per_model: Optional[int] = None):
+        if not models:
+            raise ValueError("No backbones to compare")
+        names = list(models)
+        # Every forward pass gets its own OpenMP team of this size; keep the total at the core count
+        torch.set_num_threads(threads_per_model or max(1, (os.cpu_count() or 1) // len(names)))
+
+        self.detector = EmotionDetector(models[names[0]], face_backend or settings.FACE_BACKEND)
+        self.backbones: List[Backbone] = []
+        for name in names:
+            model = self.detector.model if name == names[0] else self.detector._load_model(models[name])
+            self.backbones.append(Backbone(name, models[name], model, next(model.parameters()).dtype))
+        self.pool = ThreadPoolExecutor(max_workers=len(self.backbones), thread_name_prefix="backbone")
+        self.report = ComparisonReport(names)
+
+    def _crops(self, frames: List[np.ndarray]) -> List[FaceCrop]:
+        requirements, face_backend, max_dim = self.detector._degrade(FaceRequirements(), None, None)
+        _, crops, _ = self.detector._crop_batch(frames, requirements, face_backend, max_dim, None)
+        return crops
+
+    def compare(self, frames: List[np.ndarray]) -> List[Dict[str, str]]:
+        """
+        Compare all backbones on one batch of frames.
+
+        Labels are the raw top emotion after temperature scaling and class
+        weights, without temporal smoothing or the low-confidence overrides, so
+        the models are compared on their own outputs.
+
+        Returns:
+            Per detected face, {model name: emotion}
+        """
+        self.report.frames += len(frames)
+        start = time.perf_counter()
+        crops = self._crops(frames)
+        self.report.add_stage("detect", time.perf_counter() - start)
+        self.report.no_face += len(frames) - len(crops)
+        if not crops:
+            return []
+
+        start = time.perf_counter()
+        batch = torch.cat([self.detector._preprocess_face(crop.image) for crop in crops]).float()
+        self.report.add_stage("preprocess", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        outputs, timings = run_backbones(self.backbones, batch, self.pool)
+        self.report.add_stage("models_wall", time.perf_counter() - start)
+
+        predictions = {
+            name: self.detector.postprocessor.distribution(logits).argmax(axis=1)
+            for name, logits in outputs.items()
+        }
+        self.report.add_batch(predictions, timings)
+        return [{name: LABELS[predictions[name][row]] for name in predictions} for row in range(len(crops))]
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
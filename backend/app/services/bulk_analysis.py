@@ -0,0 +1,215 @@
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .emotion_detector import EmotionDetector
+from .face_backends import FaceRequirements
+from .frame_decoder import FrameDecodeError, decode_frame
+from .frame_quality import FrameQuality, assess_frame
+from .overload import InferenceExecutor
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff", ".raw"}
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_image_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith(".") and os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_upload_entries(filename: str, fileobj: BinaryIO, max_entry_size: int) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Yield (name, bytes) for every image in an upload, streaming through archives.
+
+    Zip and tar archives are read one entry at a time; anything else is treated
+    as a single image. Entries larger than ``max_entry_size`` are yielded with
+    ``None`` bytes so the caller can report them.
+
+    Args:
+        filename: Name of the uploaded file, used to detect archives
+        fileobj: Open binary file object positioned at the start of the upload
+        max_entry_size: Maximum size of a single image in bytes
+    """
+    lower = (filename or "").lower()
+    if lower.endswith(ZIP_EXTENSIONS):
+        # Zip needs its central directory, which UploadFile's spooled temp file can seek to
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                if info.file_size > max_entry_size:
+                    yield info.filename, None
+                    continue
+                with archive.open(info) as entry:
+                    yield info.filename, entry.read()
+    elif lower.endswith(TAR_EXTENSIONS):
+        # Stream mode: entries are read strictly in order without seeking
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not is_image_name(member.name):
+                    continue
+                if member.size > max_entry_size:
+                    yield member.name, None
+                    continue
+                entry = archive.extractfile(member)
+                yield member.name, entry.read() if entry is not None else None
+    else:
+        data = fileobj.read(max_entry_size + 1)
+        yield filename, data if len(data) <= max_entry_size else None
+
+
+Decoded = Tuple[int, str, Optional[np.ndarray], Optional[str], Optional[FrameQuality]]
+
+
+def _decode(item: Tuple[int, str, Optional[bytes]], max_dim: int, quality_gate: bool) -> Decoded:
+    index, name, data = item
+    if data is None:
+        return index, name, None, "File exceeds the maximum upload size", None
+    try:
+        frame = decode_frame(data, max_dim=max_dim)
+    except FrameDecodeError as e:
+        return index, name, None, str(e), None
+    # Assessed here so the checks run in parallel with decoding, off the inference thread
+    return index, name, frame, None, assess_frame(frame) if quality_gate else None
+
+
+def _decoded_stream(
+    entries: Iterable[Tuple[str, Optional[bytes]]],
+    pool: ThreadPoolExecutor,
+    max_dim: int,
+    window: int,
+    quality_gate: bool = False,
+) -> Iterator[Decoded]:
+    """Decode entries on the pool, keeping at most ``window`` decodes in flight, in input order."""
+    in_flight: deque = deque()
+    for index, (name, data) in enumerate(entries):
+        in_flight.append(pool.submit(_decode, (index, name, data), max_dim, quality_gate))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def _image_result(index: int, name: str, prediction: Tuple[str, float, List[dict]]) -> Dict[str, Any]:
+    emotion, confidence, all_faces = prediction
+    if not all_faces:
+        return {"index": index, "filename": name, "status": "success", "emotion": emotion, "confidence": 0.0}
+    return {
+        "index": index,
+        "filename": name,
+        "status": "success",
+        "emotion": emotion.lower(),
+        "confidence": float(confidence),
+        "all_faces": all_faces,
+    }
+
+
+def analyze_entries(
+    entries: Iterable[Tuple[str, Optional[bytes]]],
+    detector: EmotionDetector,
+    requirements: Optional[FaceRequirements] = None,
+    face_backend: Optional[str] = None,
+    batch_size: int = settings.BULK_BATCH_SIZE,
+    decode_workers: int = settings.BULK_DECODE_WORKERS,
+    executor: Optional[InferenceExecutor] = None,
+    quality_gate: bool = False,
+    client: str = "anonymous",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Analyze a stream of images: parallel decode, batched inference, results as they finish.
+
+    Memory stays bounded by the decode window and the batch size, independent
+    of how many entries the stream contains. Results come out in input order:
+    an image that skips inference waits behind the batch before it.
+
+    Args:
+        entries: (name, bytes) pairs, e.g. from ``iter_upload_entries``
+        detector: Emotion detector to classify faces with
+        requirements: What the caller needs from face detection
+        face_backend: Backend name overriding the detector's default
+        batch_size: Number of images per forward pass
+        decode_workers: Number of decoder threads
+        executor: Run batches through this inference executor (sharing the model
+            with live traffic at the current quality profile) instead of calling
+            the detector directly
+        quality_gate: Run the frame quality checks in the decode workers and
+            report rejected images as "low_quality" without running inference
+        client: Who the executor schedules and rate limits the batches as
+
+    Yields:
+        One result dict per image in input order, followed by a final summary dict
+    """
+    start = time.perf_counter()
+    counts = {"images": 0, "errors": 0, "faces": 0, "low_quality": 0}
+    batch: List[Tuple[int, str, np.ndarray]] = []
+    held: List[Dict[str, Any]] = []  # results of images that skipped inference while a batch was filling
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        frames = [frame for _, _, frame in batch]
+        if executor is None:
+            predictions, profile = detector.predict_batch(frames, requirements, face_backend), None
+        else:
+            # Admitted as a whole by the caller; individual batches wait rather than being shed
+            predictions, profile = executor.call(
+                lambda p: detector.predict_batch(frames, requirements, face_backend, profile=p),
+                shed=False, client=client, cost=len(frames),
+            )
+        results = held
+        for (index, name, _), prediction in zip(batch, predictions):
+            counts["faces"] += bool(prediction[2])
+            result = _image_result(index, name, prediction)
+            if profile is not None:
+                result["quality_profile"] = profile.name
+            results.append(result)
+        yield from sorted(results, key=lambda result: result["index"])
+        batch.clear()
+        held.clear()
+
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="bulk-decode") as pool:
+        decoded = _decoded_stream(entries, pool, detector.max_dim, window=batch_size * 2, quality_gate=quality_gate)
+        for index, name, frame, error, quality in decoded:
+            counts["images"] += 1
+            if frame is None:
+                counts["errors"] += 1
+                result = {"index": index, "filename": name, "status": "error", "message": error}
+            elif quality is not None and not quality.ok:
+                counts["low_quality"] += 1
+                result = {
+                    "index": index,
+                    "filename": name,
+                    "status": "success",
+                    "emotion": "low_quality",
+                    "confidence": 0.0,
+                    "quality": quality.to_dict(),
+                }
+            else:
+                batch.append((index, name, frame))
+                if len(batch) >= batch_size:
+                    yield from flush()
+                continue
+            if batch:
+                held.append(result)
+            else:
+                yield result
+        if batch:
+            yield from flush()
+
+    elapsed = time.perf_counter() - start
+    yield {
+        "summary": {
+            **counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(counts["images"] / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+    }
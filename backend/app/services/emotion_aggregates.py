@@ -0,0 +1,366 @@
+"""
+Emotion aggregates shared by every worker process on a host.
+
+Each uvicorn worker records its detections into a local buffer; a background
+thread folds the buffer into per-minute (count, confidence sum) buckets and
+upserts them into one WAL-mode SQLite database in a single transaction. Every
+worker reads its summary from that database, so all of them answer
+``/emotion-summary`` with the same numbers, at most one flush interval old.
+
+The inference path only appends a tuple to a deque (atomic under the GIL),
+so it never waits on SQLite, the flusher, or another process.
+
+Every flush bumps a global version and stamps the buckets it touched with it.
+That version is the cursor for delta queries (only buckets stamped after the
+client's cursor) and part of the ETag, so an unchanged summary can be answered
+304 from a cached version number without touching the buckets.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_recorded = registry.counter("emotion_aggregate_records_total", "Detections recorded for the shared emotion summary")
+_dropped = registry.counter("emotion_aggregate_dropped_total", "Detections dropped because the aggregate buffer was full")
+_flush_seconds = registry.histogram("emotion_aggregate_flush_seconds", "Time to write one batch of aggregates to SQLite")
+_flush_errors = registry.counter("emotion_aggregate_flush_errors_total", "Failed aggregate flushes")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emotion_buckets (
+    minute INTEGER NOT NULL,        -- unix time of the bucket start, a multiple of 60
+    emotion TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,  -- flush that last changed the bucket
+    PRIMARY KEY (minute, emotion)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS emotion_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO emotion_meta (key, value) VALUES ('version', 0);
+"""
+
+_UPSERT = """
+INSERT INTO emotion_buckets (minute, emotion, count, confidence_sum, version) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (minute, emotion) DO UPDATE SET
+    count = count + excluded.count,
+    confidence_sum = confidence_sum + excluded.confidence_sum,
+    version = excluded.version
+"""
+
+_VERSION = "SELECT value FROM emotion_meta WHERE key = 'version'"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL never corrupts the database; a power cut may lose the last flush
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(emotion_buckets)")}
+    if "version" not in columns:
+        # Databases created before delta queries existed
+        conn.execute("ALTER TABLE emotion_buckets ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS emotion_buckets_version ON emotion_buckets (version)")
+    conn.commit()
+    return conn
+
+
+def _window_start(time_window_hours: float) -> int:
+    """Start of the first minute bucket inside the window."""
+    return int(time.time() - time_window_hours * 3600) // 60 * 60
+
+
+def _timeline(rows: List[tuple]) -> List[Dict[str, Any]]:
+    """Per-minute {"timestamp", emotion: count, ...} entries from (minute, emotion, count, ...) rows ordered by minute."""
+    timeline: List[Dict[str, Any]] = []
+    for minute, emotion, count, *_ in rows:
+        timestamp = datetime.utcfromtimestamp(minute).isoformat()
+        if not timeline or timeline[-1]["timestamp"] != timestamp:
+            timeline.append({"timestamp": timestamp})
+        timeline[-1][emotion] = count
+    return timeline
+
+
+def _distribution(rows: List[tuple]) -> Dict[str, Dict[str, Any]]:
+    """{emotion: {"count", "avg_confidence"}} from (emotion, count, confidence_sum) rows."""
+    return {
+        emotion: {"count": int(count), "avg_confidence": round(confidence_sum / count, 2)}
+        for emotion, count, confidence_sum in rows
+        if count
+    }
+
+
+class EmotionAggregator:
+    """
+    Per-minute emotion counts in a SQLite database shared across processes.
+
+    Args:
+        path: SQLite database file; every worker on the host must use the same one
+        flush_interval: Seconds between background flushes
+        retention_hours: Buckets older than this are deleted
+        max_pending: Detections buffered between flushes before new ones are dropped
+        version_ttl: Seconds this worker reuses the store version it last read;
+            summaries and deltas are cached per version
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        retention_hours: float = 48.0,
+        max_pending: int = 100_000,
+        version_ttl: float = 0.25,
+    ):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.retention_hours = retention_hours
+        self.max_pending = max_pending
+        self.version_ttl = version_ttl
+        self._pending: Deque[Tuple[float, str, float]] = deque()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._version = 0
+        self._version_read_at = float("-inf")
+        self._summary_cache: Dict[Tuple[float, int], Tuple[int, Dict[str, Any]]] = {}
+        self._delta_cache: Dict[Tuple[float, int, int], Tuple[int, Dict[str, Any]]] = {}
+        self._last_prune = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, emotion: str, confidence: float, timestamp: Optional[float] = None) -> None:
+        """Buffer one detection. Never blocks: no lock, no I/O."""
+        if len(self._pending) >= self.max_pending:
+            _dropped.inc()
+            return
+        self._pending.append((time.time() if timestamp is None else timestamp, emotion, confidence))
+        _recorded.inc()
+        if self._thread is None:
+            self.start()
+
+    def start(self) -> None:
+        """Start the background flusher; subsequent calls are no-ops."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="emotion-aggregates", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Flush what is buffered and stop the flusher."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        self.flush()
+        with self._write_lock, self._read_lock:
+            for conn in (self._conn, self._read_conn):
+                if conn is not None:
+                    conn.close()
+            self._conn = self._read_conn = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                _flush_errors.inc()
+                logger.error(f"Failed to flush emotion aggregates: {e}", exc_info=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+        return self._conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # Separate from the flusher's connection, so a summary never waits for a write
+        if self._read_conn is None:
+            self._read_conn = _connect(self.path)
+        return self._read_conn
+
+    def flush(self) -> int:
+        """
+        Fold buffered detections into minute buckets and write them in one transaction.
+
+        Returns:
+            Number of detections written
+        """
+        with self._write_lock:
+            drained = 0
+            buckets: Dict[Tuple[int, str], List[float]] = {}
+            # popleft() while record() appends is safe without a lock
+            while self._pending:
+                timestamp, emotion, confidence = self._pending.popleft()
+                bucket = buckets.setdefault((int(timestamp) // 60 * 60, emotion), [0, 0.0])
+                bucket[0] += 1
+                bucket[1] += confidence
+                drained += 1
+
+            now = time.time()
+            prune = now - self._last_prune >= 60
+            if not buckets and not prune:
+                return 0
+            start = time.perf_counter()
+            conn = self._connection()
+            with conn:
+                if buckets:
+                    # The version bump takes SQLite's write lock, so concurrent workers get distinct versions
+                    conn.execute("UPDATE emotion_meta SET value = value + 1 WHERE key = 'version'")
+                    version = conn.execute(_VERSION).fetchone()[0]
+                    conn.executemany(_UPSERT, [
+                        (minute, emotion, n, total, version) for (minute, emotion), (n, total) in buckets.items()
+                    ])
+                if prune:
+                    conn.execute("DELETE FROM emotion_buckets WHERE minute < ?", (int(now - self.retention_hours * 3600),))
+                    self._last_prune = now
+            _flush_seconds.observe(time.perf_counter() - start)
+            return drained
+
+    def current_version(self) -> int:
+        """The store's version, re-read at most every ``version_ttl`` seconds."""
+        now = time.monotonic()
+        if now - self._version_read_at >= self.version_ttl:
+            with self._read_lock:
+                self._version = self._reader().execute(_VERSION).fetchone()[0]
+            self._version_read_at = now
+        return self._version
+
+    def etag(self, time_window_hours: float = 24, cursor: Optional[int] = None) -> str:
+        """
+        Entity tag of the summary (or of the delta since ``cursor``) as it is now.
+
+        Changes when new detections are flushed or the window slides to the next minute.
+        """
+        tag = f"{self.current_version()}-{_window_start(time_window_hours)}-{time_window_hours:g}"
+        return f'"{tag}"' if cursor is None else f'"{tag}-{cursor}"'
+
+    def _snapshot(self, query: str, params: tuple, distribution_since: int) -> Tuple[int, List[tuple], List[tuple]]:
+        """Run a bucket query and the window's per-emotion totals against one consistent snapshot."""
+        with self._read_lock:
+            conn = self._reader()
+            conn.execute("BEGIN")
+            try:
+                version = conn.execute(_VERSION).fetchone()[0]
+                rows = conn.execute(query, params).fetchall()
+                totals = conn.execute(
+                    "SELECT emotion, SUM(count), SUM(confidence_sum) FROM emotion_buckets WHERE minute >= ? GROUP BY emotion",
+                    (distribution_since,),
+                ).fetchall()
+            finally:
+                conn.commit()
+        self._version, self._version_read_at = version, time.monotonic()
+        return version, rows, totals
+
+    def get_summary(self, time_window_hours: float = 24) -> Dict[str, Any]:
+        """
+        Distribution and per-minute timeline over the window, identical on every worker.
+
+        Reads never block the flushers of other workers (WAL readers see the
+        last committed snapshot). The result is cached until the store version
+        changes or the window slides, so polling clients don't each run the query.
+
+        Returns:
+            {"summary": {...}, "cursor": version to pass to ``get_delta`` next}
+        """
+        since = _window_start(time_window_hours)
+        key = (time_window_hours, since)
+        cached = self._summary_cache.get(key)
+        if cached is not None and cached[0] == self.current_version():
+            return cached[1]
+
+        version, rows, totals = self._snapshot(
+            "SELECT minute, emotion, count FROM emotion_buckets WHERE minute >= ? ORDER BY minute", (since,), since
+        )
+        distribution = _distribution(totals)
+        summary = {
+            "summary": {
+                "total_frames": sum(entry["count"] for entry in distribution.values()),
+                "emotion_distribution": distribution,
+                "timeline": _timeline(rows),
+            },
+            "cursor": version,
+        }
+        # Only the current window is worth keeping
+        self._summary_cache = {k: v for k, v in self._summary_cache.items() if k[0] != time_window_hours}
+        self._summary_cache[key] = (version, summary)
+        return summary
+
+    def get_delta(self, cursor: int, time_window_hours: float = 24) -> Dict[str, Any]:
+        """
+        What changed since ``cursor`` (a version returned by an earlier call).
+
+        ``timeline`` holds only the minute buckets written since the cursor,
+        each complete, so clients replace buckets with the same timestamp and
+        append new ones; buckets older than ``window_start`` have left the
+        window and should be dropped. The distribution (one entry per emotion)
+        is always sent whole. A cursor from the future -- e.g. after the
+        database was reset -- yields the full summary with ``reset`` set.
+
+        Returns:
+            {"cursor", "window_start", "reset", "total_frames", "emotion_distribution", "timeline"}
+        """
+        since = _window_start(time_window_hours)
+        key = (time_window_hours, since, cursor)
+        cached = self._delta_cache.get(key)
+        if cached is not None and cached[0] == self.current_version():
+            return cached[1]
+
+        version, rows, totals = self._snapshot(
+            "SELECT minute, emotion, count FROM emotion_buckets WHERE minute IN ("
+            "SELECT DISTINCT minute FROM emotion_buckets WHERE version > ? AND minute >= ?"
+            ") ORDER BY minute",
+            (cursor, since),
+            since,
+        )
+        reset = cursor > version
+        if reset:
+            return {**self.get_summary(time_window_hours)["summary"], "cursor": version,
+                    "window_start": datetime.utcfromtimestamp(since).isoformat(), "reset": True}
+        distribution = _distribution(totals)
+        delta = {
+            "cursor": version,
+            "window_start": datetime.utcfromtimestamp(since).isoformat(),
+            "reset": False,
+            "total_frames": sum(entry["count"] for entry in distribution.values()),
+            "emotion_distribution": distribution,
+            "timeline": _timeline(rows),
+        }
+        # Clients polling in step share a handful of cursors; keep the cache small
+        if len(self._delta_cache) >= 64:
+            self._delta_cache.clear()
+        self._delta_cache[key] = (version, delta)
+        return delta
+
+
+# Singleton instance
+emotion_aggregator = None
+
+def get_emotion_aggregator() -> EmotionAggregator:
+    """Return the process-wide aggregator, creating it on first use."""
+    global emotion_aggregator
+    if emotion_aggregator is None:
+        emotion_aggregator = EmotionAggregator(
+            str(settings.AGGREGATES_DB_PATH),
+            flush_interval=settings.AGGREGATES_FLUSH_INTERVAL,
+            retention_hours=settings.AGGREGATES_RETENTION_HOURS,
+        )
+    return emotion_aggregator
@@ -1,57 +1,100 @@
 import cv2
 import numpy as np
 import torch
-import mediapipe as mp
 from PIL import Image
-from typing import Tuple, List
+from typing import Callable, Tuple, List, Optional
 from datetime import datetime
 from torchvision import transforms
 import logging
 import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from .face_backends import (
+    BackendPool,
+    DetectedFace,
+    FaceRequirements,
+    MediaPipeFaceMeshBackend,
+    MediaPipeFaceMeshRefinedBackend,
+)
+from .frame_quality import face_yaw_ratio, record_face_rejection
+from .overload import QualityProfile
+from .postprocessing import Postprocessor, parse_fallbacks, parse_runner_up, smoother_from_settings
+from .result_cache import face_key, get_face_cache, model_identity
+from ..core.config import settings
+from ..core.logs import log_event
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class FaceCrop:
+    """A validated, enhanced face crop ready for the model."""
+    face: DetectedFace
+    bbox: dict
+    image: np.ndarray
+    backend: str
+    cache_key: Optional[str] = None
+
 class EmotionDetector:
     EMOTIONS = {
         0: 'Neutral', 1: 'Happiness', 2: 'Sadness', 3: 'Surprise',
         4: 'Fear', 5: 'Disgust', 6: 'Anger'
     }
+    
+    # Methods a TorchScript backbone may expose that return features instead of logits
+    FEATURE_METHODS = ("extract_features", "forward_features", "features")
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, face_backend: str = settings.FACE_BACKEND):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = self._load_model(model_path)
         self.model.eval()  # Set model to evaluation mode
+        self.model_id = model_identity(model_path)
         
-        # Class weights to handle imbalance (adjust these based on your training data distribution)
-        self.class_weights = {
-            'neutral': 1.0,
-            'happiness': 1.0,
-            'sadness': 1.0,
-            'surprise': 1.0,
-            'fear': 1.0,
-            'disgust': 1.0,
-            'anger': 1.0  
-        }
-        
-        # Temperature scaling for softmax (higher = softer probabilities)
-        self.temperature = 1.5
-        
-        # Initialize MediaPipe Face Mesh with optimized settings
-        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
-            static_image_mode=False,  # Better for video streams
-            max_num_faces=1,
-            refine_landmarks=True,    # Use refined landmarks for better accuracy
-            min_detection_confidence=0.4,  # Lower threshold for better detection
-            min_tracking_confidence=0.4    # Lower threshold for tracking
-        )
+        # Penultimate-layer feature extractor for embeddings, resolved on first use
+        self._feature_fn: Optional[Callable[[torch.Tensor], torch.Tensor]] = None
+        self.embedding_source: Optional[str] = None
         
         # Confidence thresholds
         self.min_confidence = 0.25      # 25% minimum confidence threshold
         self.high_confidence = 0.6      # 60% for high confidence predictions
         
-        # Cache for previous predictions (for temporal smoothing)
-        self.previous_predictions = []
-        self.max_history = 5  # Number of previous predictions to consider
+        # Softmax, class weights and override rules, applied to a whole batch of logits at once
+        self.postprocessor = Postprocessor(
+            [self.EMOTIONS[idx] for idx in sorted(self.EMOTIONS)],
+            # Temperature scaling for softmax (higher = softer probabilities)
+            temperature=1.5,
+            # Class weights to handle imbalance (adjust these based on your training data distribution)
+            class_weights={
+                'neutral': 1.0,
+                'happiness': 1.0,
+                'sadness': 1.0,
+                'surprise': 1.0,
+                'fear': 1.0,
+                'disgust': 1.0,
+                'anger': 1.0
+            },
+            min_confidence=self.min_confidence,
+            fallbacks=parse_fallbacks(settings.LOW_CONFIDENCE_FALLBACKS),
+            runner_up=parse_runner_up(settings.RUNNER_UP_OVERRIDES),
+        )
+        
+        # Temporal smoothing of the probability vectors of consecutive frames, per stream
+        self.smoother = smoother_from_settings(len(self.EMOTIONS))
+        
+        # Frames are downsized to this long side before face detection
+        self.max_dim = settings.MAX_IMAGE_DIM
+        
+        # Face detector backends are created on first use; "auto" picks the
+        # cheapest available backend that meets each request's requirements.
+        # Frames of a stream may track the face from one frame to the next;
+        # unrelated images (single uploads, bulk, batch) are detected afresh
+        self.face_backend = face_backend
+        self.face_backends = BackendPool(max_faces=1)
+        self.image_backends = BackendPool(max_faces=1, static_image=True)
+        
+        # Optional cache of model outputs keyed by a perceptual hash of the face crop
+        self.face_cache = get_face_cache()
         
         # Image preprocessing pipeline
         self.transform = transforms.Compose([
@@ -61,9 +104,17 @@ class EmotionDetector:
                                std=[0.229, 0.224, 0.225])
         ])
         
-        # Create debug directory
-        os.makedirs("debug_faces", exist_ok=True)
-        logger.info("EmotionDetector initialized with MediaPipe face detection")
+        # Debug face crops are opt-in; the directory keeps only the newest DEBUG_FACES_MAX_FILES
+        self.save_debug_faces = settings.DEBUG_SAVE_FACES
+        self.debug_faces_dir = settings.DEBUG_FACES_DIR
+        self._debug_faces: deque = deque()
+        if self.save_debug_faces:
+            os.makedirs(self.debug_faces_dir, exist_ok=True)
+            # Pick up crops from earlier runs so the cap covers them too
+            self._debug_faces.extend(sorted(
+                str(path) for path in self.debug_faces_dir.glob("face_*.jpg")
+            ))
+        logger.info(f"EmotionDetector initialized with face detector backend: {face_backend}")
 
     def _load_model(self, model_path: str) -> torch.nn.Module:
         model = torch.jit.load(model_path, map_location=self.device)
@@ -71,12 +122,21 @@ class EmotionDetector:
         logger.info(f"Loaded model from {model_path} | dtype: {next(model.parameters()).dtype}")
         return model
 
-    def _get_bbox(self, landmarks, img_w: int, img_h: int, padding_ratio: float = 0.2) -> Tuple[int, int, int, int]:
+    def warmup(self) -> None:
+        """Run the face detector and the model once so the first request doesn't pay for lazy init."""
+        blank = np.zeros((self.max_dim * 3 // 4, self.max_dim, 3), dtype=np.uint8)
+        for pool in (self.face_backends, self.image_backends):
+            pool.get(FaceRequirements(), self.face_backend).detect(blank)
+        dtype = next(self.model.parameters()).dtype
+        with torch.no_grad():
+            self.model(torch.zeros((1, 3, 224, 224), dtype=dtype, device=self.device))
+
+    def _get_bbox(self, face: DetectedFace, img_w: int, img_h: int, padding_ratio: float = 0.2) -> Tuple[int, int, int, int]:
         """
-        Calculate bounding box from facial landmarks with adaptive padding.
+        Calculate bounding box from a detected face with adaptive padding.
         
         Args:
-            landmarks: MediaPipe face landmarks
+            face: Face returned by the detector backend
             img_w: Image width
             img_h: Image height
             padding_ratio: Ratio of face size to use as padding
@@ -84,13 +144,8 @@ class EmotionDetector:
         Returns:
             Tuple of (x_min, y_min, x_max, y_max) coordinates
         """
-        # Get all landmark coordinates
-        x_coords = [lm.x * img_w for lm in landmarks.landmark]
-        y_coords = [lm.y * img_h for lm in landmarks.landmark]
-        
-        # Calculate initial bounding box
-        x_min, x_max = int(min(x_coords)), int(max(x_coords))
-        y_min, y_max = int(min(y_coords)), int(max(y_coords))
+        # Initial bounding box as reported by the detector
+        x_min, y_min, x_max, y_max = face.bbox
         
         # Calculate adaptive padding based on face size
         face_width = x_max - x_min
@@ -167,244 +222,503 @@ class EmotionDetector:
         model_dtype = next(self.model.parameters()).dtype
         return tensor.to(dtype=model_dtype, device=self.device)
 
-    def _is_valid_face(self, landmarks, frame_shape) -> bool:
-        """Check if the detected face is valid based on landmarks."""
+    def _is_valid_face(self, face: DetectedFace, frame_shape) -> bool:
+        """Check if the detected face is valid based on its bounding box."""
         h, w = frame_shape[:2]
         
-        # Get all landmark coordinates
-        x_coords = [lm.x * w for lm in landmarks.landmark]
-        y_coords = [lm.y * h for lm in landmarks.landmark]
-        
         # Calculate face dimensions
-        face_width = max(x_coords) - min(x_coords)
-        face_height = max(y_coords) - min(y_coords)
+        x_min, y_min, x_max, y_max = face.bbox
+        face_width = x_max - x_min
+        face_height = y_max - y_min
+        if face_height <= 0:
+            return False
         
         # Check if face is too small
         min_face_size = min(w, h) * 0.1  # At least 10% of image dimension
         if face_width < min_face_size or face_height < min_face_size:
-            logger.warning(f"Face too small: {face_width}x{face_height}px")
+            log_event(logger, logging.WARNING, "invalid_face", "Face too small: %dx%dpx", face_width, face_height,
+                      reason="too_small")
             return False
             
         # Check face aspect ratio (should be roughly 1:1 for frontal faces)
         aspect_ratio = face_width / face_height
         if aspect_ratio < 0.5 or aspect_ratio > 2.0:
-            logger.warning(f"Invalid face aspect ratio: {aspect_ratio:.2f}")
+            log_event(logger, logging.WARNING, "invalid_face", "Invalid face aspect ratio: %.2f", aspect_ratio,
+                      reason="aspect_ratio")
             return False
             
         return True
 
-    def _smooth_predictions(self, current_emotion: str, confidence: float) -> Tuple[str, float]:
-        """Apply temporal smoothing to predictions using a simple moving average."""
-        if confidence < self.min_confidence:
-            return current_emotion, confidence
-            
-        # Add current prediction to history
-        self.previous_predictions.append((current_emotion, confidence))
+    def _degrade(
+        self,
+        requirements: FaceRequirements,
+        face_backend: Optional[str],
+        profile: Optional[QualityProfile],
+    ) -> Tuple[FaceRequirements, Optional[str], int]:
+        """Adjust detection settings to a quality profile chosen by the overload controller."""
+        if profile is None:
+            return requirements, face_backend, self.max_dim
+        if not profile.refine_landmarks:
+            # Iris refinement roughly doubles FaceMesh cost; the 468-point mesh is close enough under load
+            if requirements.min_landmarks > MediaPipeFaceMeshBackend.landmark_count:
+                requirements = FaceRequirements(MediaPipeFaceMeshBackend.landmark_count, requirements.max_faces)
+            if face_backend == MediaPipeFaceMeshRefinedBackend.name:
+                face_backend = MediaPipeFaceMeshBackend.name
+        return requirements, face_backend, min(self.max_dim, profile.max_dim)
+
+    def _prepare_frame(self, frame: np.ndarray, max_dim: Optional[int] = None) -> np.ndarray:
+        """Downsize a frame to the working resolution and make sure it is 3-channel RGB."""
+        h, w = frame.shape[:2]
+        
+        # Resize if image is too large for better performance; colour
+        # conversion below then only touches the downsized pixels
+        max_dim = max_dim or self.max_dim
+        if max(h, w) > max_dim:
+            scale = max_dim / max(h, w)
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)))
+        
+        # Ensure frame is in RGB format
+        if frame.ndim == 2 or frame.shape[2] == 1:  # Grayscale
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+        elif frame.shape[2] == 4:  # RGBA
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
+        elif frame.shape[2] == 3 and frame.dtype == np.uint8 and frame[0,0,0] == frame[0,0,2]:  # BGR check
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return frame
+
+    def _locate_face(
+        self,
+        frame: np.ndarray,
+        requirements: FaceRequirements,
+        face_backend: Optional[str] = None,
+        enhance: bool = True,
+        static_image: bool = False,
+    ) -> Tuple[Optional[FaceCrop], str]:
+        """
+        Detect, validate and crop the primary face of a prepared frame.
         
-        # Keep only the most recent predictions
-        if len(self.previous_predictions) > self.max_history:
-            self.previous_predictions.pop(0)
+        Args:
+            frame: RGB frame at working resolution
+            requirements: What the caller needs from face detection
+            face_backend: Backend name overriding the detector's default
+            enhance: Apply contrast enhancement and sharpening to the crop
+            static_image: The frame is unrelated to the previous one, so no
+                face tracking state may carry over
             
-        # If we don't have enough history, return current prediction
-        if len(self.previous_predictions) < 3:
-            return current_emotion, confidence
+        Returns:
+            Tuple of (face crop or None, status) where status is "ok" or the
+            label to report when no usable face was found
+        """
+        h, w = frame.shape[:2]
+        pool = self.image_backends if static_image else self.face_backends
+        backend = pool.get(requirements, face_backend or self.face_backend)
+        faces = backend.detect(frame)
+        
+        if not faces:
+            log_event(logger, logging.WARNING, "no_face", "No faces detected in frame")
+            return None, "no_face"
             
-        # Calculate weighted average of recent predictions
-        emotion_weights = {}
-        total_weight = 0
-        
-        for i, (emotion, conf) in enumerate(self.previous_predictions):
-            weight = (i + 1) / len(self.previous_predictions)  # More recent = higher weight
-            if emotion in emotion_weights:
-                emotion_weights[emotion] += conf * weight
+        # Use the first detected face
+        face = faces[0]
+        
+        # Validate the detected face
+        if not self._is_valid_face(face, frame.shape):
+            log_event(logger, logging.WARNING, "invalid_face", "Invalid face detected")
+            record_face_rejection("invalid_face")
+            return None, "invalid_face"
+        
+        # A face turned far away reads as "uncertain" at best; skip the crop and forward pass
+        yaw = face_yaw_ratio(face.landmarks) if settings.QUALITY_GATE_ENABLED else None
+        if yaw is not None and yaw > settings.QUALITY_MAX_FACE_YAW:
+            log_event(logger, logging.WARNING, "invalid_face", "Face turned sideways (yaw ratio %.2f)", yaw,
+                      reason="sideways")
+            record_face_rejection("face_sideways")
+            return None, "face_sideways"
+        
+        # Get bounding box with adaptive padding
+        x1, y1, x2, y2 = self._get_bbox(face, w, h)
+        
+        # Add extra padding to ensure we get the full face
+        padding = int(max(x2-x1, y2-y1) * 0.2)  # 20% padding
+        x1 = max(0, x1 - padding)
+        y1 = max(0, y1 - padding)
+        x2 = min(w, x2 + padding)
+        y2 = min(h, y2 + padding)
+        
+        # Extract face ROI
+        face_img = frame[y1:y2, x1:x2]
+        
+        # Skip if face ROI is too small
+        if face_img.size == 0 or min(face_img.shape[:2]) < 40:  # Minimum 40x40 pixels
+            log_event(logger, logging.WARNING, "invalid_face", "Face ROI too small: %s", face_img.shape,
+                      reason="roi_too_small")
+            record_face_rejection("face_too_small")
+            return None, "face_too_small"
+        
+        # Near-identical face crops share a perceptual hash and reuse the cached model output,
+        # as long as they reach the model the same way (backend, enhancement, working resolution)
+        cache_key = None
+        if self.face_cache is not None:
+            cache_key = face_key(self.model_id, face_img, backend=backend.name, enhance=enhance, max_dim=max(h, w))
+        
+        # Enhance image quality
+        if enhance:
+            face_img = self._enhance_contrast(face_img)
+        
+        # Prepare face data for response
+        bbox = {
+            "top": int(y1),
+            "right": int(x2),
+            "bottom": int(y2),
+            "left": int(x1),
+            "width": int(x2 - x1),
+            "height": int(y2 - y1)
+        }
+        return FaceCrop(face=face, bbox=bbox, image=face_img, backend=backend.name, cache_key=cache_key), "ok"
+
+    def _save_debug_face(self, face_img: np.ndarray) -> None:
+        if not self.save_debug_faces:
+            return
+        # Save debug image (convert back to BGR for correct color display)
+        os.makedirs(self.debug_faces_dir, exist_ok=True)
+        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+        debug_path = str(self.debug_faces_dir / f"face_{ts}.jpg")
+        
+        # Convert to BGR and save
+        debug_img = cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR) if face_img.shape[2] == 3 else face_img
+        cv2.imwrite(debug_path, debug_img)
+        self._debug_faces.append(debug_path)
+        
+        # Rotate out the oldest crops so the directory cannot fill the disk
+        while len(self._debug_faces) > settings.DEBUG_FACES_MAX_FILES:
+            try:
+                os.remove(self._debug_faces.popleft())
+            except OSError:
+                pass
+        log_event(logger, logging.DEBUG, "debug_face", "Saved debug face image to %s", debug_path, path=debug_path)
+
+    def _forward(self, crops: List[FaceCrop]) -> torch.Tensor:
+        """
+        Run the model on a batch of face crops in a single forward pass.
+        
+        Crops whose perceptual hash is in the face cache skip the model.
+        
+        Returns:
+            Logits tensor of shape (len(crops), num_classes) on the CPU
+        """
+        outputs: List[Optional[torch.Tensor]] = [None] * len(crops)
+        pending = []
+        for i, crop in enumerate(crops):
+            cached_output = self.face_cache.get(crop.cache_key) if crop.cache_key else None
+            if cached_output is not None:
+                outputs[i] = torch.from_numpy(cached_output)
+            else:
+                pending.append(i)
+        
+        if pending:
+            # Preprocess and predict
+            input_tensor = torch.cat([self._preprocess_face(crops[i].image) for i in pending])
+            with torch.no_grad():
+                logits = self.model(input_tensor).float().cpu()
+            for row, i in enumerate(pending):
+                outputs[i] = logits[row:row + 1]
+                if crops[i].cache_key:
+                    self.face_cache.put(crops[i].cache_key, outputs[i].numpy())
+        
+        return torch.cat(outputs)
+
+    def _feature_extractor(self) -> Callable[[torch.Tensor], torch.Tensor]:
+        """
+        Find how to get penultimate-layer features out of the TorchScript model.
+        
+        Python forward hooks don't fire inside TorchScript, so in order of preference:
+        a feature method compiled into the model (``extract_features`` etc.),
+        every layer but the classifier of a scripted ``nn.Sequential``, or, when
+        the backbone exposes neither, the logits themselves.
+        """
+        if self._feature_fn is not None:
+            return self._feature_fn
+        for name in self.FEATURE_METHODS:
+            method = getattr(self.model, name, None)
+            if callable(method):
+                self._feature_fn, self.embedding_source = method, name
+                break
+        else:
+            layers = list(self.model.children())
+            if getattr(self.model, "original_name", None) == "Sequential" and len(layers) > 1:
+                def penultimate(x: torch.Tensor) -> torch.Tensor:
+                    for layer in layers[:-1]:
+                        x = layer(x)
+                    return x
+                self._feature_fn, self.embedding_source = penultimate, "sequential"
             else:
-                emotion_weights[emotion] = conf * weight
-            total_weight += weight
+                logger.warning("Model exposes no feature layer; embeddings fall back to logits")
+                self._feature_fn, self.embedding_source = self.model, "logits"
+        logger.info(f"Embeddings come from: {self.embedding_source}")
+        return self._feature_fn
+
+    def _embed(self, crops: List[FaceCrop], batch_size: int = settings.EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """
+        Feature vectors for a list of face crops, ``batch_size`` crops per forward pass.
+        
+        Returns:
+            float32 array of shape (len(crops), dim) with L2-normalised rows
+        """
+        extract = self._feature_extractor()
+        chunks = []
+        for start in range(0, len(crops), batch_size):
+            input_tensor = torch.cat([self._preprocess_face(crop.image) for crop in crops[start:start + batch_size]])
+            with torch.no_grad():
+                features = extract(input_tensor).float()
+            if features.ndim > 2:
+                # Convolutional feature maps: global average pool the spatial dims
+                features = features.flatten(2).mean(dim=2)
+            chunks.append(torch.nn.functional.normalize(features, dim=1).cpu().numpy())
+        return np.concatenate(chunks)
+
+    def _face_results(
+        self,
+        crops: List[FaceCrop],
+        outputs: torch.Tensor,
+        requirements: FaceRequirements,
+        stream: Optional[str] = None,
+    ) -> List[Tuple[str, float, List[dict]]]:
+        """
+        Turn a batch of logits into one (emotion, confidence, face_data) result per crop.
+        
+        The rows of ``outputs`` go through softmax, class weights, smoothing and
+        the override rules together. With a ``stream`` they are consecutive
+        frames of that stream and are smoothed with its history; low-confidence
+        frames are left out of the history.
+        
+        The returned emotion and confidence are the raw top prediction; the
+        smoothed, overridden prediction is in face_data.
+        """
+        postprocessor = self.postprocessor
+        probs = postprocessor.distribution(outputs)
+        if stream is None:
+            decisions = postprocessor.decide(probs)
+            raw_top, raw_confidences = decisions.top, decisions.confidence
+        else:
+            raw_top, raw_confidences = probs.argmax(axis=1).tolist(), np.maximum.reduce(probs, axis=1).tolist()
+            smoothed = self.smoother.smooth(stream, probs, [c >= postprocessor.min_confidence for c in raw_confidences])
+            decisions = postprocessor.decide(smoothed)
+        all_emotions = postprocessor.percentages(probs)
+        raw_emotions = [postprocessor.labels[i] for i in raw_top]
+        
+        results = []
+        for row, crop in enumerate(crops):
+            emotion, confidence_val, emotion_probs = raw_emotions[row], raw_confidences[row], all_emotions[row]
+            log_event(logger, logging.INFO, "emotion_probs", "Emotion probabilities: %s", emotion_probs, probabilities=emotion_probs)
+            smoothed_emotion, smoothed_confidence = decisions.label[row], decisions.confidence[row]
+            if decisions.low_confidence[row]:
+                log_event(logger, logging.WARNING, "low_confidence", "Low confidence prediction: %s (%.2f)",
+                          postprocessor.labels[decisions.top[row]], smoothed_confidence)
+            elif decisions.overridden[row]:
+                log_event(logger, logging.DEBUG, "override", "Overriding %s with %s due to close confidence",
+                          postprocessor.labels[decisions.top[row]], smoothed_emotion)
             
-        # Find the emotion with highest weighted confidence
-        if not emotion_weights:
-            return current_emotion, confidence
+            # Prepare response data
+            face_data = [{
+                "face_id": 0,
+                "bounding_box": crop.bbox,
+                "emotion": smoothed_emotion,
+                "confidence": round(smoothed_confidence, 4),
+                "all_emotions": emotion_probs,
+                "raw_emotion": emotion,
+                "raw_confidence": round(confidence_val, 4),
+                "detector": crop.backend
+            }]
+            if requirements.min_landmarks and crop.face.landmarks is not None:
+                face_data[0]["landmarks"] = np.round(crop.face.landmarks, 1).tolist()
             
-        # Get the emotion with maximum weighted confidence
-        best_emotion = max(emotion_weights.items(), key=lambda x: x[1])[0]
-        avg_confidence = emotion_weights[best_emotion] / total_weight
-        
-        return best_emotion, avg_confidence
+            log_event(logger, logging.INFO, "prediction", "Final prediction: %s (%.2f)", emotion, confidence_val,
+                      emotion=emotion, confidence=round(confidence_val, 4), detector=crop.backend)
+            results.append((emotion, confidence_val, face_data))
+        return results
 
-    def predict_emotion(self, frame: np.ndarray) -> Tuple[str, float, List[dict]]:
+    def predict_emotion(
+        self,
+        frame: np.ndarray,
+        requirements: Optional[FaceRequirements] = None,
+        face_backend: Optional[str] = None,
+        profile: Optional[QualityProfile] = None,
+        stream: Optional[str] = None,
+    ) -> Tuple[str, float, List[dict]]:
         """
         Predict emotion from a single frame with improved face validation.
         
         Args:
             frame: Input image in RGB format
+            requirements: What the caller needs from face detection (default: bbox only)
+            face_backend: Backend name overriding the detector's default ("auto" = cheapest)
+            profile: Quality profile to run at (default: full quality)
+            stream: Key of the video stream the frame belongs to; frames of one
+                stream are smoothed over time and the face detector may track
+                between them (default: an unrelated image, no smoothing)
             
         Returns:
             Tuple of (emotion, confidence, face_data_list)
         """
+        requirements = requirements or FaceRequirements()
         if frame is None or frame.size == 0:
             logger.error("Received empty frame")
             return "unknown", 0.0, []
             
-        # Ensure frame is in RGB format and properly sized
-        if frame.shape[2] == 4:  # RGBA
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
-        elif frame.shape[2] == 1:  # Grayscale
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
-        elif frame.shape[2] == 3 and frame.dtype == np.uint8 and frame[0,0,0] == frame[0,0,2]:  # BGR check
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        h, w, _ = frame.shape
-        
-        # Resize if image is too large for better performance
-        max_dim = 640
-        if max(h, w) > max_dim:
-            scale = max_dim / max(h, w)
-            frame = cv2.resize(frame, (int(w * scale), int(h * scale)))
-            h, w = frame.shape[:2]
+        requirements, face_backend, max_dim = self._degrade(requirements, face_backend, profile)
+        frame = self._prepare_frame(frame, max_dim)
+        enhance = profile is None or profile.enhance
         
         try:
-            # Process with MediaPipe
-            results = self.face_mesh.process(frame)
-            
-            if not results.multi_face_landmarks:
-                logger.warning("No faces detected in frame")
-                return "no_face", 0.0, []
-                
-            # Use the first detected face
-            landmarks = results.multi_face_landmarks[0]
-            
-            # Validate the detected face
-            if not self._is_valid_face(landmarks, frame.shape):
-                logger.warning("Invalid face detected")
-                return "invalid_face", 0.0, []
-            
-            # Get bounding box with adaptive padding
-            x1, y1, x2, y2 = self._get_bbox(landmarks, w, h)
-            
-            # Add extra padding to ensure we get the full face
-            padding = int(max(x2-x1, y2-y1) * 0.2)  # 20% padding
-            x1 = max(0, x1 - padding)
-            y1 = max(0, y1 - padding)
-            x2 = min(w, x2 + padding)
-            y2 = min(h, y2 + padding)
-            
-            # Extract face ROI
-            face_img = frame[y1:y2, x1:x2]
-            
-            # Skip if face ROI is too small
-            if face_img.size == 0 or min(face_img.shape[:2]) < 40:  # Minimum 40x40 pixels
-                logger.warning(f"Face ROI too small: {face_img.shape}")
-                return "face_too_small", 0.0, []
-            
-            # Enhance image quality
-            face_img = self._enhance_contrast(face_img)
+            crop, status = self._locate_face(frame, requirements, face_backend, enhance, static_image=stream is None)
+        except Exception as e:
+            logger.error(f"Error in face detection: {str(e)}", exc_info=True)
+            return "detection_error", 0.0, []
+        if crop is None:
+            return status, 0.0, []
             
-            # Prepare face data for response
-            bbox = {
-                "top": int(y1),
-                "right": int(x2),
-                "bottom": int(y2),
-                "left": int(x1),
-                "width": int(x2 - x1),
-                "height": int(y2 - y1)
-            }
+        try:
+            if profile is None or profile.save_debug:
+                self._save_debug_face(crop.image)
+            output = self._forward([crop])
+            return self._face_results([crop], output, requirements, stream)[0]
+        except Exception as e:
+            logger.error(f"Error during emotion prediction: {str(e)}", exc_info=True)
+            return "prediction_error", 0.0, []
+
+    def predict_batch(
+        self,
+        frames: List[np.ndarray],
+        requirements: Optional[FaceRequirements] = None,
+        face_backend: Optional[str] = None,
+        profile: Optional[QualityProfile] = None,
+    ) -> List[Tuple[str, float, List[dict]]]:
+        """
+        Predict emotions for independent images, classifying all faces in one forward pass.
+        
+        Unlike ``predict_emotion`` no temporal smoothing is applied, since the
+        images are not consecutive frames of one stream.
+        
+        Args:
+            frames: Input images in RGB format
+            requirements: What the caller needs from face detection (default: bbox only)
+            face_backend: Backend name overriding the detector's default ("auto" = cheapest)
+            profile: Quality profile to run at (default: full quality)
             
+        Returns:
+            One (emotion, confidence, face_data_list) tuple per input frame, in order
+        """
+        requirements = requirements or FaceRequirements()
+        requirements, face_backend, max_dim = self._degrade(requirements, face_backend, profile)
+        statuses, crops, crop_indices = self._crop_batch(frames, requirements, face_backend, max_dim, profile)
+        results: List[Optional[Tuple[str, float, List[dict]]]] = [
+            None if status is None else (status, 0.0, []) for status in statuses
+        ]
+        
+        if crops:
             try:
-                # Save debug image (convert back to BGR for correct color display)
-                os.makedirs("debug_faces", exist_ok=True)
-                ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
-                debug_path = f"debug_faces/face_{ts}.jpg"
-                
-                # Convert to BGR and save
-                debug_img = cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR) if face_img.shape[2] == 3 else face_img
-                cv2.imwrite(debug_path, debug_img)
-                logger.info(f"Saved debug face image to {debug_path}")
-                
-                # Preprocess and predict
-                input_tensor = self._preprocess_face(face_img)
-                
-                with torch.no_grad():
-                    output = self.model(input_tensor)
-                    probs = torch.nn.functional.softmax(output, dim=1)
-                    
-                    # Apply temperature scaling to soften probabilities
-                    probs = torch.nn.functional.softmax(output / self.temperature, dim=1)
-                    
-                    # Get top predictions
-                    confidence, predicted = torch.max(probs, 1)
-                    confidence_val = confidence.item()
-                    emotion_idx = predicted.item()
-                    emotion = self.EMOTIONS.get(emotion_idx, "unknown").lower()
-                    
-                    # Get distribution of all emotions for debugging
-                    emotion_probs = {}
-                    for idx, prob in enumerate(probs[0]):
-                        emotion_name = self.EMOTIONS.get(idx, f"unknown_{idx}").lower()
-                        # Apply class weights
-                        weight = self.class_weights.get(emotion_name, 1.0)
-                        emotion_probs[emotion_name] = round(prob.item() * weight * 100, 2)
-                    
-                    # Normalize probabilities to sum to 100%
-                    total = sum(emotion_probs.values())
-                    if total > 0:
-                        emotion_probs = {k: (v / total) * 100 for k, v in emotion_probs.items()}
-                    
-                    # Get the emotion with highest adjusted probability
-                    emotion = max(emotion_probs.items(), key=lambda x: x[1])[0]
-                    confidence_val = emotion_probs[emotion] / 100.0  # Convert back to 0-1 range
-                    
-                    logger.info(f"Emotion probabilities: {emotion_probs}")
-                    
-                    # Apply temporal smoothing to predictions
-                    smoothed_emotion, smoothed_confidence = self._smooth_predictions(emotion, confidence_val)
-                    
-                    # Apply confidence threshold and handle anger over-prediction
-                    if smoothed_confidence < self.min_confidence:
-                        logger.warning(f"Low confidence prediction: {smoothed_emotion} ({smoothed_confidence:.2f})")
-                        if smoothed_confidence < 0.5:  # Very low confidence
-                            # If anger is predicted with low confidence, default to neutral
-                            if smoothed_emotion == 'anger':
-                                smoothed_emotion = 'neutral'
-                                logger.info("Overriding low-confidence anger prediction with neutral")
-                            else:
-                                smoothed_emotion = "uncertain"
-                    # If anger is predicted but not with high confidence, consider second best
-                    elif smoothed_emotion == 'anger' and smoothed_confidence < 0.7:
-                        # Get second best prediction
-                        sorted_probs = sorted(emotion_probs.items(), key=lambda x: x[1], reverse=True)
-                        if len(sorted_probs) > 1 and sorted_probs[0][0] == 'anger':
-                            next_emotion, next_conf = sorted_probs[1]
-                            if next_conf > smoothed_confidence * 0.8:  # If second best is close
-                                smoothed_emotion = next_emotion
-                                logger.info(f"Overriding anger with {next_emotion} due to close confidence")
-                    
-                    # Prepare response data
-                    face_data = [{
-                        "face_id": 0,
-                        "bounding_box": bbox,
-                        "emotion": smoothed_emotion,
-                        "confidence": round(smoothed_confidence, 4),
-                        "all_emotions": emotion_probs,
-                        "raw_emotion": emotion,
-                        "raw_confidence": round(confidence_val, 4)
-                    }]
-                    
-                    logger.info(f"Final prediction: {emotion} ({confidence_val:.2f})")
-                    return emotion, confidence_val, face_data
-                    
+                if profile is None or profile.save_debug:
+                    for crop in crops:
+                        self._save_debug_face(crop.image)
+                outputs = self._forward(crops)
+                for i, result in zip(crop_indices, self._face_results(crops, outputs, requirements)):
+                    results[i] = result
             except Exception as e:
                 logger.error(f"Error during emotion prediction: {str(e)}", exc_info=True)
-                return "prediction_error", 0.0, []
-                
-        except Exception as e:
-            logger.error(f"Error in face detection: {str(e)}", exc_info=True)
-            return "detection_error", 0.0, []
+                for i in crop_indices:
+                    results[i] = ("prediction_error", 0.0, [])
+        
+        return results
+
+    def _crop_batch(
+        self,
+        frames: List[np.ndarray],
+        requirements: FaceRequirements,
+        face_backend: Optional[str],
+        max_dim: int,
+        profile: Optional[QualityProfile],
+    ) -> Tuple[List[Optional[str]], List[FaceCrop], List[int]]:
+        """
+        Locate the primary face of every frame.
+        
+        Returns:
+            Tuple of (per-frame status, None where a face was found; the crops;
+            the frame index of each crop)
+        """
+        enhance = profile is None or profile.enhance
+        statuses: List[Optional[str]] = [None] * len(frames)
+        crops: List[FaceCrop] = []
+        crop_indices: List[int] = []
+        
+        for i, frame in enumerate(frames):
+            if frame is None or frame.size == 0:
+                statuses[i] = "unknown"
+                continue
+            try:
+                crop, status = self._locate_face(
+                    self._prepare_frame(frame, max_dim), requirements, face_backend, enhance, static_image=True
+                )
+            except Exception as e:
+                logger.error(f"Error in face detection: {str(e)}", exc_info=True)
+                crop, status = None, "detection_error"
+            if crop is None:
+                statuses[i] = status
+                continue
+            crops.append(crop)
+            crop_indices.append(i)
+        return statuses, crops, crop_indices
+
+    def embed_batch(
+        self,
+        frames: List[np.ndarray],
+        face_backend: Optional[str] = None,
+        profile: Optional[QualityProfile] = None,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+    ) -> List[Tuple[str, Optional[np.ndarray], Optional[dict]]]:
+        """
+        Expression embeddings: the backbone's penultimate features for the primary face of each frame.
+        
+        Embeddings are L2-normalised, so the dot product of two of them is their
+        cosine similarity. ``embedding_source`` tells where they came from; when
+        the model exposes no feature layer they are the (normalised) logits.
+        
+        Args:
+            frames: Input images in RGB format
+            face_backend: Backend name overriding the detector's default ("auto" = cheapest)
+            profile: Quality profile to run at (default: full quality)
+            batch_size: Face crops per forward pass
+            
+        Returns:
+            One (status, embedding or None, bounding_box or None) tuple per input
+            frame, in order; status is "ok" or the reason no embedding was made
+        """
+        requirements, face_backend, max_dim = self._degrade(FaceRequirements(), face_backend, profile)
+        statuses, crops, crop_indices = self._crop_batch(frames, requirements, face_backend, max_dim, profile)
+        results: List[Tuple[str, Optional[np.ndarray], Optional[dict]]] = [
+            (status, None, None) for status in statuses
+        ]
+        
+        if crops:
+            try:
+                embeddings = self._embed(crops, batch_size)
+                for row, (i, crop) in enumerate(zip(crop_indices, crops)):
+                    results[i] = ("ok", embeddings[row], crop.bbox)
+            except Exception as e:
+                logger.error(f"Error computing embeddings: {str(e)}", exc_info=True)
+                for i in crop_indices:
+                    results[i] = ("embedding_error", None, None)
+        
+        return results
 
 # Singleton instance
 emotion_detector = None
+_emotion_detector_lock = threading.Lock()
 
 def get_emotion_detector(model_path: str) -> EmotionDetector:
+    """Return the process-wide detector, creating it on first use."""
     global emotion_detector
     if emotion_detector is None:
-        emotion_detector = EmotionDetector(model_path)
+        with _emotion_detector_lock:
+            if emotion_detector is None:
+                emotion_detector = EmotionDetector(model_path)
     return emotion_detector
@@ -0,0 +1,376 @@
+import cv2
+import numpy as np
+import importlib.util
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DetectedFace:
+    """A face found by a detector backend, in pixel coordinates of the input frame."""
+    bbox: Tuple[int, int, int, int]  # (x_min, y_min, x_max, y_max)
+    score: float = 1.0
+    landmarks: Optional[np.ndarray] = None  # (N, 2) array of pixel coordinates
+
+
+@dataclass(frozen=True)
+class FaceRequirements:
+    """What a caller needs from face detection."""
+    min_landmarks: int = 0
+    max_faces: int = 1
+
+
+class FaceDetectorBackend:
+    """
+    Base class for face detector backends.
+
+    Subclasses declare their relative cost (lower is cheaper), how many landmarks
+    they return, and which optional modules/files they need. Heavy imports happen
+    in ``__init__`` so that merely listing backends stays cheap.
+
+    With ``static_image`` every frame is an unrelated image: backends that
+    track a face from one frame to the next (FaceMesh) detect it afresh on
+    every call instead.
+    """
+    name: str = "base"
+    cost: int = 100
+    landmark_count: int = 0
+    required_modules: Tuple[str, ...] = ()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return all(importlib.util.find_spec(mod) is not None for mod in cls.required_modules)
+
+    @classmethod
+    def satisfies(cls, requirements: FaceRequirements) -> bool:
+        return cls.landmark_count >= requirements.min_landmarks
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        self.max_faces = max_faces
+        self.static_image = static_image
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        """
+        Detect faces in an RGB frame.
+
+        Args:
+            frame: Input image in RGB format (H, W, 3), uint8
+
+        Returns:
+            List of detected faces, most confident first
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def _landmarks_to_face(points: np.ndarray, score: float = 1.0) -> DetectedFace:
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    return DetectedFace(
+        bbox=(int(x_min), int(y_min), int(x_max), int(y_max)),
+        score=score,
+        landmarks=points,
+    )
+
+
+class MediaPipeFaceDetectionBackend(FaceDetectorBackend):
+    """BlazeFace detector: bounding box plus 6 coarse keypoints (eyes, nose, mouth, ears)."""
+    name = "mediapipe_detection"
+    cost = 10
+    landmark_count = 6
+    required_modules = ("mediapipe",)
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        super().__init__(max_faces, static_image)
+        import mediapipe as mp
+        self._detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=settings.MEDIAPIPE_DETECTION_MODEL,
+            min_detection_confidence=0.4,
+        )
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        h, w = frame.shape[:2]
+        results = self._detector.process(frame)
+        if not results.detections:
+            return []
+
+        faces = []
+        for detection in results.detections[:self.max_faces]:
+            box = detection.location_data.relative_bounding_box
+            x_min = max(0, int(box.xmin * w))
+            y_min = max(0, int(box.ymin * h))
+            x_max = min(w, int((box.xmin + box.width) * w))
+            y_max = min(h, int((box.ymin + box.height) * h))
+            keypoints = np.array(
+                [[kp.x * w, kp.y * h] for kp in detection.location_data.relative_keypoints],
+                dtype=np.float32,
+            )
+            faces.append(DetectedFace(
+                bbox=(x_min, y_min, x_max, y_max),
+                score=float(detection.score[0]) if detection.score else 1.0,
+                landmarks=keypoints,
+            ))
+        return faces
+
+    def close(self) -> None:
+        self._detector.close()
+
+
+class MediaPipeFaceMeshBackend(FaceDetectorBackend):
+    """FaceMesh without iris refinement: 468 landmarks."""
+    name = "mediapipe_facemesh"
+    cost = 30
+    landmark_count = 468
+    required_modules = ("mediapipe",)
+    refine_landmarks = False
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        super().__init__(max_faces, static_image)
+        import mediapipe as mp
+        self._face_mesh = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=static_image,  # tracking between frames is better for video streams
+            max_num_faces=max_faces,
+            refine_landmarks=self.refine_landmarks,
+            min_detection_confidence=0.4,
+            min_tracking_confidence=0.4
+        )
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        h, w = frame.shape[:2]
+        results = self._face_mesh.process(frame)
+        if not results.multi_face_landmarks:
+            return []
+
+        faces = []
+        for face_landmarks in results.multi_face_landmarks[:self.max_faces]:
+            points = np.array(
+                [[lm.x * w, lm.y * h] for lm in face_landmarks.landmark],
+                dtype=np.float32,
+            )
+            faces.append(_landmarks_to_face(points))
+        return faces
+
+    def close(self) -> None:
+        self._face_mesh.close()
+
+
+class MediaPipeFaceMeshRefinedBackend(MediaPipeFaceMeshBackend):
+    """FaceMesh with iris refinement: 478 landmarks."""
+    name = "mediapipe_facemesh_refined"
+    cost = 40
+    landmark_count = 478
+    refine_landmarks = True
+
+
+class OpenCVHaarBackend(FaceDetectorBackend):
+    """Viola-Jones cascade bundled with OpenCV. No extra downloads, bbox only."""
+    name = "opencv_haar"
+    cost = 20
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return os.path.exists(cls._cascade_path())
+
+    @staticmethod
+    def _cascade_path() -> str:
+        return os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        super().__init__(max_faces, static_image)
+        self._cascade = cv2.CascadeClassifier(self._cascade_path())
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        min_size = max(24, min(gray.shape[:2]) // 10)
+        rects = self._cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size)
+        )
+        if len(rects) == 0:
+            return []
+        # Largest face first
+        rects = sorted(rects, key=lambda r: r[2] * r[3], reverse=True)
+        return [
+            DetectedFace(bbox=(int(x), int(y), int(x + bw), int(y + bh)))
+            for x, y, bw, bh in rects[:self.max_faces]
+        ]
+
+
+class OpenCVDNNBackend(FaceDetectorBackend):
+    """OpenCV's ResNet-10 SSD face detector. Needs the Caffe prototxt and weights on disk."""
+    name = "opencv_dnn"
+    cost = 25
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return os.path.exists(settings.OPENCV_DNN_PROTO_PATH) and os.path.exists(settings.OPENCV_DNN_MODEL_PATH)
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False, min_confidence: float = 0.5):
+        super().__init__(max_faces, static_image)
+        self.min_confidence = min_confidence
+        self._net = cv2.dnn.readNetFromCaffe(settings.OPENCV_DNN_PROTO_PATH, settings.OPENCV_DNN_MODEL_PATH)
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        h, w = frame.shape[:2]
+        # The network was trained on BGR input
+        bgr = cv2.cvtColor(cv2.resize(frame, (300, 300)), cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=False)
+        self._net.setInput(blob)
+        detections = self._net.forward()[0, 0]
+
+        faces = []
+        for det in detections:
+            score = float(det[2])
+            if score < self.min_confidence:
+                continue
+            x_min, y_min, x_max, y_max = (det[3:7] * np.array([w, h, w, h])).astype(int)
+            faces.append(DetectedFace(
+                bbox=(max(0, x_min), max(0, y_min), min(w, x_max), min(h, y_max)),
+                score=score,
+            ))
+        faces.sort(key=lambda f: f.score, reverse=True)
+        return faces[:self.max_faces]
+
+
+class DlibHOGBackend(FaceDetectorBackend):
+    """dlib's HOG + linear SVM frontal face detector, bbox only."""
+    name = "dlib_hog"
+    cost = 50
+    required_modules = ("dlib",)
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        super().__init__(max_faces, static_image)
+        import dlib
+        self._dlib = dlib
+        self._detector = dlib.get_frontal_face_detector()
+
+    def _detect_rects(self, gray: np.ndarray):
+        rects = self._detector(gray)
+        return sorted(rects, key=lambda r: r.width() * r.height(), reverse=True)[:self.max_faces]
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        return [
+            DetectedFace(bbox=(max(0, r.left()), max(0, r.top()), min(w, r.right()), min(h, r.bottom())))
+            for r in self._detect_rects(gray)
+        ]
+
+
+class Dlib68Backend(DlibHOGBackend):
+    """dlib HOG detector followed by the 68-point shape predictor at ``settings.LANDMARK_MODEL_PATH``."""
+    name = "dlib_68"
+    cost = 60
+    landmark_count = 68
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return super().is_available() and os.path.exists(settings.LANDMARK_MODEL_PATH)
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        super().__init__(max_faces, static_image)
+        self._predictor = self._dlib.shape_predictor(settings.LANDMARK_MODEL_PATH)
+
+    def detect(self, frame: np.ndarray) -> List[DetectedFace]:
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        faces = []
+        for rect in self._detect_rects(gray):
+            shape = self._predictor(gray, rect)
+            points = np.array([[shape.part(i).x, shape.part(i).y] for i in range(68)], dtype=np.float32)
+            faces.append(DetectedFace(
+                bbox=(max(0, rect.left()), max(0, rect.top()), min(w, rect.right()), min(h, rect.bottom())),
+                landmarks=points,
+            ))
+        return faces
+
+
+# Registered backends, keyed by name
+BACKENDS: Dict[str, Type[FaceDetectorBackend]] = {
+    backend.name: backend
+    for backend in (
+        MediaPipeFaceDetectionBackend,
+        OpenCVHaarBackend,
+        OpenCVDNNBackend,
+        MediaPipeFaceMeshBackend,
+        MediaPipeFaceMeshRefinedBackend,
+        DlibHOGBackend,
+        Dlib68Backend,
+    )
+}
+
+
+def available_backends() -> List[str]:
+    """Names of the backends usable in this environment, cheapest first."""
+    return [
+        cls.name for cls in sorted(BACKENDS.values(), key=lambda c: c.cost)
+        if cls.is_available()
+    ]
+
+
+def resolve_backend_name(requirements: FaceRequirements, preferred: Optional[str] = None) -> str:
+    """
+    Pick the backend to use for a request.
+
+    Args:
+        requirements: What the caller needs from detection
+        preferred: Explicit backend name, or None/"auto" for the cheapest suitable one
+
+    Returns:
+        Name of the selected backend
+
+    Raises:
+        ValueError: If the preferred backend is unknown, unavailable or insufficient,
+            or no available backend satisfies the requirements
+    """
+    if preferred and preferred != "auto":
+        cls = BACKENDS.get(preferred)
+        if cls is None:
+            raise ValueError(f"Unknown face detector backend: {preferred}")
+        if not cls.is_available():
+            raise ValueError(f"Face detector backend not available: {preferred}")
+        if not cls.satisfies(requirements):
+            raise ValueError(
+                f"Backend {preferred} provides {cls.landmark_count} landmarks, "
+                f"{requirements.min_landmarks} required"
+            )
+        return preferred
+
+    for name in available_backends():
+        if BACKENDS[name].satisfies(requirements):
+            return name
+    raise ValueError(f"No available face detector backend satisfies {requirements}")
+
+
+class BackendPool:
+    """Lazily constructs and caches one instance per backend name, all in the pool's ``static_image`` mode."""
+
+    def __init__(self, max_faces: int = 1, static_image: bool = False):
+        self.max_faces = max_faces
+        self.static_image = static_image
+        self._instances: Dict[str, FaceDetectorBackend] = {}
+        self._lock = threading.Lock()
+
+    def get(self, requirements: FaceRequirements, preferred: Optional[str] = None) -> FaceDetectorBackend:
+        name = resolve_backend_name(requirements, preferred)
+        with self._lock:
+            backend = self._instances.get(name)
+            if backend is None:
+                backend = BACKENDS[name](max_faces=self.max_faces, static_image=self.static_image)
+                self._instances[name] = backend
+                logger.info(f"Initialized face detector backend: {name}")
+            return backend
+
+    def close(self) -> None:
+        with self._lock:
+            for backend in self._instances.values():
+                backend.close()
+            self._instances.clear()
@@ -0,0 +1,141 @@
+"""
+Per-stream change detection so live streams can reuse the last result for still frames.
+
+A webcam pointed at a still subject sends long runs of frames that differ only
+by sensor noise and compression artifacts. Each stream keeps a tiny grayscale
+signature of the last frame that was actually analyzed; a new frame whose
+signature barely differs from it reuses that frame's result instead of going
+through face detection and inference. The reference is only replaced when a
+frame is analyzed, so slow drift still adds up to a change, and a result is
+never reused for longer than ``max_age`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import registry
+
+SIGNATURE_SIZE = 32  # cells per side; a 640x480 frame gives 20x15 pixel cells
+
+_compared = registry.counter("frame_change_compared_total", "Live frames compared against their stream's last analyzed frame")
+_reused = registry.counter("frame_change_reused_total", "Live frames answered with the previous result", ["source"])
+
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """Downsample a frame to a SIGNATURE_SIZE square grayscale signature with its mean removed."""
+    small = cv2.resize(frame, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    signature = small.astype(np.float32)
+    # Auto-exposure shifts the whole frame; that alone should not count as a change
+    return signature - signature.mean()
+
+
+class FrameChangeDetector:
+    """
+    Tracks one stream and decides whether a frame can reuse the last result.
+
+    Call ``unchanged`` for every frame. If it says the frame changed, the frame
+    must be analyzed and ``update`` called with its result and the signature
+    ``unchanged`` returned (or ``reset`` if there is no result worth reusing).
+    The caller holds on to the signature, so requests of one stream can be in
+    flight at the same time.
+    """
+
+    def __init__(
+        self,
+        pixel_delta: float = settings.FRAME_REUSE_PIXEL_DELTA,
+        max_changed: float = settings.FRAME_REUSE_MAX_CHANGED,
+        max_age: float = settings.FRAME_REUSE_MAX_AGE,
+    ):
+        """
+        Args:
+            pixel_delta: Gray levels a signature cell must move by to count as changed
+            max_changed: Fraction of changed cells above which the frame is analyzed
+            max_age: Seconds after which the result is refreshed even for a still frame
+        """
+        self.pixel_delta = pixel_delta
+        self.max_changed = max_changed
+        self.max_age = max_age
+        self.result: Optional[Dict[str, Any]] = None
+        self.last_used = time.monotonic()
+        self._reference: Optional[np.ndarray] = None
+        self._analyzed_at = 0.0
+
+    def changed_fraction(self, signature: np.ndarray) -> float:
+        if self._reference is None:
+            return 1.0
+        return float(np.count_nonzero(np.abs(signature - self._reference) > self.pixel_delta)) / signature.size
+
+    def unchanged(self, frame: np.ndarray) -> Tuple[bool, np.ndarray]:
+        """
+        Whether ``frame`` is close enough to the last analyzed frame to reuse its result.
+
+        Returns:
+            Tuple of (reuse the result, the frame's signature for ``update``)
+        """
+        now = time.monotonic()
+        self.last_used = now
+        signature = frame_signature(frame)
+        _compared.inc()
+        if self.result is None or now - self._analyzed_at >= self.max_age:
+            return False, signature
+        return self.changed_fraction(signature) <= self.max_changed, signature
+
+    def update(self, result: Dict[str, Any], signature: np.ndarray) -> None:
+        """Make the analyzed frame with ``signature`` the reference, with its result."""
+        self._reference = signature
+        self._analyzed_at = time.monotonic()
+        self.result = result
+
+    def reset(self) -> None:
+        self._reference = None
+        self.result = None
+
+
+class StreamRegistry:
+    """
+    Change detectors for request/response clients that identify their stream with an id.
+
+    Bounded in both count and idle time, so abandoned streams cost nothing.
+    Each worker process has its own registry; a frame landing on another
+    worker is simply analyzed.
+    """
+
+    def __init__(self, max_streams: int = settings.FRAME_REUSE_MAX_STREAMS, idle_timeout: float = 60.0):
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self._streams: "OrderedDict[str, FrameChangeDetector]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, stream_id: str) -> FrameChangeDetector:
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+            if stream is None or time.monotonic() - stream.last_used > self.idle_timeout:
+                stream = FrameChangeDetector()
+            self._streams[stream_id] = stream
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+            return stream
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+def record_reuse(source: str) -> None:
+    _reused.inc(source=source)
+
+
+_stream_registry: Optional[StreamRegistry] = None
+
+
+def get_stream_registry() -> StreamRegistry:
+    global _stream_registry
+    if _stream_registry is None:
+        _stream_registry = StreamRegistry()
+    return _stream_registry
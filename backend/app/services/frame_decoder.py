@@ -0,0 +1,223 @@
+import cv2
+import numpy as np
+import logging
+import struct
+from typing import Optional, Tuple, Union
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Raw frame payloads start with a small fixed header so live clients can skip JPEG:
+#   magic "RAWF" | version u8 | pixel format u8 | width u16 | height u16   (little endian)
+RAW_FRAME_MAGIC = b"RAWF"
+RAW_FRAME_VERSION = 1
+RAW_FRAME_HEADER = struct.Struct("<4sBBHH")
+
+PIXEL_FORMAT_RGB24 = 0
+PIXEL_FORMAT_BGR24 = 1
+PIXEL_FORMAT_I420 = 2
+PIXEL_FORMAT_NV12 = 3
+PIXEL_FORMAT_GRAY8 = 4
+
+PIXEL_FORMAT_NAMES = {
+    "rgb24": PIXEL_FORMAT_RGB24,
+    "bgr24": PIXEL_FORMAT_BGR24,
+    "i420": PIXEL_FORMAT_I420,
+    "nv12": PIXEL_FORMAT_NV12,
+    "gray8": PIXEL_FORMAT_GRAY8,
+}
+
+# JPEG start-of-frame markers that carry the image dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+BufferLike = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+class FrameDecodeError(ValueError):
+    """Raised when a payload cannot be turned into an image."""
+
+
+def _as_array(data: BufferLike) -> np.ndarray:
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, np.uint8)
+
+
+def jpeg_dimensions(buf: np.ndarray) -> Optional[Tuple[int, int]]:
+    """
+    Read the (width, height) of a JPEG from its SOF segment without decoding it.
+
+    Args:
+        buf: Encoded bytes as a uint8 array
+
+    Returns:
+        (width, height), or None if the data is not a parseable JPEG
+    """
+    if len(buf) < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+    i, n = 2, len(buf)
+    while i + 9 < n:
+        if buf[i] != 0xFF:
+            return None
+        marker = int(buf[i + 1])
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = (int(buf[i + 2]) << 8) | int(buf[i + 3])
+        if marker in _JPEG_SOF_MARKERS:
+            height = (int(buf[i + 5]) << 8) | int(buf[i + 6])
+            width = (int(buf[i + 7]) << 8) | int(buf[i + 8])
+            return width, height
+        if marker == 0xDA:  # start of scan: no SOF before the image data
+            return None
+        i += 2 + length
+    return None
+
+
+def _reduced_decode_flag(width: int, height: int, max_dim: int) -> int:
+    """Largest DCT-domain reduction that still leaves the image at least max_dim on its long side."""
+    long_side = max(width, height)
+    for factor, flag in _REDUCED_DECODE_FLAGS:
+        if long_side // factor >= max_dim:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def _fit(img: np.ndarray, max_dim: Optional[int]) -> np.ndarray:
+    h, w = img.shape[:2]
+    if max_dim and max(h, w) > max_dim:
+        scale = max_dim / max(h, w)
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def decode_image(data: BufferLike, max_dim: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Decode an encoded image (JPEG, PNG, ...) straight to RGB at the scale we need.
+
+    JPEGs larger than ``max_dim`` are decoded with libjpeg's reduced-size modes
+    (1/2, 1/4, 1/8), so a 4K frame never materialises at full resolution.
+    Colour conversion runs after the final resize.
+
+    Args:
+        data: Encoded image bytes
+        max_dim: Maximum size of the long side, or None to keep the full resolution
+
+    Returns:
+        RGB image, or None if the data cannot be decoded
+    """
+    buf = _as_array(data)
+    flag = cv2.IMREAD_COLOR
+    if max_dim:
+        dims = jpeg_dimensions(buf)
+        if dims is not None:
+            flag = _reduced_decode_flag(dims[0], dims[1], max_dim)
+
+    img = cv2.imdecode(buf, flag)
+    if img is None:
+        return None
+    return cv2.cvtColor(_fit(img, max_dim), cv2.COLOR_BGR2RGB)
+
+
+def is_raw_frame(data: BufferLike) -> bool:
+    buf = _as_array(data)
+    return len(buf) >= len(RAW_FRAME_MAGIC) and buf[:len(RAW_FRAME_MAGIC)].tobytes() == RAW_FRAME_MAGIC
+
+
+def encode_raw_frame(frame: np.ndarray, pixel_format: int = PIXEL_FORMAT_RGB24) -> bytes:
+    """
+    Wrap an uncompressed frame in the raw frame header.
+
+    Args:
+        frame: Pixel data laid out as expected for ``pixel_format``
+            (H x W x 3 for RGB/BGR, H*3/2 x W for I420/NV12, H x W for gray)
+        pixel_format: One of the PIXEL_FORMAT_* constants
+
+    Returns:
+        Payload ready to send to the WebSocket or analyze endpoints
+    """
+    if pixel_format in (PIXEL_FORMAT_I420, PIXEL_FORMAT_NV12):
+        height, width = frame.shape[0] * 2 // 3, frame.shape[1]
+    else:
+        height, width = frame.shape[:2]
+    header = RAW_FRAME_HEADER.pack(RAW_FRAME_MAGIC, RAW_FRAME_VERSION, pixel_format, width, height)
+    return header + np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+
+
+def decode_raw_frame(data: BufferLike, max_dim: Optional[int] = None) -> np.ndarray:
+    """
+    Decode a raw frame payload (see ``encode_raw_frame``) to RGB.
+
+    Args:
+        data: Header followed by pixel data
+        max_dim: Maximum size of the long side, or None to keep the full resolution
+
+    Returns:
+        RGB image
+
+    Raises:
+        FrameDecodeError: If the header is invalid or the payload size does not match
+    """
+    buf = _as_array(data)
+    if len(buf) < RAW_FRAME_HEADER.size:
+        raise FrameDecodeError("Raw frame payload shorter than its header")
+    magic, version, pixel_format, width, height = RAW_FRAME_HEADER.unpack_from(buf)
+    if magic != RAW_FRAME_MAGIC or version != RAW_FRAME_VERSION:
+        raise FrameDecodeError(f"Unsupported raw frame header (version {version})")
+
+    pixels = buf[RAW_FRAME_HEADER.size:]
+    if pixel_format in (PIXEL_FORMAT_RGB24, PIXEL_FORMAT_BGR24):
+        expected, shape = width * height * 3, (height, width, 3)
+    elif pixel_format in (PIXEL_FORMAT_I420, PIXEL_FORMAT_NV12):
+        if width % 2 or height % 2:
+            raise FrameDecodeError("YUV 4:2:0 frames need even dimensions")
+        expected, shape = width * height * 3 // 2, (height * 3 // 2, width)
+    elif pixel_format == PIXEL_FORMAT_GRAY8:
+        expected, shape = width * height, (height, width)
+    else:
+        raise FrameDecodeError(f"Unknown raw pixel format: {pixel_format}")
+    if len(pixels) != expected:
+        raise FrameDecodeError(f"Raw frame has {len(pixels)} bytes, expected {expected}")
+
+    frame = pixels.reshape(shape)
+    if pixel_format == PIXEL_FORMAT_RGB24:
+        return _fit(frame, max_dim)
+    if pixel_format == PIXEL_FORMAT_BGR24:
+        return cv2.cvtColor(_fit(frame, max_dim), cv2.COLOR_BGR2RGB)
+    if pixel_format == PIXEL_FORMAT_GRAY8:
+        return cv2.cvtColor(_fit(frame, max_dim), cv2.COLOR_GRAY2RGB)
+    # 4:2:0 planes can't be resized independently of each other; convert first
+    code = cv2.COLOR_YUV2RGB_I420 if pixel_format == PIXEL_FORMAT_I420 else cv2.COLOR_YUV2RGB_NV12
+    return _fit(cv2.cvtColor(frame, code), max_dim)
+
+
+def decode_frame(data: BufferLike, max_dim: Optional[int] = settings.MAX_IMAGE_DIM) -> np.ndarray:
+    """
+    Decode an uploaded or streamed frame to RGB, whatever its encoding.
+
+    Args:
+        data: Raw frame payload or encoded image bytes
+        max_dim: Maximum size of the long side, or None to keep the full resolution
+
+    Returns:
+        RGB image
+
+    Raises:
+        FrameDecodeError: If the payload cannot be decoded
+    """
+    if is_raw_frame(data):
+        return decode_raw_frame(data, max_dim)
+    img = decode_image(data, max_dim)
+    if img is None:
+        raise FrameDecodeError("Could not decode image")
+    return img
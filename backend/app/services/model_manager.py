@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """
+    Loads and warms up the emotion detector in a background thread.
+
+    Importing this module is cheap: torch, mediapipe and OpenCV are only
+    imported by the loader thread, so the web server can answer liveness
+    checks while the model is still loading.
+    """
+
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self):
+        self.state = self.PENDING
+        self.error: Optional[str] = None
+        self.model_path: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._detector = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self, model_path: str) -> None:
+        """Begin loading the model in the background; subsequent calls are no-ops."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.model_path = model_path
+            self.started_at = datetime.utcnow()
+            self.state = self.LOADING
+            self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def _load(self) -> None:
+        try:
+            start = time.perf_counter()
+            from .emotion_detector import get_emotion_detector
+            detector = get_emotion_detector(self.model_path)
+            self.load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            detector.warmup()
+            self.warmup_seconds = time.perf_counter() - start
+
+            self._detector = detector
+            self.state = self.READY
+            logger.info(
+                f"Model ready: loaded in {self.load_seconds:.2f}s, warmed up in {self.warmup_seconds:.2f}s"
+            )
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = self.FAILED
+            logger.error(f"Model loading failed: {self.error}", exc_info=True)
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    @property
+    def detector(self):
+        """The loaded detector, or None while loading or after a failure."""
+        return self._detector
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finished (successfully or not). Returns True if the model is ready."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": self.state,
+            "model_path": self.model_path,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+model_manager = ModelManager()
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from ..core.config import settings
+from ..core.metrics import registry
+from .scheduler import FairScheduler, Job, scheduler_from_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class QualityProfile:
+    """Knobs the inference pipeline can turn down under load, from most to least expensive."""
+    name: str
+    max_dim: int              # long side frames are resized to before face detection
+    refine_landmarks: bool    # allow iris-refined FaceMesh when a caller asks for it
+    enhance: bool             # CLAHE + sharpening of the face crop
+    save_debug: bool          # write face crops to DEBUG_FACES_DIR (when DEBUG_SAVE_FACES is on)
+    frame_skip: int           # live streams: analyze one frame in N, reuse the result for the rest
+
+
+PROFILES: List[QualityProfile] = [
+    QualityProfile("full", max_dim=settings.MAX_IMAGE_DIM, refine_landmarks=True, enhance=True, save_debug=True, frame_skip=1),
+    QualityProfile("reduced", max_dim=480, refine_landmarks=False, enhance=True, save_debug=False, frame_skip=1),
+    QualityProfile("fast", max_dim=320, refine_landmarks=False, enhance=False, save_debug=False, frame_skip=2),
+    QualityProfile("minimal", max_dim=256, refine_landmarks=False, enhance=False, save_debug=False, frame_skip=4),
+]
+
+FULL_QUALITY = PROFILES[0]
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed because the inference queue is saturated."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Server is overloaded, retry later")
+        self.retry_after = retry_after
+
+
+class QuotaExceededError(OverloadedError):
+    """Raised when a client exceeds its rate quota for a job class."""
+
+    def __init__(self, retry_after: float):
+        Exception.__init__(self, f"Rate quota exceeded, retry in {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(OverloadedError):
+    """Set on a live job that waited past its deadline; the frame is dropped without running."""
+
+    def __init__(self, waited: float):
+        Exception.__init__(self, f"Frame dropped after waiting {waited:.2f}s for inference")
+        self.retry_after = 0.0
+
+
+_level_gauge = registry.gauge("inference_quality_level", "Active quality profile index (0 = full quality)")
+_transitions = registry.counter("inference_quality_transitions_total", "Quality profile changes", ["from_profile", "to_profile"])
+_shed = registry.counter("inference_shed_total", "Requests rejected by load shedding", ["kind"])
+_queue_wait = registry.histogram("inference_queue_wait_seconds", "Time between submission and start of inference", ["kind"])
+_queue_depth = registry.gauge("inference_queue_depth", "Inference jobs waiting or running")
+_profile_jobs = registry.counter("inference_jobs_total", "Inference jobs run, by quality profile", ["profile"])
+_queued = registry.gauge("inference_queued_jobs", "Inference jobs waiting, by class", ["kind"])
+_quota_rejected = registry.counter("inference_quota_rejected_total", "Jobs rejected by per-client rate quotas", ["kind"])
+_deadline_dropped = registry.counter("inference_deadline_dropped_total", "Jobs dropped after waiting past their deadline", ["kind"])
+
+
+class OverloadController:
+    """
+    Picks a quality profile from an EWMA of inference queue wait time.
+
+    Steps one profile cheaper when the smoothed wait exceeds the current level's
+    threshold for ``dwell`` seconds, and one profile better once it has stayed
+    below half of the previous level's threshold for ``cooldown`` seconds.
+    Beyond the last profile it sheds load.
+    """
+
+    def __init__(
+        self,
+        target_wait: float = 0.1,
+        shed_wait: float = 2.0,
+        alpha: float = 0.2,
+        dwell: float = 1.0,
+        cooldown: float = 5.0,
+        profiles: Optional[List[QualityProfile]] = None,
+    ):
+        self.profiles = profiles or PROFILES
+        # Thresholds grow geometrically from target_wait at full quality to shed_wait at the last profile
+        steps = len(self.profiles)
+        ratio = (shed_wait / target_wait) ** (1.0 / steps)
+        self.thresholds = [target_wait * ratio ** i for i in range(steps)] + [shed_wait]
+        self.shed_wait = shed_wait
+        self.alpha = alpha
+        self.dwell = dwell
+        self.cooldown = cooldown
+        self.level = 0
+        self.shedding = False
+        self.ewma = 0.0
+        self._above_since: Optional[float] = None
+        self._below_since: Optional[float] = None
+        self.transitions: deque = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    @property
+    def profile(self) -> QualityProfile:
+        return self.profiles[self.level]
+
+    def observe(self, wait: float, now: Optional[float] = None) -> None:
+        """Feed one queue-wait measurement (seconds)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.ewma = wait if self.ewma == 0.0 else self.alpha * wait + (1 - self.alpha) * self.ewma
+            upper = self.thresholds[self.level]
+            lower = self.thresholds[self.level - 1] * 0.5 if self.level > 0 else 0.0
+
+            if self.ewma > upper:
+                self._below_since = None
+                if self._above_since is None:
+                    self._above_since = now
+                if now - self._above_since >= self.dwell:
+                    self._above_since = now
+                    if self.level < len(self.profiles) - 1:
+                        self._transition(self.level + 1)
+                    elif not self.shedding:
+                        self.shedding = True
+                        self._record("shed")
+            elif self.ewma < (self.thresholds[self.level] * 0.5 if self.shedding else lower):
+                self._above_since = None
+                if self._below_since is None:
+                    self._below_since = now
+                if now - self._below_since >= self.cooldown:
+                    self._below_since = now
+                    if self.shedding:
+                        self.shedding = False
+                        self._record(self.profile.name, from_name="shed")
+                    elif self.level > 0:
+                        self._transition(self.level - 1)
+            else:
+                self._above_since = None
+                self._below_since = None
+
+    def _transition(self, level: int) -> None:
+        previous = self.profile.name
+        self.level = level
+        _level_gauge.set(level)
+        self._record(self.profile.name, from_name=previous)
+
+    def _record(self, to_name: str, from_name: Optional[str] = None) -> None:
+        from_name = from_name or self.profile.name
+        _transitions.inc(from_profile=from_name, to_profile=to_name)
+        self.transitions.append({
+            "timestamp": datetime.utcnow().isoformat(),
+            "from": from_name,
+            "to": to_name,
+            "queue_wait_ewma": round(self.ewma, 4),
+        })
+        logger.warning(f"Inference quality {from_name} -> {to_name} (queue wait EWMA {self.ewma:.3f}s)")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profile": asdict(self.profile),
+                "level": self.level,
+                "shedding": self.shedding,
+                "queue_wait_ewma": round(self.ewma, 4),
+                "thresholds": [round(t, 4) for t in self.thresholds],
+                "transitions": list(self.transitions),
+            }
+
+
+class InferenceExecutor:
+    """
+    Serializes all detector work on one worker thread and measures queue wait.
+
+    The detector (MediaPipe graphs, temporal smoothing state) is not thread-safe,
+    so every caller -- async endpoints, WebSocket sessions, bulk streams running
+    in Starlette's threadpool -- goes through here. Waiting jobs are ordered by
+    the ``FairScheduler``: live frames before interactive requests before batch
+    work, fair shares between clients within each class.
+    """
+
+    def __init__(self, controller: OverloadController, max_queue: int = 64, scheduler: Optional[FairScheduler] = None):
+        self.controller = controller
+        self.max_queue = max_queue
+        self.scheduler = scheduler or FairScheduler()
+        self._worker: Optional[threading.Thread] = None
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def _admit(self, kind: str, shed: bool) -> None:
+        with self._lock:
+            if shed and (self.controller.shedding or self._depth >= self.max_queue):
+                _shed.inc(kind=kind)
+                raise OverloadedError(retry_after=max(1.0, self.controller.ewma))
+            self._depth += 1
+            _queue_depth.set(self._depth)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="inference", daemon=True)
+                self._worker.start()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._depth -= 1
+            _queue_depth.set(self._depth)
+
+    def _work(self) -> None:
+        while True:
+            job = self.scheduler.pop()
+            if job is None:
+                # Exit only if nothing was admitted meanwhile; the next submit
+                # then starts a fresh worker instead of queueing behind this one
+                with self._lock:
+                    if self._depth == 0:
+                        self._worker = None
+                        return
+                continue
+            _queued.set(self.scheduler.queued()[job.kind], kind=job.kind)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    self._run(job)
+            finally:
+                self._release()
+
+    def _run(self, job: Job) -> None:
+        now = time.monotonic()
+        wait = now - job.submitted
+        _queue_wait.observe(wait, kind=job.kind)
+        if job.expired(now):
+            _deadline_dropped.inc(kind=job.kind)
+            job.future.set_exception(DeadlineExceededError(wait))
+            return
+        # Batch jobs are expected to wait behind live and interactive ones; only
+        # latency-sensitive waits mean the pipeline needs to get cheaper
+        if job.kind != "batch":
+            self.controller.observe(wait)
+        profile = self.controller.profile
+        _profile_jobs.inc(profile=profile.name)
+        try:
+            job.future.set_result((job.fn(profile), profile))
+        except BaseException as e:
+            job.future.set_exception(e)
+
+    def submit(
+        self,
+        fn: Callable[[QualityProfile], T],
+        kind: str = "interactive",
+        shed: bool = True,
+        client: str = "anonymous",
+        cost: float = 1.0,
+    ) -> "Future[Tuple[T, QualityProfile]]":
+        """
+        Queue ``fn(profile)`` for the inference thread.
+
+        Args:
+            fn: Callable receiving the quality profile to run at
+            kind: Job class: "live", "interactive" or "batch"
+            shed: Reject the job when overloaded or over quota; streams that were
+                admitted up front pass False so they are not cut off halfway, and
+                wait out their quota instead (blocking the calling thread)
+            client: Who the job is for; fair shares and quotas are per client
+            cost: Work units the job represents, e.g. images in a batch
+
+        Raises:
+            QuotaExceededError: If shedding is allowed and the client is over its rate quota
+            OverloadedError: If shedding is allowed and the controller is shedding load or the queue is full
+        """
+        retry_after = self.scheduler.reserve(kind, client, cost)
+        if retry_after > 0 and shed:
+            _quota_rejected.inc(kind=kind)
+            raise QuotaExceededError(retry_after)
+        while retry_after > 0:
+            time.sleep(retry_after)
+            retry_after = self.scheduler.reserve(kind, client, cost)
+        self._admit(kind, shed)
+        job = self.scheduler.push(fn, kind, client, cost)
+        _queued.set(self.scheduler.queued()[kind], kind=kind)
+        return job.future
+
+    async def run(
+        self, fn: Callable[[QualityProfile], T], kind: str = "interactive", client: str = "anonymous"
+    ) -> Tuple[T, QualityProfile]:
+        """Async wrapper around ``submit`` for endpoint handlers."""
+        return await asyncio.wrap_future(self.submit(fn, kind, client=client))
+
+    def call(
+        self,
+        fn: Callable[[QualityProfile], T],
+        kind: str = "batch",
+        shed: bool = True,
+        client: str = "anonymous",
+        cost: float = 1.0,
+    ) -> Tuple[T, QualityProfile]:
+        """Blocking wrapper around ``submit`` for code already running in a worker thread."""
+        return self.submit(fn, kind, shed, client, cost).result()
+
+    def status(self) -> Dict[str, Any]:
+        classes = self.scheduler.status()
+        for kind, info in classes.items():
+            wait = _queue_wait.snapshot(kind=kind)
+            # Quantiles beyond the last bucket are infinite, which JSON cannot carry
+            info["queue_wait"] = {k: None if math.isinf(v) else v for k, v in wait.items()} if wait else None
+            info["deadline_dropped"] = _deadline_dropped.value(kind=kind)
+            info["quota_rejected"] = _quota_rejected.value(kind=kind)
+        return {"queue_depth": self._depth, "max_queue": self.max_queue, "classes": classes, **self.controller.status()}
+
+
+# Singleton instance
+inference_executor = None
+_inference_executor_lock = threading.Lock()
+
+def get_inference_executor() -> InferenceExecutor:
+    """Return the process-wide inference executor, creating it on first use."""
+    global inference_executor
+    if inference_executor is None:
+        with _inference_executor_lock:
+            if inference_executor is None:
+                controller = OverloadController(
+                    target_wait=settings.OVERLOAD_TARGET_WAIT,
+                    shed_wait=settings.OVERLOAD_SHED_WAIT,
+                    dwell=settings.OVERLOAD_DWELL,
+                    cooldown=settings.OVERLOAD_COOLDOWN,
+                )
+                inference_executor = InferenceExecutor(
+                    controller, max_queue=settings.INFERENCE_MAX_QUEUE, scheduler=scheduler_from_settings()
+                )
+    return inference_executor
@@ -0,0 +1,335 @@
+"""
+On-demand profiling of a running worker.
+
+Two kinds of session, at most one at a time per process:
+
+- "cpu": a sampling profiler. A background thread reads every thread's Python
+  stack from ``sys._current_frames()`` at a fixed interval for N seconds.
+  Output as collapsed stacks (flamegraph.pl, speedscope) or a Chrome trace.
+- "torch": ``torch.profiler`` around each of the next N ``predict_emotion``
+  calls, giving per-op model timings and a Chrome trace.
+
+Nothing runs and nothing is patched while no session is active: the sampler
+thread only exists for the session, and the torch session wraps the detector
+instance's ``predict_emotion`` only until it has seen its N calls.
+"""
+import abc
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_sessions = registry.counter("profiling_sessions_total", "Profiling sessions started", ["kind"])
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profiling session is requested while another one is running."""
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class ProfileSession(abc.ABC):
+    """State and results of one profiling session."""
+
+    kind = ""
+    formats: tuple = ()
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.utcnow().isoformat()
+        self.finished_at: Optional[str] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    def _finish(self, error: Optional[str] = None) -> None:
+        self.error = error
+        self.finished_at = datetime.utcnow().isoformat()
+        self.done.set()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": "error" if self.error else "done" if self.done.is_set() else "running",
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "formats": list(self.formats),
+        }
+
+    @abc.abstractmethod
+    def render(self, fmt: str) -> str:
+        """The session's results in ``fmt``, one of ``formats``."""
+
+
+class SamplingSession(ProfileSession):
+    """Samples the Python stacks of every thread except its own."""
+
+    kind = "cpu"
+    formats = ("collapsed", "chrome")
+
+    def __init__(self, seconds: float, interval: float):
+        super().__init__()
+        self.seconds = seconds
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        # Per thread: (timestamp, stack) for every sample, for the Chrome trace
+        self.timelines: Dict[str, List[tuple]] = defaultdict(list)
+        # Samples repeat the same few stacks; keep one copy of each
+        self._names: Dict[Any, str] = {}
+        self._interned: Dict[tuple, tuple] = {}
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _sample(self) -> None:
+        try:
+            me = threading.get_ident()
+            start = time.perf_counter()
+            deadline = start + self.seconds
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        name = self._names.get(code)
+                        if name is None:
+                            name = self._names[code] = _frame_name(code)
+                        stack.append(name)
+                        frame = frame.f_back
+                    stack.reverse()
+                    thread = names.get(ident, str(ident))
+                    stack = self._interned.setdefault(tuple(stack), tuple(stack))
+                    self.stacks[(thread,) + stack] += 1
+                    self.timelines[thread].append((now - start, stack))
+                self.samples += 1
+                time.sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+        except Exception as e:
+            logger.error(f"Sampling profiler failed: {e}", exc_info=True)
+            self._finish(str(e))
+        else:
+            self._finish()
+
+    def summary(self) -> Dict[str, Any]:
+        top = Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) > 1:
+                top[stack[-1]] += count
+        return {
+            **super().summary(),
+            "seconds": self.seconds,
+            "interval": self.interval,
+            "samples": self.samples,
+            "top_frames": [{"frame": frame, "samples": n} for frame, n in top.most_common(20)],
+        }
+
+    def render(self, fmt: str) -> str:
+        if fmt == "collapsed":
+            return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+        # Chrome trace: consecutive samples sharing a stack prefix become one span
+        events: List[Dict[str, Any]] = []
+        for tid, (thread, timeline) in enumerate(sorted(self.timelines.items())):
+            events.append({"ph": "M", "name": "thread_name", "pid": 0, "tid": tid, "args": {"name": thread}})
+            open_stack: tuple = ()
+            t = 0.0
+            for t, stack in timeline:
+                common = 0
+                while common < min(len(open_stack), len(stack)) and open_stack[common] == stack[common]:
+                    common += 1
+                for name in reversed(open_stack[common:]):
+                    events.append({"ph": "E", "name": name, "pid": 0, "tid": tid, "ts": t * 1e6})
+                for name in stack[common:]:
+                    events.append({"ph": "B", "name": name, "pid": 0, "tid": tid, "ts": t * 1e6})
+                open_stack = stack
+            for name in reversed(open_stack):
+                events.append({"ph": "E", "name": name, "pid": 0, "tid": tid, "ts": (t + self.interval) * 1e6})
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+class TorchCallSession(ProfileSession):
+    """Runs ``torch.profiler`` around each of the next ``calls`` calls of a method."""
+
+    kind = "torch"
+    formats = ("chrome",)
+
+    def __init__(self, calls: int, timeout: float):
+        super().__init__()
+        self.calls = calls
+        self.timeout = timeout
+        self.profiled = 0
+        self.wall_ms: List[float] = []
+        self.ops: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "cpu_ms": 0.0, "self_cpu_ms": 0.0, "device_ms": 0.0})
+        self.trace_events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock()
+        self._restore: Optional[Callable[[], None]] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def attach(self, target: Any, method: str = "predict_emotion") -> None:
+        """Shadow ``target.method`` with a profiling wrapper until the session ends."""
+        original = getattr(target, method)
+
+        def profiled(*args, **kwargs):
+            # The torch profiler is process-wide; a concurrent call from another thread runs unprofiled
+            if self.done.is_set() or not self._call_lock.acquire(blocking=False):
+                return original(*args, **kwargs)
+            try:
+                return self._profile_call(original, args, kwargs)
+            finally:
+                self._call_lock.release()
+
+        def restore():
+            # Only the instance attribute is removed; the class method was never touched
+            if target.__dict__.get(method) is profiled:
+                delattr(target, method)
+
+        setattr(target, method, profiled)
+        self._restore = restore
+        self._timer = threading.Timer(self.timeout, self.stop, kwargs={"reason": "timeout"})
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _profile_call(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        import torch
+        from torch.profiler import ProfilerActivity, profile, record_function
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        start = time.perf_counter()
+        with profile(activities=activities, record_shapes=True) as prof:
+            with record_function("predict_emotion"):
+                result = fn(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        try:
+            self._collect(prof, elapsed)
+        except Exception as e:
+            logger.warning(f"Could not collect torch profile: {e}")
+        return result
+
+    def _collect(self, prof, elapsed_ms: float) -> None:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            path = f.name
+        try:
+            prof.export_chrome_trace(path)
+            with open(path) as f:
+                events = json.load(f).get("traceEvents", [])
+        finally:
+            os.unlink(path)
+        with self._lock:
+            if self.done.is_set():
+                return
+            for event in prof.key_averages():
+                op = self.ops[event.key]
+                op["count"] += event.count
+                op["cpu_ms"] += event.cpu_time_total / 1000
+                op["self_cpu_ms"] += event.self_cpu_time_total / 1000
+                op["device_ms"] += getattr(event, "device_time_total", 0.0) / 1000
+            self.trace_events.extend(events)
+            self.wall_ms.append(elapsed_ms)
+            self.profiled += 1
+            finished = self.profiled >= self.calls
+        if finished:
+            self.stop()
+
+    def stop(self, reason: Optional[str] = None) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._restore is not None:
+            self._restore()
+        if not self.done.is_set():
+            if reason == "timeout" and not self.profiled:
+                self._finish(f"No predict_emotion calls within {self.timeout:.0f}s")
+            else:
+                self._finish()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            ops = sorted(self.ops.items(), key=lambda item: item[1]["self_cpu_ms"], reverse=True)[:30]
+            wall = list(self.wall_ms)
+        return {
+            **super().summary(),
+            "calls_requested": self.calls,
+            "calls_profiled": self.profiled,
+            "mean_call_ms": round(sum(wall) / len(wall), 3) if wall else None,
+            "ops": [{"op": name, **{k: round(v, 3) for k, v in stats.items()}} for name, stats in ops],
+        }
+
+    def render(self, fmt: str) -> str:
+        with self._lock:
+            return json.dumps({"traceEvents": self.trace_events, "displayTimeUnit": "ms"})
+
+
+class Profiler:
+    """Starts sessions one at a time and keeps the last few results in memory."""
+
+    def __init__(self, keep: int = 4):
+        self.keep = keep
+        self._sessions: "OrderedDict[str, ProfileSession]" = OrderedDict()
+        self._active: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def _register(self, session: ProfileSession) -> None:
+        if self._active is not None and not self._active.done.is_set():
+            raise ProfilerBusyError(f"Profiling session {self._active.id} is still running")
+        self._active = session
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.keep:
+            self._sessions.popitem(last=False)
+        _sessions.inc(kind=session.kind)
+
+    def start_cpu(self, seconds: float, interval: float = settings.PROFILE_SAMPLE_INTERVAL) -> SamplingSession:
+        """Sample all threads for ``seconds`` (capped at PROFILE_MAX_SECONDS)."""
+        session = SamplingSession(min(seconds, settings.PROFILE_MAX_SECONDS), max(interval, 0.001))
+        with self._lock:
+            self._register(session)
+        session.start()
+        logger.warning(f"CPU profiling session {session.id} started for {session.seconds:.1f}s")
+        return session
+
+    def start_torch(self, target: Any, calls: int) -> TorchCallSession:
+        """Profile the next ``calls`` (capped at PROFILE_MAX_CALLS) ``predict_emotion`` calls on ``target``."""
+        session = TorchCallSession(min(calls, settings.PROFILE_MAX_CALLS), settings.PROFILE_MAX_SECONDS)
+        with self._lock:
+            self._register(session)
+            session.attach(target)
+        logger.warning(f"Torch profiling session {session.id} armed for {session.calls} calls")
+        return session
+
+    def get(self, session_id: str) -> Optional[ProfileSession]:
+        return self._sessions.get(session_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [ProfileSession.summary(session) for session in reversed(self._sessions.values())]
+
+
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
@@ -0,0 +1,196 @@
+import cv2
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with TTL, bounded by entry count and approximate bytes.
+
+    Values are stored as-is; their size is estimated from their JSON encoding
+    (or ``nbytes`` for arrays) when they are inserted.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 1024
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def model_identity(model_path: str) -> str:
+    """Identify a model file by path, size and mtime so replacing it invalidates cached results."""
+    try:
+        stat = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return os.path.abspath(model_path)
+
+
+def content_key(contents: Union[bytes, memoryview], model_id: str, **params: Any) -> str:
+    """
+    Build a cache key from the uploaded bytes, the model and the request parameters.
+
+    Args:
+        contents: Raw uploaded file bytes (any buffer, e.g. a view of the spooled upload)
+        model_id: ``model_identity`` of the loaded model that will produce the result
+        **params: Any other parameters that influence the result
+
+    Returns:
+        Hex digest usable as a cache key
+    """
+    digest = hashlib.blake2b(contents, digest_size=20)
+    digest.update(model_id.encode())
+    for name in sorted(params):
+        digest.update(f"|{name}={params[name]}".encode())
+    return digest.hexdigest()
+
+
+def perceptual_hash(img: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Difference hash (dHash) of an image: robust to re-encoding, small noise and scaling.
+
+    Args:
+        img: RGB or grayscale image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        Hash as a Python int
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+FACE_HASH_SIZE = 16  # 256 bits: an 8x8 hash of a face crop can match different expressions of one face
+
+
+def face_key(model_id: str, face_img: np.ndarray, **params: Any) -> str:
+    """
+    Face-cache key: the model, a perceptual hash of the crop and whatever else shapes the model input.
+
+    Only crops with identical hashes share an entry.
+
+    Args:
+        model_id: ``model_identity`` of the model whose output is cached
+        face_img: The face crop before enhancement
+        **params: Settings that change the model input for the same crop,
+            e.g. the detector backend, contrast enhancement, working resolution
+    """
+    settings_part = ",".join(f"{name}={params[name]}" for name in sorted(params))
+    return f"{model_id}|{settings_part}|{perceptual_hash(face_img, FACE_HASH_SIZE):0{FACE_HASH_SIZE * FACE_HASH_SIZE // 4}x}"
+
+
+# Singleton instances
+result_cache = None
+face_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide response cache for uploaded images."""
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RESULT_CACHE_TTL,
+        )
+    return result_cache
+
+
+def get_face_cache() -> Optional[ResultCache]:
+    """Return the process-wide face-crop cache, or None if it is disabled."""
+    global face_cache
+    if face_cache is None and settings.FACE_CACHE_ENABLED:
+        face_cache = ResultCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RESULT_CACHE_TTL,
+        )
+    return face_cache
@@ -0,0 +1,263 @@
+"""
+Priority and fairness for jobs waiting on the inference thread.
+
+Jobs belong to a class -- "live" WebSocket frames, "interactive" single-image
+requests, "batch" bulk uploads -- and a client. Classes are served in strict
+priority order. Within a class, clients share the thread by self-clocked
+weighted fair queuing: each job gets a virtual finish tag of
+``max(class virtual time, client's previous tag) + cost / weight`` and the
+smallest tag runs next, so a client queuing a hundred jobs only gets every
+other slot against a client queuing one at a time.
+
+Each client also has a per-class token-bucket rate quota, and live frames
+carry a deadline after which they are dropped instead of run.
+"""
+import heapq
+import ipaddress
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from ..core.config import settings
+
+# Highest priority first
+CLASSES = ("live", "interactive", "batch")
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "client=weight,client=weight" into a dict, ignoring malformed entries."""
+    weights = {}
+    for item in spec.split(","):
+        client, _, weight = item.strip().partition("=")
+        try:
+            weights[client.strip()] = float(weight)
+        except ValueError:
+            continue
+    return {client: weight for client, weight in weights.items() if client and weight > 0}
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(spec: str) -> List[Network]:
+    """Parse "address,network/prefix,..." into networks, ignoring malformed entries."""
+    networks = []
+    for item in spec.split(","):
+        try:
+            networks.append(ipaddress.ip_network(item.strip(), strict=False))
+        except ValueError:
+            continue
+    return networks
+
+
+def _trusted(address: str, proxies: Sequence[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_address(peer: Optional[str], forwarded_for: Optional[str], proxies: Sequence[Network]) -> Optional[str]:
+    """
+    The address a request came from, seen through any trusted proxies.
+
+    ``X-Forwarded-For`` is only believed when the peer is a trusted proxy, and
+    read from the right: each proxy appends the address it received from, so
+    the first untrusted hop is the client. Anything left of it may be forged.
+
+    Args:
+        peer: Address of the connection's other end
+        forwarded_for: The request's X-Forwarded-For header, if any
+        proxies: Networks of the proxies in front of the server
+
+    Returns:
+        The client's address, or ``peer`` when it is not a trusted proxy
+    """
+    if peer is None or not forwarded_for or not _trusted(peer, proxies):
+        return peer
+    address = peer
+    for hop in reversed(forwarded_for.split(",")):
+        hop = hop.strip()
+        if not hop:
+            continue
+        address = hop
+        if not _trusted(hop, proxies):
+            break
+    return address
+
+
+@dataclass(order=True)
+class Job:
+    finish: float
+    seq: int
+    kind: str = field(compare=False)
+    client: str = field(compare=False)
+    fn: Callable[..., Any] = field(compare=False)
+    future: Future = field(compare=False)
+    submitted: float = field(compare=False)
+    deadline: Optional[float] = field(compare=False, default=None)
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now > self.deadline
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most one second's worth."""
+
+    def __init__(self, rate: float, now: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """Consume ``cost`` tokens; returns 0, or the seconds until they would have been available."""
+        self.refill(now)
+        if self.tokens >= min(cost, self.capacity):
+            self.tokens -= cost
+            return 0.0
+        return (min(cost, self.capacity) - self.tokens) / self.rate
+
+
+class _ClassQueue:
+    def __init__(self):
+        self.heap: List[Job] = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+
+    def push(self, job: Job, cost: float, weight: float) -> None:
+        start = max(self.virtual_time, self.last_finish.get(job.client, 0.0))
+        job.finish = start + cost / weight
+        self.last_finish[job.client] = job.finish
+        heapq.heappush(self.heap, job)
+
+    def pop(self) -> Job:
+        job = heapq.heappop(self.heap)
+        self.virtual_time = job.finish
+        if not self.heap:
+            # Every client is caught up; tags no longer matter
+            self.last_finish.clear()
+        elif len(self.last_finish) > 2 * len(self.heap) + 64:
+            self.last_finish = {c: f for c, f in self.last_finish.items() if f > self.virtual_time}
+        return job
+
+
+class FairScheduler:
+    """
+    Queue of inference jobs ordered by class priority, then weighted fair share.
+
+    Thread-safe: producers call ``push`` from the event loop or worker threads,
+    the inference thread blocks in ``pop``.
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        max_clients: int = 4096,
+    ):
+        """
+        Args:
+            rates: Per-client jobs (cost units) per second for each class; 0 or missing = unlimited
+            deadlines: Seconds a job of each class may wait before it is dropped; missing = never
+            weights: Fair-share weight per client id (default 1)
+            max_clients: Token buckets kept per class before idle ones are forgotten
+        """
+        self.rates = rates or {}
+        self.deadlines = deadlines or {}
+        self.weights = weights or {}
+        self.max_clients = max_clients
+        self._queues = {kind: _ClassQueue() for kind in CLASSES}
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {kind: {} for kind in CLASSES}
+        self._seq = itertools.count()
+        self._ready = threading.Condition()
+        self._closed = False
+
+    def _check_kind(self, kind: str) -> None:
+        if kind not in self._queues:
+            raise ValueError(f"Unknown job class {kind!r}; expected one of {', '.join(CLASSES)}")
+
+    def reserve(self, kind: str, client: str, cost: float = 1.0) -> float:
+        """
+        Charge ``cost`` against the client's quota for ``kind``.
+
+        Returns 0 when within quota, otherwise the seconds until it would be
+        (nothing is charged in that case).
+        """
+        self._check_kind(kind)
+        rate = self.rates.get(kind, 0.0)
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._ready:
+            buckets = self._buckets[kind]
+            bucket = buckets.get(client)
+            if bucket is None:
+                if len(buckets) >= self.max_clients:
+                    # Forget clients whose buckets have refilled; they would start full anyway
+                    for idle in [c for c, b in buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.capacity]:
+                        del buckets[idle]
+                bucket = buckets[client] = TokenBucket(rate, now)
+            return bucket.take(cost, now)
+
+    def push(self, fn: Callable[..., Any], kind: str, client: str, cost: float = 1.0) -> Job:
+        self._check_kind(kind)
+        now = time.monotonic()
+        deadline = self.deadlines.get(kind)
+        job = Job(0.0, next(self._seq), kind, client, fn, Future(), now, now + deadline if deadline else None)
+        with self._ready:
+            self._queues[kind].push(job, cost, self.weights.get(client, 1.0))
+            self._ready.notify()
+        return job
+
+    def pop(self, timeout: Optional[float] = None) -> Optional[Job]:
+        """Next job to run, or None on timeout or once closed and drained."""
+        with self._ready:
+            while True:
+                for kind in CLASSES:
+                    if self._queues[kind].heap:
+                        return self._queues[kind].pop()
+                if self._closed or not self._ready.wait(timeout):
+                    return None
+
+    def close(self) -> None:
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+
+    def queued(self) -> Dict[str, int]:
+        with self._ready:
+            return {kind: len(queue.heap) for kind, queue in self._queues.items()}
+
+    def status(self) -> Dict[str, Any]:
+        with self._ready:
+            return {
+                kind: {
+                    "queued": len(queue.heap),
+                    "clients_waiting": len({job.client for job in queue.heap}),
+                    "rate_per_client": self.rates.get(kind) or None,
+                    "deadline": self.deadlines.get(kind),
+                }
+                for kind, queue in self._queues.items()
+            }
+
+
+def scheduler_from_settings() -> FairScheduler:
+    return FairScheduler(
+        rates={
+            "live": settings.SCHEDULER_LIVE_FPS,
+            "interactive": settings.SCHEDULER_INTERACTIVE_RATE,
+            "batch": settings.SCHEDULER_BATCH_RATE,
+        },
+        deadlines={"live": settings.SCHEDULER_LIVE_DEADLINE} if settings.SCHEDULER_LIVE_DEADLINE > 0 else {},
+        weights=parse_weights(settings.SCHEDULER_CLIENT_WEIGHTS),
+    )
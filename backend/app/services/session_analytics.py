@@ -0,0 +1,416 @@
+"""
+Online analytics of live emotion sessions.
+
+Each WebSocket session gets a ``SessionAnalytics`` that folds every detection
+into a fixed amount of state, so an update is O(1) in the session's length and
+a few microseconds of work on the event loop:
+
+- a transition matrix between successive distinct emotions;
+- dwell times -- how long each emotion lasted before the next one, or before
+  the face was lost -- in log-spaced histograms;
+- rolling entropy of the emotion mix and rate of emotion switches, as
+  exponentially weighted averages with a time constant of
+  ANALYTICS_WINDOW_SECONDS, so they do not depend on the frame rate;
+- sustained negative-affect episodes: a time-weighted share of negative
+  emotions that rises above ANALYTICS_EPISODE_ENTER and stays above
+  ANALYTICS_EPISODE_EXIT for at least ANALYTICS_EPISODE_MIN_SECONDS.
+
+``snapshot()`` can be called at any time; ``finalize()`` turns the session
+into a compact report when it ends. Sessions live in the worker process that
+owns the WebSocket, and are only touched from its event loop.
+"""
+import logging
+import math
+import time
+import uuid
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from ..core.config import settings
+from ..core.logs import log_event
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Upper edges of the dwell-time histogram buckets, in seconds: 1/8 s doubling up to 17 min, then one open bucket
+DWELL_EDGES = tuple(0.125 * 2 ** i for i in range(14))
+
+_active = registry.gauge("session_analytics_active", "Live sessions with analytics in this worker")
+_episodes = registry.counter("session_negative_episodes_total", "Sustained negative-affect episodes detected", ["dominant"])
+
+
+def _negative_emotions() -> FrozenSet[str]:
+    return frozenset(e.strip().lower() for e in settings.ANALYTICS_NEGATIVE_EMOTIONS.split(",") if e.strip())
+
+
+@dataclass(frozen=True)
+class AnalyticsParams:
+    window: float = settings.ANALYTICS_WINDOW_SECONDS
+    max_gap: float = settings.ANALYTICS_MAX_GAP
+    episode_tau: float = settings.ANALYTICS_EPISODE_TAU
+    episode_enter: float = settings.ANALYTICS_EPISODE_ENTER
+    episode_exit: float = settings.ANALYTICS_EPISODE_EXIT
+    episode_min_seconds: float = settings.ANALYTICS_EPISODE_MIN_SECONDS
+    max_episodes: int = 50
+    negative: FrozenSet[str] = _negative_emotions()
+
+
+class DwellStats:
+    """Count, total, maximum and a log-bucketed histogram of dwell times for one emotion."""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(DWELL_EDGES) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_right(DWELL_EDGES, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper edge of the bucket holding the ``q`` quantile, capped at the longest dwell seen."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(DWELL_EDGES[i], self.max) if i < len(DWELL_EDGES) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 3),
+            "mean_seconds": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_seconds": round(self.quantile(0.5), 3),
+            "p90_seconds": round(self.quantile(0.9), 3),
+            "max_seconds": round(self.max, 3),
+        }
+
+
+class SessionAnalytics:
+    """
+    Running statistics of one live session.
+
+    Args:
+        session_id: Identifier reported to the client and used to query the session
+        client: Who the session belongs to, for the report
+        params: Windows and thresholds; defaults come from settings
+    """
+
+    def __init__(self, session_id: str, client: Optional[str] = None, params: Optional[AnalyticsParams] = None):
+        self.session_id = session_id
+        self.client = client
+        self.params = params or AnalyticsParams()
+        self.started_at = datetime.utcnow().isoformat()
+        self.ended_at: Optional[str] = None
+        self._start = time.monotonic()
+        self._duration = 0.0
+        self.events = 0
+        self.counts: Dict[str, int] = {}
+        self.confidence_sums: Dict[str, float] = {}
+        self.transitions: Dict[str, Dict[str, int]] = {}
+        self.dwell: Dict[str, DwellStats] = {}
+        self.gaps = 0
+        # The emotion currently held, since when, and when it was last seen
+        self._current: Optional[str] = None
+        self._run_start = 0.0
+        self._last_t: Optional[float] = None
+        # Exponentially weighted emotion mix, switch impulses and negative time since the stretch began.
+        # The weights sum to 1 - exp(-elapsed / time constant); dividing by that keeps the start unbiased
+        self._mix: Dict[str, float] = {}
+        self._switches = 0.0
+        self._weighted_since: Optional[float] = None
+        self._negative_weight = 0.0
+        self._negative_share = 0.0
+        # Open episode: start offset, per-emotion counts and confidence sum of its negative detections
+        self._episode_start: Optional[float] = None
+        self._episode_counts: Dict[str, int] = {}
+        self._episode_confidence = 0.0
+        self._episode_confirmed = False
+        self.episodes: List[Dict[str, Any]] = []
+        self.episodes_total = 0
+        self.episode_seconds = 0.0
+
+    def _now(self) -> float:
+        return time.monotonic() - self._start
+
+    def observe(self, emotion: str, confidence: float, t: Optional[float] = None) -> None:
+        """
+        Fold in one detection.
+
+        Args:
+            emotion: Detected emotion label
+            confidence: Its confidence, 0-1
+            t: Seconds since the session started; defaults to now. Must not decrease
+        """
+        t = self._now() if t is None else t
+        p = self.params
+        self.events += 1
+        self.counts[emotion] = self.counts.get(emotion, 0) + 1
+        self.confidence_sums[emotion] = self.confidence_sums.get(emotion, 0.0) + confidence
+        negative = emotion in p.negative
+
+        last_t = self._last_t
+        if last_t is not None and t - last_t > p.max_gap:
+            # The face was gone (or frames were not analyzed) for a while: the run ended when it was last seen
+            self.gaps += 1
+            self._close_run(last_t)
+            self._close_episode(last_t)
+            # Rolling statistics restart with the next continuous stretch
+            self._weighted_since = None
+
+        switched = False
+        if self._current is None:
+            self._current, self._run_start = emotion, t
+        elif emotion != self._current:
+            row = self.transitions.setdefault(self._current, {})
+            row[emotion] = row.get(emotion, 0) + 1
+            self._close_run(t)
+            self._current, self._run_start = emotion, t
+            switched = True
+        self._last_t = t
+
+        # Time-weighted averages: each detection stands for the interval since the previous one
+        if self._weighted_since is None:
+            # The first detection of a stretch has no interval yet; it only sets the share until one passes
+            self._mix = {emotion: 0.0}
+            self._switches = 0.0
+            self._negative_weight = 0.0
+            self._negative_share = 1.0 if negative else 0.0
+            self._weighted_since = t
+        else:
+            dt = t - last_t
+            keep = math.exp(-dt / p.window)
+            for label in self._mix:
+                self._mix[label] *= keep
+            self._mix[emotion] = self._mix.get(emotion, 0.0) + 1.0 - keep
+            self._switches = self._switches * keep + switched
+            share_keep = math.exp(-dt / p.episode_tau)
+            self._negative_weight = self._negative_weight * share_keep + (1.0 - share_keep) * negative
+            covered = 1.0 - math.exp(-(t - self._weighted_since) / p.episode_tau)
+            if covered > 0:
+                self._negative_share = self._negative_weight / covered
+
+        # Episode hysteresis on the negative share
+        if self._episode_start is None:
+            if self._negative_share >= p.episode_enter:
+                self._episode_start = t
+                self._episode_counts, self._episode_confidence = {}, 0.0
+                self._episode_confirmed = False
+        elif self._negative_share < p.episode_exit:
+            self._close_episode(t)
+        if self._episode_start is not None:
+            if negative:
+                self._episode_counts[emotion] = self._episode_counts.get(emotion, 0) + 1
+                self._episode_confidence += confidence
+            if not self._episode_confirmed and t - self._episode_start >= p.episode_min_seconds:
+                self._episode_confirmed = True
+                self.episodes_total += 1
+                _episodes.inc(dominant=self._dominant())
+
+    def _close_run(self, end: float) -> None:
+        if self._current is not None:
+            self.dwell.setdefault(self._current, DwellStats()).add(max(0.0, end - self._run_start))
+            self._current = None
+
+    def _dominant(self) -> str:
+        return max(self._episode_counts, key=self._episode_counts.get) if self._episode_counts else "unknown"
+
+    def _episode(self, end: float) -> Dict[str, Any]:
+        negatives = sum(self._episode_counts.values())
+        return {
+            "start_seconds": round(self._episode_start, 3),
+            "end_seconds": round(end, 3),
+            "duration_seconds": round(end - self._episode_start, 3),
+            "dominant": self._dominant(),
+            "emotions": dict(self._episode_counts),
+            "avg_confidence": round(self._episode_confidence / negatives, 3) if negatives else 0.0,
+        }
+
+    def _close_episode(self, end: float) -> None:
+        if self._episode_start is None:
+            return
+        if self._episode_confirmed:
+            episode = self._episode(end)
+            self.episode_seconds += end - self._episode_start
+            self.episodes.append(episode)
+            if len(self.episodes) > self.params.max_episodes:
+                del self.episodes[0]
+        self._episode_start = None
+        self._episode_confirmed = False
+
+    def _rolling(self) -> Dict[str, Any]:
+        total = sum(self._mix.values())
+        if total:
+            mix = {label: w / total for label, w in self._mix.items() if w / total >= 0.001}
+        else:
+            mix = {} if self._current is None else {self._current: 1.0}
+        entropy = -sum(share * math.log2(share) for share in mix.values())
+        switches_per_minute = 0.0
+        if self._weighted_since is not None and self._last_t is not None:
+            # Switch impulses per second of window covered so far, so a short stretch is not under-counted
+            covered = self.params.window * (1.0 - math.exp(-(self._last_t - self._weighted_since) / self.params.window))
+            switches_per_minute = 60.0 * self._switches / covered if covered > 0 else 0.0
+        return {
+            "window_seconds": self.params.window,
+            "entropy_bits": round(abs(entropy), 3),
+            "switches_per_minute": round(switches_per_minute, 2),
+            "mix": {label: round(share, 3) for label, share in sorted(mix.items())},
+            "negative_share": round(self._negative_share, 3),
+        }
+
+    def _totals(self) -> Dict[str, Any]:
+        total = sum(self.counts.values())
+        entropy = -sum(n / total * math.log2(n / total) for n in self.counts.values()) if total else 0.0
+        return {
+            "entropy_bits": round(entropy, 3),
+            "emotions": {
+                emotion: {"count": n, "avg_confidence": round(self.confidence_sums[emotion] / n, 3)}
+                for emotion, n in sorted(self.counts.items())
+            },
+        }
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Statistics as of now, without changing the session.
+
+        The emotion currently held counts toward its dwell times, and an open
+        episode is reported under ``current_episode`` (``confirmed`` once it has
+        lasted ANALYTICS_EPISODE_MIN_SECONDS).
+        """
+        now = self._now() if now is None else now
+        if self._last_t is not None:
+            now = max(now, self._last_t)
+        dwell = dict(self.dwell)
+        if self._current is not None:
+            # Include the open run in a copy of its stats
+            stats = DwellStats()
+            base = self.dwell.get(self._current)
+            if base is not None:
+                stats.count, stats.total, stats.max, stats.buckets = base.count, base.total, base.max, list(base.buckets)
+            stats.add(max(0.0, min(now, self._last_t + self.params.max_gap) - self._run_start))
+            dwell[self._current] = stats
+        current_episode = None
+        if self._episode_start is not None:
+            current_episode = {**self._episode(max(now, self._episode_start)), "confirmed": self._episode_confirmed}
+        return {
+            "session_id": self.session_id,
+            "client": self.client,
+            "status": "active" if self.ended_at is None else "finished",
+            "started_at": self.started_at,
+            "duration_seconds": round(now, 3),
+            "events": self.events,
+            "current": None if self._current is None else {
+                "emotion": self._current,
+                "since_seconds": round(self._run_start, 3),
+            },
+            **self._totals(),
+            "transitions": {src: dict(row) for src, row in self.transitions.items()},
+            "dwell": {emotion: stats.to_dict() for emotion, stats in sorted(dwell.items())},
+            "rolling": self._rolling(),
+            "episodes": list(self.episodes),
+            "current_episode": current_episode,
+            "gaps": self.gaps,
+        }
+
+    def finalize(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Close the open dwell run and episode and return the session's compact report.
+
+        Later calls return the same report.
+        """
+        if self.ended_at is None:
+            now = self._now() if now is None else now
+            end = now if self._last_t is None else min(now, self._last_t + self.params.max_gap)
+            self._close_run(end)
+            self._close_episode(end)
+            self.ended_at = datetime.utcnow().isoformat()
+            self._duration = now
+        totals = self._totals()
+        return {
+            "session_id": self.session_id,
+            "client": self.client,
+            "status": "finished",
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "duration_seconds": round(self._duration, 3),
+            "events": self.events,
+            **totals,
+            "transitions": {src: dict(row) for src, row in self.transitions.items()},
+            "dwell": {emotion: stats.to_dict() for emotion, stats in sorted(self.dwell.items())},
+            "episodes": list(self.episodes),
+            "episodes_total": self.episodes_total,
+            "negative_episode_seconds": round(self.episode_seconds, 3),
+            "gaps": self.gaps,
+        }
+
+
+class SessionAnalyticsRegistry:
+    """Live sessions of this worker, plus the reports of the last ``max_reports`` finished ones."""
+
+    def __init__(self, max_reports: int = 256):
+        self.max_reports = max_reports
+        self._active: Dict[str, SessionAnalytics] = {}
+        self._reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def start(self, client: Optional[str] = None, session_id: Optional[str] = None) -> SessionAnalytics:
+        session_id = session_id or uuid.uuid4().hex[:12]
+        session = SessionAnalytics(session_id, client)
+        self._active[session_id] = session
+        _active.set(len(self._active))
+        return session
+
+    def finish(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Finalize a live session and keep its report; returns None for an unknown session."""
+        session = self._active.pop(session_id, None)
+        _active.set(len(self._active))
+        if session is None:
+            return None
+        report = session.finalize()
+        self._reports[session_id] = report
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+        log_event(logger, logging.INFO, "session_report", "Session %s ended: %d detections over %.1fs, %d negative episodes",
+                  session_id, report["events"], report["duration_seconds"], report["episodes_total"], report=report)
+        return report
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """A live session's snapshot, or a finished session's report."""
+        session = self._active.get(session_id)
+        if session is not None:
+            return session.snapshot()
+        return self._reports.get(session_id)
+
+    def list(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Brief entries for live sessions and finished ones, newest first."""
+        def brief(report: Dict[str, Any]) -> Dict[str, Any]:
+            return {key: report[key] for key in ("session_id", "status", "started_at", "duration_seconds", "events")}
+
+        return {
+            "active": [
+                {"session_id": s.session_id, "status": "active", "started_at": s.started_at,
+                 "duration_seconds": round(s._now(), 3), "events": s.events}
+                for s in reversed(list(self._active.values()))
+            ],
+            "finished": [brief(r) for r in reversed(list(self._reports.values()))],
+        }
+
+
+# Singleton instance
+session_analytics = None
+
+def get_session_analytics() -> SessionAnalyticsRegistry:
+    """Return the process-wide session registry, creating it on first use."""
+    global session_analytics
+    if session_analytics is None:
+        session_analytics = SessionAnalyticsRegistry(max_reports=settings.ANALYTICS_MAX_REPORTS)
+    return session_analytics
@@ -0,0 +1,189 @@
+"""
+Recording of live WebSocket sessions for later replay.
+
+A session file is the exact byte stream the server received -- JPEG or raw
+frames as sent by the client -- plus every reply, each stamped with seconds
+since the session started:
+
+    b"EMOSESS\\x01" | u32 length | metadata JSON
+    then records:  kind (b"F" frame, b"R" reply, b"E" end) | f64 t | u32 length | payload
+
+Frames are stored as received, so a file costs about what the session cost on
+the wire. Recording is off unless SESSION_RECORD_DIR is set; it captures
+faces, so treat the directory like any other store of user images.
+"""
+import json
+import logging
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMOSESS\x01"
+SUFFIX = ".session"
+_RECORD = struct.Struct("<cdI")
+
+_recorded_frames = registry.counter("session_recorded_frames_total", "WebSocket frames written to session recordings")
+
+
+@dataclass
+class RecordedFrame:
+    t: float
+    data: bytes
+    reply: Optional[Dict[str, Any]] = None
+    reply_t: Optional[float] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        return None if self.reply_t is None else self.reply_t - self.t
+
+
+@dataclass
+class Session:
+    metadata: Dict[str, Any]
+    frames: List[RecordedFrame] = field(default_factory=list)
+    summary: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.frames[-1].t if self.frames else 0.0
+
+
+class SessionWriter:
+    """Appends frames and replies to a session file until ``max_bytes`` is reached."""
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None, max_bytes: int = settings.SESSION_RECORD_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.frames = 0
+        self.truncated = False
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        header = json.dumps({"version": 1, "started_at": datetime.utcnow().isoformat(), **(metadata or {})}).encode()
+        self._file = open(path, "wb", buffering=1 << 20)
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self._size = len(MAGIC) + 4 + len(header)
+
+    def _write(self, kind: bytes, payload: bytes, t: Optional[float]) -> bool:
+        with self._lock:
+            if self._file.closed:
+                return False
+            if self._size + _RECORD.size + len(payload) > self.max_bytes and kind != b"E":
+                self.truncated = True
+                return False
+            t = time.monotonic() - self._start if t is None else t
+            self._file.write(_RECORD.pack(kind, t, len(payload)))
+            self._file.write(payload)
+            self._size += _RECORD.size + len(payload)
+            return True
+
+    def frame(self, data: bytes, t: Optional[float] = None) -> None:
+        """Record a received frame; ``t`` defaults to now."""
+        if self._write(b"F", bytes(data), t):
+            self.frames += 1
+            _recorded_frames.inc()
+
+    def reply(self, message: Dict[str, Any], t: Optional[float] = None) -> None:
+        """Record the reply to the most recent unanswered frame."""
+        if not self.truncated:
+            self._write(b"R", json.dumps(message, separators=(",", ":")).encode(), t)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._write(b"E", json.dumps({"frames": self.frames, "truncated": self.truncated}).encode(), None)
+        with self._lock:
+            self._file.close()
+
+
+def read_session(path: str) -> Session:
+    """Load a session file; a file cut short (e.g. by a crash) yields the records before the cut."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session recording")
+    offset = len(MAGIC)
+    (length,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    session = Session(json.loads(data[offset:offset + length]))
+    offset += length
+    unanswered: List[RecordedFrame] = []
+    while offset + _RECORD.size <= len(data):
+        kind, t, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) < length:
+            break
+        if kind == b"F":
+            frame = RecordedFrame(t, payload)
+            session.frames.append(frame)
+            unanswered.append(frame)
+        elif kind == b"R" and unanswered:
+            # The handler answers frames strictly in order
+            frame = unanswered.pop(0)
+            frame.reply, frame.reply_t = json.loads(payload), t
+        elif kind == b"E":
+            session.summary = json.loads(payload)
+    return session
+
+
+def _prune(directory: Path, keep: int) -> None:
+    files = sorted(directory.glob(f"*{SUFFIX}"), key=lambda p: p.stat().st_mtime)
+    for old in files[:max(0, len(files) - keep)]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def start_recording(client: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[SessionWriter]:
+    """
+    Open a recording for a new WebSocket session, if recording is on and this session is sampled.
+
+    The oldest recordings beyond SESSION_RECORD_MAX_FILES are deleted.
+    """
+    if not settings.SESSION_RECORD_DIR or random.random() >= settings.SESSION_RECORD_FRACTION:
+        return None
+    directory = Path(settings.SESSION_RECORD_DIR)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        _prune(directory, settings.SESSION_RECORD_MAX_FILES - 1)
+        name = f"{datetime.utcnow():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}{SUFFIX}"
+        writer = SessionWriter(str(directory / name), {"client": client, **(metadata or {})})
+    except OSError as e:
+        logger.warning("Could not start session recording: %s", e)
+        return None
+    logger.info("Recording WebSocket session to %s", writer.path)
+    return writer
+
+
+class RecordingWebSocket:
+    """Passes frames and replies through to a WebSocket, writing both to a session file."""
+
+    def __init__(self, websocket: Any, writer: SessionWriter):
+        self._websocket = websocket
+        self.writer = writer
+
+    async def receive_bytes(self) -> bytes:
+        data = await self._websocket.receive_bytes()
+        self.writer.frame(data)
+        return data
+
+    async def send_json(self, message: Any, *args: Any, **kwargs: Any) -> None:
+        self.writer.reply(message)
+        await self._websocket.send_json(message, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._websocket, name)
@@ -0,0 +1,208 @@
+import json
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+from starlette.exceptions import HTTPException
+
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+_rejected = registry.counter("upload_rejected_total", "Uploads rejected for exceeding the size limit", ["path"])
+
+
+class UploadTooLargeError(HTTPException):
+    """
+    Raised when an upload exceeds its size limit.
+
+    An HTTPException so that it surfaces as 413 wherever it is raised: FastAPI
+    re-raises HTTPExceptions from body parsing instead of turning them into 400s.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.message = f"Upload exceeds the maximum size of {limit} bytes"
+        super().__init__(status_code=413, detail={
+            "status": "error",
+            "message": self.message,
+            "error_type": type(self).__name__,
+        })
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that caps request body size per path prefix.
+
+    Requests declaring a larger Content-Length are answered with 413 before a
+    single body byte is read. Chunked or lying requests are counted as the body
+    streams in and cut off as soon as they cross the limit, so the multipart
+    parser never spools more than the limit to disk.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # Longest prefix wins, e.g. /analyze/bulk before /analyze/
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> Tuple[Optional[str], Optional[int]]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+        prefix, limit = self._limit_for(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            self._record(prefix, int(declared), limit)
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLargeError(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLargeError:
+            # Only reaches here for apps without exception handling; FastAPI renders it itself
+            if response_started:
+                raise
+            await self._reject(send, limit)
+        finally:
+            if received > limit:
+                self._record(prefix, received, limit)
+
+    @staticmethod
+    def _record(prefix: str, size: int, limit: int) -> None:
+        # Labelled by the configured prefix, not the request path, to keep metric cardinality fixed
+        _rejected.inc(path=prefix)
+        logger.warning(f"Rejected upload to {prefix}: {size} bytes exceeds the limit of {limit}")
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({"detail": UploadTooLargeError(limit).detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def upload_size(fileobj: BinaryIO) -> int:
+    """Size of a spooled upload, found by seeking rather than reading it."""
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    return size
+
+
+@contextmanager
+def upload_buffer(fileobj: BinaryIO, max_size: int) -> Iterator[Union[memoryview, bytes]]:
+    """
+    Expose a spooled upload as a buffer without copying it.
+
+    Small uploads that Starlette kept in memory are shared through
+    ``BytesIO.getbuffer()``; uploads that rolled over to a temp file are
+    memory-mapped. Either way the decoder reads the bytes in place.
+
+    Args:
+        fileobj: The ``UploadFile.file`` object
+        max_size: Maximum accepted size in bytes
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than ``max_size``
+    """
+    size = upload_size(fileobj)
+    if size > max_size:
+        raise UploadTooLargeError(max_size)
+    if size == 0:
+        yield b""
+        return
+
+    # SpooledTemporaryFile wraps either a BytesIO or a real file
+    inner = getattr(fileobj, "_file", fileobj)
+    mapped = None
+    if hasattr(inner, "getbuffer"):
+        view = inner.getbuffer()
+    else:
+        try:
+            mapped = mmap.mmap(inner.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+        except (AttributeError, OSError, ValueError):
+            # Not backed by a mappable file descriptor: fall back to a single read
+            view = memoryview(fileobj.read())
+    try:
+        yield view
+    finally:
+        # Arrays that still reference the buffer (e.g. an undecoded raw frame)
+        # keep it alive; it is then freed with them instead of here
+        try:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+        except BufferError:
+            pass
+
+
+def save_upload(fileobj: BinaryIO, path: str, max_size: int, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Copy an upload to ``path`` in fixed-size chunks, enforcing ``max_size``.
+
+    A partial file is removed if the limit is exceeded.
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than ``max_size``
+    """
+    # Python 3.10's SpooledTemporaryFile has no readinto(); the wrapped file does
+    inner = getattr(fileobj, "_file", fileobj)
+    buffer = bytearray(chunk_size)
+    written = 0
+    inner.seek(0)
+    try:
+        with open(path, "wb") as out:
+            while True:
+                n = inner.readinto(buffer)
+                if not n:
+                    break
+                written += n
+                if written > max_size:
+                    raise UploadTooLargeError(max_size)
+                out.write(memoryview(buffer)[:n])
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return written
@@ -0,0 +1,328 @@
+"""
+On-disk store of expression embeddings with an IVF nearest-neighbour index.
+
+Layout of a store directory:
+
+    store.json   dimension and the number of committed vectors
+    vectors.f16  append-only float16 matrix, one L2-normalised row per face
+    items.jsonl  one JSON metadata object per row (path, session, bbox, ...)
+    items.idx    uint64 byte offset of each row's line in items.jsonl
+    ivf.npz      index: centroids and the row ids of each inverted list
+    ivf.f16      the indexed vectors copied in inverted-list order
+
+Rows are written before ``store.json`` is updated, so a crash mid-append leaves
+at most an uncommitted tail that is truncated on the next open. Searching
+scores the query against the centroids, then scans only the ``nprobe`` closest
+lists -- contiguous slices of ``ivf.f16`` -- plus any rows added since the
+index was built, instead of every vector in the store.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPE = np.float16
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """The k highest scores, best first, as (id, score) pairs."""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    seed: int = 0,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    Spherical k-means: centroids of unit vectors under cosine similarity.
+
+    Returns:
+        float32 array of shape (nlist, dim) with L2-normalised rows
+    """
+    rng = np.random.default_rng(seed)
+    vectors = _normalize(vectors)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        counts = np.zeros(nlist, dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignment = np.argmax(chunk @ centroids.T, axis=1)
+            np.add.at(sums, assignment, chunk)
+            counts += np.bincount(assignment, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed lists that lost all their members with random vectors
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class VectorStore:
+    """
+    Append-only embedding store with an inverted-file (IVF) index.
+
+    Not safe for concurrent writers in different processes; within a process
+    ``add`` and ``build_index`` are serialised by a lock.
+
+    Args:
+        path: Store directory, created if missing
+        dim: Vector dimension; required when creating a store, checked when opening one
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        header = self._file("store.json")
+        if os.path.exists(header):
+            with open(header) as f:
+                meta = json.load(f)
+            if dim is not None and dim != meta["dim"]:
+                raise ValueError(f"Store {self.path} holds {meta['dim']}-d vectors, not {dim}-d")
+            self.dim, self.count = meta["dim"], meta["count"]
+        elif dim is None:
+            raise ValueError(f"No vector store at {self.path}; pass dim to create one")
+        else:
+            self.dim, self.count = dim, 0
+            self._commit()
+        self._truncate_uncommitted()
+        self._vectors: Optional[np.memmap] = None
+        self._index: Optional[Dict[str, np.ndarray]] = None
+        self._index_vectors: Optional[np.memmap] = None
+        self._load_index()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _commit(self) -> None:
+        tmp = self._file("store.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "dtype": np.dtype(VECTOR_DTYPE).name}, f)
+        os.replace(tmp, self._file("store.json"))
+
+    def _truncate_uncommitted(self) -> None:
+        """Drop rows an interrupted ``add`` wrote past the committed count."""
+        offsets = self._offsets()
+        items_size = int(offsets[self.count]) if len(offsets) > self.count else None
+        del offsets  # unmap before truncating the file behind it
+        for name, size in (
+            ("vectors.f16", self.count * self.dim * np.dtype(VECTOR_DTYPE).itemsize),
+            ("items.idx", self.count * 8),
+            ("items.jsonl", items_size),
+        ):
+            path = self._file(name)
+            if size is not None and os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning(f"Truncating uncommitted rows from {path}")
+                os.truncate(path, size)
+
+    def _offsets(self) -> np.ndarray:
+        path = self._file("items.idx")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        return np.memmap(path, dtype=np.uint64, mode="r")
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All committed vectors as a read-only memory map."""
+        if self.count == 0:
+            return np.zeros((0, self.dim), dtype=VECTOR_DTYPE)
+        if self._vectors is None or len(self._vectors) != self.count:
+            self._vectors = np.memmap(self._file("vectors.f16"), dtype=VECTOR_DTYPE, mode="r", shape=(self.count, self.dim))
+        return self._vectors
+
+    def add(self, vectors: np.ndarray, items: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """
+        Append vectors (normalised on the way in) with one metadata dict each.
+
+        Returns:
+            The ids assigned to the new rows
+        """
+        vectors = _normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+        items = items if items is not None else [{} for _ in range(len(vectors))]
+        if len(items) != len(vectors):
+            raise ValueError(f"{len(vectors)} vectors but {len(items)} items")
+
+        with self._lock:
+            with open(self._file("items.jsonl"), "ab") as f:
+                position = f.tell()
+                offsets = []
+                for item in items:
+                    line = (json.dumps(item, default=str) + "\n").encode()
+                    offsets.append(position)
+                    f.write(line)
+                    position += len(line)
+            with open(self._file("items.idx"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+            with open(self._file("vectors.f16"), "ab") as f:
+                f.write(vectors.astype(VECTOR_DTYPE).tobytes())
+            ids = np.arange(self.count, self.count + len(vectors))
+            self.count += len(vectors)
+            self._commit()
+        return ids
+
+    def item(self, vector_id: int) -> Dict[str, Any]:
+        """Metadata stored with a vector."""
+        if not 0 <= vector_id < self.count:
+            raise IndexError(f"No vector {vector_id} in a store of {self.count}")
+        with open(self._file("items.jsonl"), "rb") as f:
+            f.seek(int(self._offsets()[vector_id]))
+            return json.loads(f.readline())
+
+    # Index
+
+    @property
+    def indexed_count(self) -> int:
+        return int(self._index["indexed_count"]) if self._index is not None else 0
+
+    def _load_index(self) -> None:
+        path = self._file("ivf.npz")
+        if not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            index = {name: data[name] for name in data.files}
+        if int(index["dim"]) != self.dim or int(index["indexed_count"]) > self.count:
+            logger.warning(f"Ignoring stale index in {self.path}; rebuild it")
+            return
+        self._index = index
+        self._index_vectors = (
+            np.memmap(self._file("ivf.f16"), dtype=VECTOR_DTYPE, mode="r", shape=(self.indexed_count, self.dim))
+            if self.indexed_count else None
+        )
+
+    def build_index(
+        self,
+        nlist: Optional[int] = None,
+        train_size: int = 100_000,
+        iterations: int = 10,
+        seed: int = 0,
+        chunk_size: int = 65536,
+    ) -> Dict[str, Any]:
+        """
+        Train IVF centroids on a sample of the store and assign every vector to a list.
+
+        Args:
+            nlist: Number of inverted lists (default: about 4 * sqrt(count))
+            train_size: Vectors sampled for k-means training
+            iterations: k-means iterations
+            seed: Seed for sampling and initialisation
+            chunk_size: Vectors assigned per matrix multiply, bounding memory
+
+        Returns:
+            Summary of the built index
+        """
+        with self._lock:
+            count = self.count
+            if count == 0:
+                raise ValueError("Cannot index an empty store")
+            nlist = min(count, nlist or max(1, int(4 * np.sqrt(count))))
+            vectors = self.vectors
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(count, size=min(count, max(train_size, nlist)), replace=False))
+            centroids = kmeans(vectors[sample], nlist, iterations, seed, chunk_size)
+
+            assignment = np.empty(count, dtype=np.int32)
+            for start in range(0, count, chunk_size):
+                chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+                assignment[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+            list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+            list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+
+            # Copy vectors in list order so each list is one contiguous read at query time
+            tmp = self._file("ivf.f16.tmp")
+            with open(tmp, "wb") as f:
+                for start in range(0, count, chunk_size):
+                    f.write(np.asarray(vectors[list_ids[start:start + chunk_size]], dtype=VECTOR_DTYPE).tobytes())
+            os.replace(tmp, self._file("ivf.f16"))
+            with open(self._file("ivf.npz.tmp"), "wb") as f:
+                np.savez(f, centroids=centroids, list_ids=list_ids, list_offsets=list_offsets,
+                         indexed_count=np.int64(count), dim=np.int64(self.dim))
+            os.replace(self._file("ivf.npz.tmp"), self._file("ivf.npz"))
+            self._load_index()
+
+        sizes = np.diff(list_offsets)
+        logger.info(f"Built IVF index over {count} vectors in {self.path}: {nlist} lists")
+        return {"vectors": count, "nlist": nlist, "largest_list": int(sizes.max()), "empty_lists": int((sizes == 0).sum())}
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int = 8) -> List[List[Tuple[int, float]]]:
+        """
+        Nearest neighbours by cosine similarity.
+
+        Without an index every vector is scanned. With one, only the ``nprobe``
+        lists whose centroids are closest to each query are, plus rows added
+        since the index was built; ``nprobe >= nlist`` is an exact search.
+
+        Args:
+            queries: One vector or a (n, dim) matrix of them
+            k: Neighbours per query
+            nprobe: Inverted lists scanned per query
+
+        Returns:
+            Per query, up to k (id, similarity) pairs, most similar first
+        """
+        queries = _normalize(queries)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d queries, got {queries.shape[1]}-d")
+        count = self.count
+        if count == 0:
+            return [[] for _ in queries]
+
+        indexed = self.indexed_count
+        tail = np.asarray(self.vectors[indexed:count], dtype=np.float32)
+        tail_ids = np.arange(indexed, count)
+        if self._index is None:
+            return [_top_k(tail @ query, tail_ids, k) for query in queries]
+
+        centroids = self._index["centroids"]
+        list_ids, list_offsets = self._index["list_ids"], self._index["list_offsets"]
+        nprobe = min(nprobe, len(centroids))
+        results = []
+        for query in queries:
+            closest = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+            spans = [(list_offsets[c], list_offsets[c + 1]) for c in np.sort(closest)]
+            candidates = np.concatenate(
+                [np.asarray(self._index_vectors[lo:hi], dtype=np.float32) for lo, hi in spans] + [tail]
+            )
+            ids = np.concatenate([list_ids[lo:hi] for lo, hi in spans] + [tail_ids])
+            results.append(_top_k(candidates @ query, ids, k))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = np.diff(self._index["list_offsets"]) if self._index is not None else np.zeros(0)
+        return {
+            "path": self.path,
+            "dim": self.dim,
+            "vectors": self.count,
+            "indexed": self.indexed_count,
+            "unindexed": self.count - self.indexed_count,
+            "nlist": len(sizes),
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+            "bytes": sum(
+                os.path.getsize(self._file(name))
+                for name in ("vectors.f16", "items.jsonl", "items.idx", "ivf.npz", "ivf.f16")
+                if os.path.exists(self._file(name))
+            ),
+        }
@@ -0,0 +1,79 @@
+"""
+Compare bulk archive analysis with posting the same images one by one.
+
+Builds a zip of N images (cycling through the repo's sample faces), then times
+N sequential requests to /api/v1/analyze/ against a single request to
+/api/v1/analyze/bulk, both through an in-process test client.
+
+Usage (from the backend directory):
+    python -m benchmarks.bulk --model-path models/torchscript_model_0_66_37_wo_gl.pth --count 1000
+"""
+import argparse
+import glob
+import io
+import itertools
+import json
+import os
+import time
+import zipfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import analyze
+from app.core.config import settings
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(analyze.router, prefix="/api/v1/analyze")
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=settings.MODEL_PATH, help="TorchScript model to use")
+    parser.add_argument("--count", type=int, default=1000, help="Number of images")
+    parser.add_argument("--images", default="debug_faces", help="Directory with sample images")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, "*.jpg")))
+    if not paths:
+        raise SystemExit(f"No sample images in {args.images}")
+    images = [(f"{i:05d}_{os.path.basename(p)}", open(p, "rb").read())
+              for i, p in zip(range(args.count), itertools.cycle(paths))]
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in images:
+            zf.writestr(name, data)
+
+    # Identical bytes would be answered by the result cache; measure the real work
+    settings.RESULT_CACHE_ENABLED = False
+    client = TestClient(build_app())
+    params = {"model_path": args.model_path}
+    client.post("/api/v1/analyze/", params=params, files={"file": images[0]})  # load model, warm up
+
+    start = time.perf_counter()
+    for name, data in images:
+        response = client.post("/api/v1/analyze/", params=params, files={"file": (name, data, "image/jpeg")})
+        response.raise_for_status()
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = 0
+    with client.stream("POST", "/api/v1/analyze/bulk", params=params,
+                       files={"files": ("images.zip", archive.getvalue(), "application/zip")}) as response:
+        for line in response.iter_lines():
+            if line and "summary" not in json.loads(line):
+                results += 1
+    bulk = time.perf_counter() - start
+
+    print(f"{len(images)} images")
+    print(f"one by one: {single:8.2f}s  ({len(images) / single:7.1f} img/s)")
+    print(f"bulk:       {bulk:8.2f}s  ({results / bulk:7.1f} img/s, {results} results)")
+    print(f"speedup:    {single / bulk:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark frame ingestion: full-resolution decode vs reduced-size decode vs raw frames.
+
+"baseline" reproduces the old path (full imdecode, BGR->RGB on the full image,
+then resize to the working size); "reduced" is ``decode_image`` with libjpeg's
+DCT scaling; the raw rows time ``decode_raw_frame`` for RGB and I420 payloads.
+
+Usage (from the backend directory):
+    python -m benchmarks.decode --repeat 50
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.frame_decoder import (
+    PIXEL_FORMAT_I420,
+    PIXEL_FORMAT_RGB24,
+    decode_image,
+    decode_raw_frame,
+    encode_raw_frame,
+)
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4K": (3840, 2160)}
+
+
+def synthetic_frame(width: int, height: int) -> np.ndarray:
+    """Smooth gradients plus noise: compresses roughly like a real webcam frame."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x * 255 + 0 * y, y * 255 + 0 * x, (x * y) * 255], axis=2)
+    noise = rng.normal(0, 12, (height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def baseline_decode(data: bytes, max_dim: int) -> np.ndarray:
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    h, w = img.shape[:2]
+    scale = max_dim / max(h, w)
+    return cv2.resize(img, (int(w * scale), int(h * scale)))
+
+
+def timeit(fn: Callable[[], object], repeat: int) -> List[float]:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per case")
+    parser.add_argument("--max-dim", type=int, default=settings.MAX_IMAGE_DIM, help="Working resolution (long side)")
+    args = parser.parse_args()
+
+    print(f"Decode time per frame to a {args.max_dim}px working size ({args.repeat} runs)")
+    print(f"{'input':<8}{'path':<14}{'payload KB':>12}{'p50 ms':>9}{'p95 ms':>9}")
+    for label, (width, height) in RESOLUTIONS.items():
+        rgb = synthetic_frame(width, height)
+        jpeg = cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        i420 = cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV_I420)
+        cases = [
+            ("baseline", jpeg, lambda: baseline_decode(jpeg, args.max_dim)),
+            ("reduced", jpeg, lambda: decode_image(jpeg, args.max_dim)),
+        ]
+        raw_rgb = encode_raw_frame(rgb, PIXEL_FORMAT_RGB24)
+        raw_i420 = encode_raw_frame(i420, PIXEL_FORMAT_I420)
+        cases.append(("raw rgb24", raw_rgb, lambda: decode_raw_frame(raw_rgb, args.max_dim)))
+        cases.append(("raw i420", raw_i420, lambda: decode_raw_frame(raw_i420, args.max_dim)))
+
+        for name, payload, fn in cases:
+            times = sorted(timeit(fn, args.repeat))
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"{label:<8}{name:<14}{len(payload) / 1024:>12.0f}{statistics.median(times):>9.2f}{p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark the face detector backends.
+
+Reports per-backend latency and agreement with a reference backend
+(the refined FaceMesh the service used before backends were pluggable)
+on synthetic frames and on the sample images shipped in the repo.
+
+Usage (from the backend directory):
+    python -m benchmarks.face_backends
+    python -m benchmarks.face_backends --images path/to/dir --repeat 5
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.face_backends import BACKENDS, DetectedFace, available_backends
+
+SAMPLE_DIRS = ["debug_faces", "static", "uploads"]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def synthetic_frames() -> List[Tuple[str, np.ndarray]]:
+    """Frames without real faces (noise, gradients, a drawn face) at common sizes."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for w, h in [(320, 240), (640, 480), (1280, 720)]:
+        frames.append((f"noise_{w}x{h}", rng.integers(0, 256, (h, w, 3), dtype=np.uint8)))
+        gradient = np.tile(np.linspace(0, 255, w, dtype=np.uint8), (h, 1))
+        frames.append((f"gradient_{w}x{h}", np.dstack([gradient] * 3)))
+
+        cartoon = np.full((h, w, 3), 200, dtype=np.uint8)
+        cx, cy, r = w // 2, h // 2, min(w, h) // 4
+        cv2.circle(cartoon, (cx, cy), r, (224, 172, 105), -1)
+        cv2.circle(cartoon, (cx - r // 3, cy - r // 4), r // 8, (40, 40, 40), -1)
+        cv2.circle(cartoon, (cx + r // 3, cy - r // 4), r // 8, (40, 40, 40), -1)
+        cv2.ellipse(cartoon, (cx, cy + r // 3), (r // 3, r // 8), 0, 0, 180, (120, 30, 30), 3)
+        frames.append((f"cartoon_{w}x{h}", cartoon))
+    return frames
+
+
+def sample_frames(dirs: List[str], limit: int) -> List[Tuple[str, np.ndarray]]:
+    paths = []
+    for d in dirs:
+        for ext in IMAGE_EXTENSIONS:
+            paths.extend(sorted(glob.glob(os.path.join(d, f"*{ext}"))))
+    frames = []
+    for path in paths[:limit]:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append((os.path.basename(path), cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+    return frames
+
+
+def iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run_backend(name: str, frames: List[Tuple[str, np.ndarray]], repeat: int) -> Tuple[List[float], List[Optional[DetectedFace]]]:
+    # Static-image mode: each frame is independent, so tracking state must not leak between them,
+    # and repeats of one frame must time full detection rather than tracking
+    backend = BACKENDS[name](max_faces=1, static_image=True)
+    latencies = []
+    results = []
+    try:
+        backend.detect(frames[0][1])  # warm-up
+        for _, frame in frames:
+            faces = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                faces = backend.detect(frame)
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append(faces[0] if faces else None)
+    finally:
+        backend.close()
+    return latencies, results
+
+
+def report(title: str, frames: List[Tuple[str, np.ndarray]], backends: List[str], reference: str, repeat: int) -> None:
+    if not frames:
+        print(f"\n{title}: no images found")
+        return
+
+    print(f"\n{title} ({len(frames)} images, {repeat} runs each, reference: {reference})")
+    print(f"{'backend':<28}{'p50 ms':>9}{'p95 ms':>9}{'found':>8}{'agree':>8}{'mean IoU':>10}")
+
+    outputs: Dict[str, Tuple[List[float], List[Optional[DetectedFace]]]] = {
+        name: run_backend(name, frames, repeat) for name in backends
+    }
+    ref_results = outputs[reference][1] if reference in outputs else None
+
+    for name in backends:
+        latencies, results = outputs[name]
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        found = sum(r is not None for r in results)
+
+        agree, ious = "-", []
+        if ref_results is not None:
+            same = sum((r is None) == (ref is None) for r, ref in zip(results, ref_results))
+            agree = f"{same / len(results):.0%}"
+            ious = [iou(r.bbox, ref.bbox) for r, ref in zip(results, ref_results) if r and ref]
+        mean_iou = f"{statistics.mean(ious):.2f}" if ious else "-"
+        print(f"{name:<28}{p50:>9.2f}{p95:>9.2f}{found:>8}{agree:>8}{mean_iou:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="*", default=SAMPLE_DIRS, help="Directories with sample images")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of sample images")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per image")
+    parser.add_argument("--reference", default="mediapipe_facemesh_refined", help="Backend to measure agreement against")
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"Available backends: {', '.join(backends) or 'none'}")
+    if not backends:
+        return
+    reference = args.reference if args.reference in backends else backends[-1]
+
+    report("Synthetic frames", synthetic_frames(), backends, reference, args.repeat)
+    report("Sample images", sample_frames(args.images, args.limit), backends, reference, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark the per-frame cost of logging on the inference postprocessing path.
+
+Runs EmotionDetector._face_results (softmax, smoothing, overrides, response
+building and its log calls) on random logits under four setups:
+
+    off        logging disabled, the floor
+    sync       every event at INFO through a plain StreamHandler, like the old code
+    queue      queue handler + per-event sampling (the service default)
+    queue-json the same with JSON records
+
+"per frame" is the time on the calling thread; "with drain" includes waiting
+for the listener thread to write everything that was queued.
+
+Usage (from the backend directory):
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --frames 20000 --sink /tmp/bench.log
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import torch
+
+from app.core import logs
+from app.core.config import settings
+from app.services.emotion_detector import EmotionDetector, FaceCrop
+from app.services.face_backends import DetectedFace, FaceRequirements
+from app.services.postprocessing import Postprocessor, RunnerUpRule, StreamSmoother
+
+
+def postprocessing_detector() -> EmotionDetector:
+    """An EmotionDetector with just the state _face_results needs, no model or face backends."""
+    detector = EmotionDetector.__new__(EmotionDetector)
+    detector.postprocessor = Postprocessor(
+        [EmotionDetector.EMOTIONS[idx] for idx in sorted(EmotionDetector.EMOTIONS)],
+        fallbacks={"anger": "neutral"},
+        runner_up=[RunnerUpRule("anger", 0.7, 0.8)],
+    )
+    detector.smoother = StreamSmoother(len(EmotionDetector.EMOTIONS))
+    return detector
+
+
+def run(detector: EmotionDetector, frames: int) -> float:
+    rng = np.random.default_rng(0)
+    outputs = [torch.from_numpy(rng.normal(size=(1, 7)).astype(np.float32) * 3) for _ in range(256)]
+    crop = FaceCrop(
+        face=DetectedFace(bbox=(100, 100, 300, 300), score=0.9),
+        bbox={"top": 100, "right": 300, "bottom": 300, "left": 100, "width": 200, "height": 200},
+        image=np.zeros((1, 1, 3), dtype=np.uint8),
+        backend="bench",
+    )
+    requirements = FaceRequirements()
+    start = time.perf_counter()
+    for i in range(frames):
+        detector._face_results([crop], outputs[i % len(outputs)], requirements, stream="bench")
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--sink", default=os.devnull, help="Where log output goes (default: discard)")
+    args = parser.parse_args()
+
+    detector = postprocessing_detector()
+    default_rates = logs.parse_sample_rates(settings.LOG_SAMPLE_RATES)
+    root = logging.getLogger()
+    sink = open(args.sink, "a")
+
+    def off() -> None:
+        root.setLevel(logging.CRITICAL)
+
+    def sync() -> None:
+        logs.sampled.rates = {}
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(settings.LOG_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+
+    def queued(json_format: bool) -> Callable[[], None]:
+        def setup() -> None:
+            logs.sampled.rates = default_rates
+            logs.setup_logging(level="INFO", json_format=json_format, stream=sink)
+        return setup
+
+    setups: Dict[str, Callable[[], None]] = {
+        "off": off,
+        "sync": sync,
+        "queue": queued(False),
+        "queue-json": queued(True),
+    }
+
+    print(f"Postprocessing + logging per frame ({args.frames} frames, sink={args.sink})")
+    print(f"{'setup':<12} {'per frame':>12} {'with drain':>12}")
+    for name, setup in setups.items():
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        setup()
+        elapsed = run(detector, args.frames)
+        drain_start = time.perf_counter()
+        logs.shutdown_logging()
+        drained = elapsed + time.perf_counter() - drain_start
+        print(f"{name:<12} {elapsed / args.frames * 1e6:>10.1f}us {drained / args.frames * 1e6:>10.1f}us")
+    sink.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Replay recorded WebSocket sessions and compare with what was recorded.
+
+Sessions come from a server running with SESSION_RECORD_DIR set, or from a
+video or image directory via ``from-video`` (no camera needed). ``run`` sends
+every frame of every session through /ws/emotion -- against the app
+in-process, or a running server over a socket -- at the recorded pace, a
+multiple of it, or as fast as replies come back, with any number of parallel
+streams. It reports latency and throughput next to the latencies in the
+recording, and how often each reply agrees with the recorded one.
+
+Replies depend on the server's settings (quality gate, frame reuse, live
+quota and deadline) and, with several streams, on the load itself: frames can
+be dropped, and a dropped frame never enters its session's smoothing history.
+Each session is smoothed on its own, so parallel streams do not blend their
+predictions, but compare runs with one stream for correctness; use many
+streams for performance. To let
+max-speed in-process runs through the per-session quota, start with
+SCHEDULER_LIVE_FPS=0.
+
+Usage (from the backend directory):
+    python -m benchmarks.replay from-video clip.mp4 --fps 15 -o clip.session
+    python -m benchmarks.replay run clip.session --model-path models/torchscript_model_0_66_37_wo_gl.pth --save-baseline baselines/
+    python -m benchmarks.replay run baselines/ --speed 0 --streams 8 --report replay.json
+    python -m benchmarks.replay run recordings/ --url ws://127.0.0.1:8000/ws/emotion --speed 2
+    python -m benchmarks.replay info recordings/
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.session_recording import SUFFIX, Session, SessionWriter, read_session
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Error replies of the WebSocket handler, by message prefix
+ERROR_OUTCOMES = [
+    ("No face detected", "no_face"),
+    ("Low quality frame", "low_quality"),
+    ("Frame dropped", "dropped"),
+    ("Failed to decode frame", "decode_error"),
+    ("Model is still loading", "loading"),
+]
+
+
+@dataclass
+class FrameResult:
+    session: str
+    index: int
+    latency: float
+    reply: Dict[str, Any]
+    recorded: Optional[Dict[str, Any]]
+    recorded_latency: Optional[float]
+
+
+def outcome(reply: Optional[Dict[str, Any]]) -> str:
+    """What a reply says about its frame: an emotion, or a kind of non-result."""
+    if reply is None:
+        return "missing"
+    if "emotion" in reply:
+        return str(reply["emotion"]).lower()
+    error = str(reply.get("error", ""))
+    for prefix, name in ERROR_OUTCOMES:
+        if error.startswith(prefix):
+            return name
+    return "error"
+
+
+def load_sessions(paths: List[str]) -> List[Tuple[str, Session]]:
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, f"*{SUFFIX}"))) if os.path.isdir(path) else [path])
+    return [(os.path.basename(f), read_session(f)) for f in files]
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+    }
+
+
+class InProcessConnection:
+    def __init__(self, client):
+        self._context = client.websocket_connect("/ws/emotion")
+        self._ws = self._context.__enter__()
+
+    def exchange(self, data: bytes) -> Dict[str, Any]:
+        self._ws.send_bytes(data)
+        return self._ws.receive_json()
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class SocketConnection:
+    def __init__(self, url: str):
+        from websockets.sync.client import connect
+        self._ws = connect(url, max_size=None)
+
+    def exchange(self, data: bytes) -> Dict[str, Any]:
+        self._ws.send(data)
+        return json.loads(self._ws.recv())
+
+    def close(self) -> None:
+        self._ws.close()
+
+
+def replay_session(
+    connect: Callable[[], Any],
+    name: str,
+    session: Session,
+    speed: float,
+    limit: Optional[int] = None,
+) -> List[FrameResult]:
+    """
+    Send one session's frames over a fresh connection, one at a time.
+
+    With ``speed`` > 0 each frame is sent at its recorded offset divided by
+    ``speed`` (or as soon as the previous reply arrives, if the server is
+    behind); with 0 frames are sent back to back.
+    """
+    results = []
+    connection = connect()
+    try:
+        start = time.perf_counter()
+        for index, frame in enumerate(session.frames[:limit]):
+            if speed > 0:
+                delay = start + frame.t / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            reply = connection.exchange(frame.data)
+            results.append(FrameResult(name, index, time.perf_counter() - sent, reply, frame.reply, frame.latency))
+    finally:
+        connection.close()
+    return results
+
+
+def summarize(results: List[FrameResult], elapsed: float, examples: int = 10) -> Dict[str, Any]:
+    compared = [r for r in results if r.recorded is not None]
+    agree = [r for r in compared if outcome(r.reply) == outcome(r.recorded)]
+    confidence_deltas = [
+        abs(float(r.reply["confidence"]) - float(r.recorded["confidence"]))
+        for r in agree
+        if "confidence" in r.reply and "confidence" in r.recorded
+    ]
+    changes = Counter(
+        f"{outcome(r.recorded)} -> {outcome(r.reply)}" for r in compared if outcome(r.reply) != outcome(r.recorded)
+    )
+    return {
+        "frames": len(results),
+        "elapsed_seconds": round(elapsed, 3),
+        "frames_per_second": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": percentiles([r.latency for r in results]),
+        "recorded_latency": percentiles([r.recorded_latency for r in results if r.recorded_latency is not None]),
+        "outcomes": dict(Counter(outcome(r.reply) for r in results).most_common()),
+        "reused": sum(bool(r.reply.get("reused")) for r in results),
+        "skipped": sum(bool(r.reply.get("skipped")) for r in results),
+        "compared": len(compared),
+        "agreement": round(len(agree) / len(compared), 4) if compared else None,
+        "confidence_delta": {
+            "mean": round(float(np.mean(confidence_deltas)), 4),
+            "max": round(float(np.max(confidence_deltas)), 4),
+        } if confidence_deltas else None,
+        "changes": dict(changes.most_common(examples)),
+        "examples": [
+            {"session": r.session, "frame": r.index, "recorded": r.recorded, "replayed": r.reply}
+            for r in compared if outcome(r.reply) != outcome(r.recorded)
+        ][:examples],
+    }
+
+
+def save_baseline(directory: str, name: str, session: Session, results: List[FrameResult]) -> None:
+    """Write a session with the same frames and timing, and the replies just received."""
+    os.makedirs(directory, exist_ok=True)
+    writer = SessionWriter(os.path.join(directory, name), {**session.metadata, "baseline_of": name}, max_bytes=2 ** 62)
+    try:
+        for frame, result in zip(session.frames, results):
+            writer.frame(frame.data, t=frame.t)
+            writer.reply(result.reply, t=frame.t + result.latency)
+    finally:
+        writer.close()
+
+
+def run(args: argparse.Namespace) -> int:
+    sessions = load_sessions(args.sessions)
+    # In-process runs change the working directory
+    report_path = args.report and os.path.abspath(args.report)
+    baseline_dir = args.save_baseline and os.path.abspath(args.save_baseline)
+    if not sessions:
+        print("No session files found")
+        return 1
+    total_frames = sum(len(s.frames[:args.limit]) for _, s in sessions)
+    print(f"{len(sessions)} sessions, {total_frames} frames, {args.streams} streams, speed {args.speed or 'max'}")
+
+    with server_connection(args) as connect:
+        results: List[List[FrameResult]] = [[] for _ in range(args.streams)]
+        failures: List[str] = []
+
+        def stream(i: int) -> None:
+            # Streams start at different sessions so they do not all replay the same one at once
+            for offset in range(len(sessions)):
+                name, session = sessions[(i + offset) % len(sessions)]
+                try:
+                    replayed = replay_session(connect, name, session, args.speed, args.limit)
+                except Exception as e:
+                    failures.append(f"stream {i}, {name}: {type(e).__name__}: {e}")
+                    continue
+                results[i].extend(replayed)
+                if i == 0 and baseline_dir:
+                    save_baseline(baseline_dir, name, session, replayed)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=stream, args=(i,), daemon=True) for i in range(args.streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    report = summarize([r for stream_results in results for r in stream_results], elapsed)
+    report["connection_failures"] = failures
+    print_report(report)
+
+    verdict = []
+    if failures:
+        verdict.append(f"{len(failures)} session replays failed, e.g. {failures[0]}")
+    if report["agreement"] is not None and report["agreement"] < args.min_agreement:
+        verdict.append(f"agreement {report['agreement']:.2%} below {args.min_agreement:.2%}")
+    if args.max_latency_ratio and report["latency"] and report["recorded_latency"]:
+        ratio = report["latency"]["p95_ms"] / max(report["recorded_latency"]["p95_ms"], 1e-3)
+        if ratio > args.max_latency_ratio:
+            verdict.append(f"p95 latency {ratio:.2f}x the recording (limit {args.max_latency_ratio}x)")
+    print()
+    print("FAIL\n" + "\n".join(f"  - {v}" for v in verdict) if verdict else "PASS")
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump({"passed": not verdict, "failures": verdict, **report}, f, indent=2)
+    return 1 if verdict else 0
+
+
+@contextmanager
+def server_connection(args: argparse.Namespace) -> Iterator[Callable[[], Any]]:
+    """Yield a factory of connections to the chosen target."""
+    if args.url:
+        yield lambda: SocketConnection(args.url)
+        return
+    model_path = args.model_path and os.path.abspath(args.model_path)
+    # The app writes uploads/, data/ and debug_faces/ relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="replay-"))
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+
+    settings.MODEL_PATH = model_path or os.path.abspath(os.path.join(BACKEND_DIR, settings.MODEL_PATH))
+    settings.LOG_LEVEL = args.log_level
+    from app import main as app_main
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with TestClient(app_main.app) as client:
+        if not app_main.model_manager.wait(timeout=300):
+            raise SystemExit(f"Model failed to load: {app_main.model_manager.error}")
+        yield lambda: InProcessConnection(client)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['frames']} frames in {report['elapsed_seconds']}s ({report['frames_per_second']} frames/s)")
+    for label, key in (("replayed", "latency"), ("recorded", "recorded_latency")):
+        lat = report[key]
+        if lat:
+            print(f"  {label:>9} latency: p50 {lat['p50_ms']}ms  p95 {lat['p95_ms']}ms  p99 {lat['p99_ms']}ms  max {lat['max_ms']}ms")
+    print(f"  outcomes: {report['outcomes']} (reused {report['reused']}, skipped {report['skipped']})")
+    if report["agreement"] is not None:
+        print(f"  agreement with recording: {report['agreement']:.2%} of {report['compared']} frames")
+        if report["confidence_delta"]:
+            print(f"  confidence delta on agreeing frames: mean {report['confidence_delta']['mean']}, max {report['confidence_delta']['max']}")
+        for change, count in report["changes"].items():
+            print(f"    {change}: {count}")
+
+
+def from_video(args: argparse.Namespace) -> int:
+    """Turn a video or image directory into a session paced at ``fps``, without replies."""
+    import cv2
+    from app.cli.compare_backbones import iter_frames
+
+    writer = SessionWriter(args.output, {"source": os.path.abspath(args.input), "fps": args.fps}, max_bytes=2 ** 62)
+    try:
+        for index, frame in enumerate(iter_frames(args.input, args.video_stride, args.max_dim)):
+            if args.limit and index >= args.limit:
+                break
+            ok, jpeg = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+            if ok:
+                writer.frame(jpeg.tobytes(), t=index / args.fps)
+    finally:
+        writer.close()
+    print(f"Wrote {writer.frames} frames to {args.output}")
+    return 0
+
+
+def info(args: argparse.Namespace) -> int:
+    for name, session in load_sessions(args.sessions):
+        replies = [f.reply for f in session.frames if f.reply is not None]
+        size = sum(len(f.data) for f in session.frames)
+        print(f"{name}: {len(session.frames)} frames over {session.duration:.1f}s, {size / 2 ** 20:.1f}MB of frames")
+        print(f"  metadata: {session.metadata}")
+        if session.summary.get("truncated"):
+            print("  truncated at SESSION_RECORD_MAX_BYTES")
+        latency = percentiles([f.latency for f in session.frames if f.latency is not None])
+        if latency:
+            print(f"  recorded latency: p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms")
+        print(f"  {len(replies)} replies: {dict(Counter(outcome(r) for r in replies).most_common())}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser("run", help="Replay sessions and compare with the recording")
+    replay.add_argument("sessions", nargs="+", help="Session files or directories of them")
+    replay.add_argument("--url", help="ws:// URL of a running server (default: the app in-process)")
+    replay.add_argument("--model-path", help="In-process only: model to serve (default: settings.MODEL_PATH)")
+    replay.add_argument("--speed", type=float, default=1.0, help="Multiple of the recorded pace; 0 = as fast as replies arrive")
+    replay.add_argument("--streams", type=int, default=1, help="Parallel connections, each replaying every session")
+    replay.add_argument("--limit", type=int, help="Frames per session")
+    replay.add_argument("--min-agreement", type=float, default=0.95, help="Fail below this share of replies matching the recording")
+    replay.add_argument("--max-latency-ratio", type=float, help="Fail if p95 latency exceeds the recorded p95 by this factor")
+    replay.add_argument("--save-baseline", help="Directory to write the sessions with the replies of the first stream")
+    replay.add_argument("--report", help="Write the report as JSON")
+    replay.add_argument("--log-level", default="ERROR", help="In-process app log level")
+    replay.set_defaults(func=run)
+
+    video = commands.add_parser("from-video", help="Make a session from a video or image directory")
+    video.add_argument("input", help="Video, image, or directory of images and videos")
+    video.add_argument("-o", "--output", required=True, help="Session file to write")
+    video.add_argument("--fps", type=float, default=15.0, help="Pace of the session")
+    video.add_argument("--video-stride", type=int, default=1, help="Use every Nth video frame")
+    video.add_argument("--max-dim", type=int, default=640, help="Long side of the stored frames")
+    video.add_argument("--quality", type=int, default=85, help="JPEG quality of the stored frames")
+    video.add_argument("--limit", type=int, help="Stop after this many frames")
+    video.set_defaults(func=from_video)
+
+    show = commands.add_parser("info", help="Describe session files")
+    show.add_argument("sessions", nargs="+")
+    show.set_defaults(func=info)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+Soak test: drive synthetic traffic against an in-process app and watch for growth.
+
+HTTP clients post frames to /api/v1/analyze/ (a mix of repeated and unique
+images) and poll the summary, cache and metrics endpoints; WebSocket clients
+open sessions, stream frames and hang up, sometimes abruptly or after sending
+garbage. A sampler records RSS, tracemalloc, open file descriptors, disk usage
+of the working directory, the sizes of the app's in-memory structures and the
+p95 latency of analyze requests.
+
+After a warmup period, growth and latency drift are compared against thresholds; the run fails
+(exit code 1) if any is crossed, and prints the allocation sites that grew the
+most. Runs in a scratch working directory so uploads/ and debug_faces/ are
+measured in isolation.
+
+Usage (from the backend directory):
+    python -m benchmarks.soak --model-path models/torchscript_model_0_66_37_wo_gl.pth --duration 3600
+    python -m benchmarks.soak --stand-in-model --duration 120 --debug-faces --report soak.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DIRS = ["debug_faces", "static"]
+
+
+@dataclass
+class Sample:
+    elapsed: float
+    rss_mb: float
+    traced_mb: float
+    open_fds: Optional[int]
+    disk_mb: float
+    requests: int
+    errors: int
+    structures: Dict[str, int] = field(default_factory=dict)
+    limits: Dict[str, int] = field(default_factory=dict)
+    p95_latency_ms: Optional[float] = None  # analyze requests completed since the previous sample
+
+
+@dataclass
+class Thresholds:
+    max_rss_growth_mb: float = 64.0
+    max_rss_slope_mb_per_hour: float = 16.0
+    min_trend_window: float = 600.0  # seconds of post-warmup samples before the RSS trend is judged
+    max_traced_growth_mb: float = 16.0
+    max_fd_growth: int = 8
+    max_disk_growth_mb: float = 64.0
+    max_latency_drift: float = 1.5  # end-of-run p95 latency as a multiple of its post-warmup level
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is the peak, not the current size, but it still exposes growth
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def open_fds() -> Optional[int]:
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def disk_mb(root: str) -> float:
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+def slope_per_hour(xs: List[float], ys: List[float]) -> float:
+    """Least-squares slope of ys over xs (seconds), scaled to units per hour."""
+    if len(xs) < 2:
+        return 0.0
+    x = np.asarray(xs)
+    y = np.asarray(ys)
+    denom = ((x - x.mean()) ** 2).sum()
+    if denom == 0:
+        return 0.0
+    return float(((x - x.mean()) * (y - y.mean())).sum() / denom * 3600)
+
+
+def evaluate(samples: List[Sample], warmup: float, thresholds: Thresholds) -> List[str]:
+    """
+    Compare post-warmup growth with the thresholds.
+
+    Args:
+        samples: Samples in time order
+        warmup: Seconds at the start excluded from growth (lazy init, caches filling up)
+        thresholds: Limits to enforce
+
+    Returns:
+        Human-readable failures; empty if the run passed
+    """
+    steady = [s for s in samples if s.elapsed >= warmup]
+    if len(steady) < 2:
+        return ["not enough samples after warmup; run longer or sample more often"]
+    first, last = steady[0], steady[-1]
+    failures = []
+
+    rss_growth = last.rss_mb - first.rss_mb
+    if rss_growth > thresholds.max_rss_growth_mb:
+        failures.append(f"RSS grew {rss_growth:.1f}MB (limit {thresholds.max_rss_growth_mb}MB)")
+    # Extrapolating a few minutes of allocator noise to an hourly rate is meaningless
+    rss_slope = slope_per_hour([s.elapsed for s in steady], [s.rss_mb for s in steady])
+    if last.elapsed - first.elapsed >= thresholds.min_trend_window and rss_slope > thresholds.max_rss_slope_mb_per_hour:
+        failures.append(f"RSS trend {rss_slope:.1f}MB/hour (limit {thresholds.max_rss_slope_mb_per_hour}MB/hour)")
+    traced_growth = last.traced_mb - first.traced_mb
+    if traced_growth > thresholds.max_traced_growth_mb:
+        failures.append(f"Python heap grew {traced_growth:.1f}MB (limit {thresholds.max_traced_growth_mb}MB)")
+    if first.open_fds is not None and last.open_fds is not None:
+        fd_growth = last.open_fds - first.open_fds
+        if fd_growth > thresholds.max_fd_growth:
+            failures.append(f"Open file descriptors grew by {fd_growth} (limit {thresholds.max_fd_growth})")
+    disk_growth = last.disk_mb - first.disk_mb
+    if disk_growth > thresholds.max_disk_growth_mb:
+        failures.append(f"Disk usage grew {disk_growth:.1f}MB (limit {thresholds.max_disk_growth_mb}MB)")
+    # Medians over a third of the run each, so one slow interval (a GC pause, a
+    # cold cache) is not mistaken for drift
+    latencies = [s.p95_latency_ms for s in steady if s.p95_latency_ms is not None]
+    third = len(latencies) // 3
+    if third:
+        early = float(np.median(latencies[:third]))
+        late = float(np.median(latencies[-third:]))
+        if early > 0 and late / early > thresholds.max_latency_drift:
+            failures.append(
+                f"p95 latency drifted from {early:.0f}ms to {late:.0f}ms (limit {thresholds.max_latency_drift}x)"
+            )
+    # Bounded structures fill up to their cap and stay there; checked over the whole run
+    for name in last.limits:
+        peak = max(s.structures.get(name, 0) for s in samples)
+        if peak > last.limits[name]:
+            failures.append(f"{name} reached {peak} entries (cap {last.limits[name]})")
+    return failures
+
+
+def load_frames(images: Optional[str], limit: int = 64) -> List[np.ndarray]:
+    """Sample faces shipped with the repo (or a given directory), plus synthetic frames."""
+    dirs = [images] if images else [os.path.join(BACKEND_DIR, d) for d in SAMPLE_DIRS]
+    paths = []
+    for d in dirs:
+        for ext in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(sorted(glob.glob(os.path.join(d, ext))))
+    frames = []
+    for path in paths[:limit]:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append(img)
+    rng = np.random.default_rng(0)
+    frames.append(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+    frames.append(np.full((480, 640, 3), 128, dtype=np.uint8))
+    return frames
+
+
+def encode(frame: np.ndarray, jitter: bool) -> bytes:
+    if jitter:
+        # A few changed pixels defeat the result cache without changing the content
+        frame = frame.copy()
+        frame[:2, :2] = np.random.randint(0, 256, (2, 2, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes()
+
+
+def write_stand_in_model(path: str) -> None:
+    """A tiny random TorchScript classifier with the real model's input/output shapes."""
+    import torch
+
+    class StandIn(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.head = torch.nn.Linear(3, 7)
+
+        def forward(self, x: torch.Tensor) -> torch.Tensor:
+            return self.head(x.mean(dim=(2, 3)))
+
+    torch.jit.script(StandIn()).save(path)
+
+
+class Traffic:
+    """Request counters shared by the client threads."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+        self.lock = threading.Lock()
+
+    def record(self, ok: bool, latency: Optional[float] = None) -> None:
+        with self.lock:
+            self.requests += 1
+            self.errors += not ok
+            if latency is not None and ok:
+                self.latencies.append(latency)
+
+    def p95_latency_ms(self) -> Optional[float]:
+        """p95 of the latencies recorded since the last call, which starts a new interval."""
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None
+
+
+def http_client(client, model_path: str, frames: List[np.ndarray], traffic: Traffic, stop: threading.Event) -> None:
+    encoded = [encode(frame, jitter=False) for frame in frames]
+    while not stop.is_set():
+        roll = random.random()
+        try:
+            if roll < 0.8:
+                # Repeated images hit the result cache, jittered ones go through inference
+                data = random.choice(encoded) if roll < 0.4 else encode(random.choice(frames), jitter=True)
+                started = time.perf_counter()
+                response = client.post(
+                    f"/api/v1/analyze/?model_path={model_path}",
+                    files={"file": ("frame.jpg", data, "image/jpeg")},
+                )
+                # 503s are shed load; their fast turnaround would mask a slowdown
+                latency = time.perf_counter() - started if response.status_code == 200 else None
+                traffic.record(response.status_code in (200, 503), latency)
+            elif roll < 0.9:
+                traffic.record(client.get("/api/v1/emotion-summary/").status_code == 200)
+            else:
+                path = random.choice(["/api/v1/metrics", "/api/v1/analyze/cache", "/api/v1/analyze/overload"])
+                traffic.record(client.get(path).status_code == 200)
+        except Exception:
+            traffic.record(False)
+
+
+def ws_client(client, frames: List[np.ndarray], traffic: Traffic, stop: threading.Event) -> None:
+    encoded = [encode(frame, jitter=False) for frame in frames]
+    while not stop.is_set():
+        try:
+            with client.websocket_connect("/ws/emotion") as ws:
+                for _ in range(random.randint(5, 40)):
+                    if stop.is_set():
+                        break
+                    ws.send_bytes(random.choice(encoded) if random.random() > 0.05 else b"not an image")
+                    ws.receive_json()
+                    traffic.record(True)
+                if random.random() < 0.3:
+                    # Hang up with a frame still in flight
+                    ws.send_bytes(random.choice(encoded))
+        except Exception:
+            traffic.record(False)
+
+
+def structure_sizes(app_main, ws_clients: int) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Sizes of the in-memory structures that must stay bounded, and their caps."""
+    from app.core.config import settings
+    from app.services.emotion_aggregates import get_emotion_aggregator
+    from app.services.result_cache import get_face_cache, get_result_cache
+
+    result_cache = get_result_cache()
+    sizes = {
+        "active_connections": len(app_main.manager.active_connections),
+        "emotion_aggregates_pending": get_emotion_aggregator().pending,
+        "result_cache": len(result_cache),
+    }
+    limits = {
+        "active_connections": ws_clients,
+        "emotion_aggregates_pending": get_emotion_aggregator().max_pending,
+        "result_cache": result_cache.max_entries,
+    }
+    detector = app_main.model_manager.detector
+    if detector is not None:
+        sizes["smoothing_streams"] = len(detector.smoother)
+        limits["smoothing_streams"] = detector.smoother.max_streams
+        sizes["debug_faces"] = len(detector._debug_faces)
+        limits["debug_faces"] = settings.DEBUG_FACES_MAX_FILES
+    face_cache = get_face_cache()
+    if face_cache is not None:
+        sizes["face_cache"] = len(face_cache)
+        limits["face_cache"] = face_cache.max_entries
+    return sizes, limits
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", help="TorchScript model to serve (default: settings.MODEL_PATH)")
+    parser.add_argument("--stand-in-model", action="store_true",
+                        help="Serve a tiny random model instead; predictions are meaningless but every code path runs")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds of traffic")
+    parser.add_argument("--warmup", type=float, help="Seconds excluded from growth checks (default: 20%% of duration)")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between samples")
+    parser.add_argument("--http-clients", type=int, default=2)
+    parser.add_argument("--ws-clients", type=int, default=2)
+    parser.add_argument("--images", help="Directory of sample frames (default: the repo's sample faces)")
+    parser.add_argument("--debug-faces", action="store_true", help="Enable DEBUG_SAVE_FACES to check the directory cap")
+    parser.add_argument("--log-level", default="ERROR", help="App log level during the run")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip Python heap tracing (lower overhead)")
+    parser.add_argument("--report", help="Write samples and the verdict to this JSON file")
+    for name, default in asdict(Thresholds()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args(argv)
+    thresholds = Thresholds(**{name: getattr(args, name) for name in asdict(Thresholds())})
+    warmup = args.warmup if args.warmup is not None else args.duration * 0.2
+
+    frames = load_frames(args.images)
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    model_path = args.model_path and os.path.abspath(args.model_path)
+    if args.stand_in_model:
+        model_path = os.path.join(workdir, "stand_in_model.pth")
+        write_stand_in_model(model_path)
+    report_path = args.report and os.path.abspath(args.report)
+
+    # uploads/, static/ and debug_faces/ are created relative to the working directory
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+
+    model_path = model_path or os.path.abspath(os.path.join(BACKEND_DIR, settings.MODEL_PATH))
+    settings.MODEL_PATH = model_path
+    settings.DEBUG_SAVE_FACES = args.debug_faces
+    settings.LOG_LEVEL = args.log_level
+    from app import main as app_main
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    traffic = Traffic()
+    samples: List[Sample] = []
+    stop = threading.Event()
+    baseline_snapshot = None
+
+    print(f"Soak run for {args.duration:.0f}s in {workdir} (warmup {warmup:.0f}s)")
+    with TestClient(app_main.app) as client:
+        if not app_main.model_manager.wait(timeout=300):
+            print(f"Model failed to load: {app_main.model_manager.error}")
+            return 1
+        threads = [
+            threading.Thread(target=http_client, args=(client, model_path, frames, traffic, stop), daemon=True)
+            for _ in range(args.http_clients)
+        ] + [
+            threading.Thread(target=ws_client, args=(client, frames, traffic, stop), daemon=True)
+            for _ in range(args.ws_clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        def take_sample(elapsed: float) -> Sample:
+            structures, limits = structure_sizes(app_main, args.ws_clients)
+            sample = Sample(
+                elapsed=round(elapsed, 1),
+                rss_mb=round(rss_mb(), 2),
+                traced_mb=round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2) if tracemalloc.is_tracing() else 0.0,
+                open_fds=open_fds(),
+                disk_mb=round(disk_mb(workdir), 2),
+                requests=traffic.requests,
+                errors=traffic.errors,
+                structures=structures,
+                limits=limits,
+                p95_latency_ms=traffic.p95_latency_ms(),
+            )
+            samples.append(sample)
+            print(
+                f"[{sample.elapsed:>7.0f}s] rss {sample.rss_mb:8.1f}MB | heap {sample.traced_mb:7.1f}MB | "
+                f"fds {sample.open_fds} | disk {sample.disk_mb:6.1f}MB | p95 {'-' if sample.p95_latency_ms is None else f'{sample.p95_latency_ms:.0f}ms'} | "
+                f"{sample.requests} requests ({sample.errors} errors) | {sample.structures}"
+            )
+            return sample
+
+        try:
+            while (elapsed := time.perf_counter() - start) < args.duration:
+                if baseline_snapshot is None and elapsed >= warmup and tracemalloc.is_tracing():
+                    baseline_snapshot = tracemalloc.take_snapshot()
+                take_sample(elapsed)
+                time.sleep(min(args.interval, max(0.0, args.duration - elapsed)))
+        except KeyboardInterrupt:
+            print("Interrupted; evaluating what was collected")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=30)
+        # Give the server side a moment to process the last disconnects; anything still registered leaked
+        deadline = time.perf_counter() + 5
+        while app_main.manager.active_connections and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        final = take_sample(time.perf_counter() - start)
+
+    failures = evaluate(samples, warmup, thresholds)
+    if final.structures.get("active_connections"):
+        failures.append(
+            f"{final.structures['active_connections']} WebSocket connections still registered after all clients left"
+        )
+
+    if baseline_snapshot is not None:
+        print("\nTop allocation growth since warmup:")
+        growth = [s for s in tracemalloc.take_snapshot().compare_to(baseline_snapshot, "lineno") if s.size_diff > 0]
+        for stat in growth[:10]:
+            print(f"  {stat}")
+
+    print()
+    if failures:
+        print("FAIL")
+        for failure in failures:
+            print(f"  - {failure}")
+    else:
+        print(f"PASS: {traffic.requests} requests ({traffic.errors} errors), no growth beyond thresholds")
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump({
+                "passed": not failures,
+                "failures": failures,
+                "thresholds": asdict(thresholds),
+                "samples": [asdict(s) for s in samples],
+            }, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
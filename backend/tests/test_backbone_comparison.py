@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from app.services.backbone_comparison import Backbone, ComparisonReport, LABELS, discover_backbones, run_backbones
+
+
+def test_discover_backbones(tmp_path):
+    for name in ("0_66_37_wo_gl", "0_66_49_wo_gl"):
+        (tmp_path / f"torchscript_model_{name}.pth").write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("")
+    models = discover_backbones([str(tmp_path), "ref=models/other.pth"])
+    assert list(models) == ["0_66_37_wo_gl", "0_66_49_wo_gl", "ref"]
+    assert models["ref"] == "models/other.pth"
+    assert discover_backbones(["models/torchscript_model_x.pth"]) == {"x": "models/torchscript_model_x.pth"}
+
+
+def test_report_agreement_and_confusion():
+    report = ComparisonReport(["a", "b", "c"])
+    neutral, happy, sad = (LABELS.index(name) for name in ("neutral", "happiness", "sadness"))
+    report.add_batch(
+        {"a": np.array([neutral, happy, sad, sad]), "b": np.array([neutral, happy, happy, sad]), "c": np.array([neutral, happy, sad, sad])},
+        {"a": 0.01, "b": 0.02, "c": 0.03},
+    )
+    agreement = report.agreement()
+    assert agreement[0, 1] == agreement[1, 0] == 0.75
+    assert agreement[0, 2] == 1.0
+    assert report.unanimous() == 0.75
+
+    confusion = report.confusion("a", "b")
+    assert confusion.sum() == 4
+    assert confusion[sad, happy] == 1 and confusion[sad, sad] == 1
+
+    summary = report.to_dict()
+    assert summary["faces"] == 4
+    assert summary["latency"]["b"]["mean_ms"] == 20.0
+    assert "a__vs__b" in summary["confusion"] and "b__vs__a" not in summary["confusion"]
+    assert "confusion: rows a, columns b" in report.format()
+
+
+def test_run_backbones_shares_one_batch():
+    torch.manual_seed(0)
+    backbones = [
+        Backbone(name, "", torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(12, 7)).to(dtype), dtype)
+        for name, dtype in (("fp32", torch.float32), ("fp64", torch.float64))
+    ]
+    batch = torch.randn(5, 3, 2, 2)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        outputs, timings = run_backbones(backbones, batch, pool)
+    assert set(outputs) == set(timings) == {"fp32", "fp64"}
+    assert outputs["fp64"].shape == (5, 7) and outputs["fp64"].dtype == torch.float32
+    assert all(seconds >= 0 for seconds in timings.values())
@@ -0,0 +1,154 @@
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from app.cli import batch_analyze
+from app.cli.batch_analyze import Manifest, PartWriter, iter_media_files
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+class StubDetector:
+    """Answers every frame with one "happiness" face; raises KeyboardInterrupt on a chosen file once."""
+
+    max_dim = 640
+    interrupt_on = None
+
+    def predict_batch(self, frames, requirements=None, face_backend=None):
+        return [self.predict_emotion(frame) for frame in frames]
+
+    def predict_emotion(self, frame, stream=None, **kwargs):
+        if StubDetector.interrupt_on is not None and frame.mean() == StubDetector.interrupt_on:
+            StubDetector.interrupt_on = None
+            raise KeyboardInterrupt
+        face = {
+            "emotion": "happiness",
+            "confidence": 0.9,
+            "bounding_box": {"left": 1, "top": 2, "width": 3, "height": 4},
+            "all_emotions": {"happiness": 90.0, "neutral": 10.0},
+        }
+        return "happiness", 0.9, [face]
+
+
+def _stub_worker(model_path, threads, max_dim):
+    batch_analyze._detector = StubDetector()
+
+
+@pytest.fixture
+def in_process(monkeypatch):
+    """Run the pool in threads with the stub detector instead of model-loading worker processes."""
+    monkeypatch.setattr(batch_analyze, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch_analyze, "_init_worker", _stub_worker)
+    monkeypatch.setattr(StubDetector, "interrupt_on", None)
+
+
+def _images(root: Path, count: int) -> list:
+    paths = []
+    for i in range(count):
+        path = root / f"sub{i % 2}" / f"img{i:02d}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(path), np.full((32, 32, 3), 10 * (i + 1), np.uint8))
+        paths.append(str(path))
+    (root / "notes.txt").write_text("not media")
+    (root / "broken.jpg").write_bytes(b"not a jpeg")
+    return paths
+
+
+def _args(root: Path, out: Path, rows_per_part: int = 3) -> argparse.Namespace:
+    return argparse.Namespace(
+        input=str(root), output=str(out), manifest=None, model_path="unused.pth", jobs=1,
+        threads_per_job=1, video_stride=10, max_dim=640, rows_per_part=rows_per_part,
+    )
+
+
+def _rows(out: Path) -> list:
+    rows = []
+    for part in sorted(out.glob("*.parquet")):
+        rows.extend(pq.read_table(part).to_pylist())
+    return rows
+
+
+def test_media_files_are_walked_in_stable_order(tmp_path):
+    paths = _images(tmp_path, 4)
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "x.jpg").write_bytes(b"")
+    assert list(iter_media_files(str(tmp_path))) == [str(tmp_path / "broken.jpg")] + sorted(paths)
+
+
+@pytest.mark.parametrize("option", ["--jobs", "--video-stride"])
+def test_counts_below_one_are_rejected(tmp_path, option, capsys):
+    with pytest.raises(SystemExit) as exc:
+        batch_analyze.main([str(tmp_path), "--output", str(tmp_path / "out"), option, "0"])
+    assert exc.value.code == 2
+    assert f"{option} must be at least 1" in capsys.readouterr().err
+
+
+def test_manifest_and_part_writer(tmp_path):
+    manifest = Manifest(str(tmp_path / "_manifest.sqlite"))
+    writer = PartWriter(str(tmp_path), manifest, rows_per_part=2)
+    writer.add("a.png", [{"path": "a.png", "frame_index": 0, "status": "ok", "emotion": "happiness", "confidence": 0.5}])
+    assert not manifest.is_done("a.png")  # still buffered
+    writer.add("b.png", [{"path": "b.png", "frame_index": 0, "status": "decode_error"}])
+    assert manifest.is_done("a.png") and manifest.is_done("b.png")
+    writer.add("empty.mp4", [])
+    writer.flush()
+    assert manifest.count() == 3
+
+    parts = sorted(tmp_path.glob("*.parquet"))
+    assert len(parts) == 1  # a flush with no rows records the files without writing a part
+    assert [row["path"] for row in pq.read_table(parts[0]).to_pylist()] == ["a.png", "b.png"]
+    assert not list(tmp_path.glob("*.tmp"))
+    done = dict(sqlite3.connect(str(tmp_path / "_manifest.sqlite")).execute("SELECT path, part FROM completed"))
+    assert done == {"a.png": parts[0].name, "b.png": parts[0].name, "empty.mp4": None}
+    manifest.close()
+
+
+def test_run_then_rerun_skips_completed_files(tmp_path, in_process, monkeypatch):
+    root, out = tmp_path / "in", tmp_path / "out"
+    paths = _images(root, 5)
+
+    assert batch_analyze.run(_args(root, out)) == 0
+    rows = _rows(out)
+    assert sorted(row["path"] for row in rows) == sorted(paths + [str(root / "broken.jpg")])
+    by_path = {row["path"]: row for row in rows}
+    assert by_path[str(root / "broken.jpg")]["status"] == "decode_error"
+    ok = by_path[paths[0]]
+    assert ok["status"] == "ok" and ok["emotion"] == "happiness" and ok["bbox_width"] == 3
+    assert ok["p_happiness"] == pytest.approx(0.9) and ok["p_anger"] == 0.0
+    parts = sorted(out.glob("*.parquet"))
+
+    # Everything is in the manifest: a second run analyzes nothing and writes no parts
+    calls = []
+    analyze_file = batch_analyze.analyze_file
+    monkeypatch.setattr(batch_analyze, "analyze_file", lambda path, stride: calls.append(path) or analyze_file(path, stride))
+    assert batch_analyze.run(_args(root, out)) == 0
+    assert calls == []
+    assert sorted(out.glob("*.parquet")) == parts
+
+
+def test_interrupted_run_resumes_without_duplicates(tmp_path, in_process):
+    root, out = tmp_path / "in", tmp_path / "out"
+    paths = _images(root, 6)
+    # A part file left half-written by an earlier crash is never read as results
+    out.mkdir()
+    (out / "part-19700101_000000-00000.parquet.tmp").write_bytes(b"PAR1 truncated")
+
+    StubDetector.interrupt_on = 40.0  # the fourth image
+    assert batch_analyze.run(_args(root, out, rows_per_part=2)) == 130
+    first = _rows(out)
+    assert paths[3] not in {row["path"] for row in first}
+    manifest = Manifest(str(out / "_manifest.sqlite"))
+    # Only files whose rows reached a complete part file count as done
+    assert {path for path in paths if manifest.is_done(path)} == {row["path"] for row in first} - {str(root / "broken.jpg")}
+    manifest.close()
+
+    assert batch_analyze.run(_args(root, out, rows_per_part=2)) == 0
+    rows = _rows(out)
+    assert sorted(row["path"] for row in rows) == sorted(paths + [str(root / "broken.jpg")])
+    assert all(os.path.getsize(part) > 0 for part in out.glob("*.parquet"))
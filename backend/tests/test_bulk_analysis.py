@@ -0,0 +1,204 @@
+import io
+import tarfile
+import zipfile
+
+from app.services.bulk_analysis import iter_upload_entries
+
+
+def _zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def _tar(entries):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+
+def test_zip_entries_skip_non_images():
+    upload = _zip({"a.jpg": b"1", "dir/b.PNG": b"22", "notes.txt": b"x", "__MACOSX/._a.jpg": b"y"})
+    assert list(iter_upload_entries("set.zip", upload, 100)) == [("a.jpg", b"1"), ("dir/b.PNG", b"22")]
+
+
+def test_tar_entries_are_streamed_and_oversized_flagged():
+    upload = _tar({"a.jpg": b"1", "big.jpg": b"x" * 10})
+    assert list(iter_upload_entries("set.tar.gz", upload, 5)) == [("a.jpg", b"1"), ("big.jpg", None)]
+
+
+def test_plain_file_is_single_entry():
+    assert list(iter_upload_entries("face.jpg", io.BytesIO(b"abc"), 100)) == [("face.jpg", b"abc")]
+    assert list(iter_upload_entries("face.jpg", io.BytesIO(b"abc"), 2)) == [("face.jpg", None)]
+
+
+def test_low_quality_images_skip_inference():
+    import cv2
+    import numpy as np
+
+    from app.services.bulk_analysis import analyze_entries
+
+    class Detector:
+        max_dim = 640
+        calls = 0
+
+        def predict_batch(self, frames, requirements=None, face_backend=None):
+            Detector.calls += len(frames)
+            return [("no_face", 0.0, []) for _ in frames]
+
+    dark = cv2.imencode(".png", np.full((64, 64, 3), 5, np.uint8))[1].tobytes()
+    results = list(analyze_entries([("dark.png", dark)], Detector(), quality_gate=True))
+    assert results[0]["emotion"] == "low_quality" and "underexposed" in results[0]["quality"]["reasons"]
+    assert results[-1]["summary"]["low_quality"] == 1
+    assert Detector.calls == 0
+
+
+class StubDetector:
+    """Reports each image's gray level as its confidence; black images have no face."""
+
+    max_dim = 640
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_batch(self, frames, requirements=None, face_backend=None, profile=None):
+        self.batches.append(len(frames))
+        return [
+            ("Happiness", frame[0, 0, 0] / 255, [{"emotion": "happiness"}]) if frame.any() else ("no_face", 0.0, [])
+            for frame in frames
+        ]
+
+
+def _png(level, size=32):
+    import cv2
+    import numpy as np
+
+    return cv2.imencode(".png", np.full((size, size + level % 7, 3), level, np.uint8))[1].tobytes()
+
+
+def test_results_keep_input_order_across_windows():
+    from app.services.bulk_analysis import analyze_entries
+
+    levels = [10, 0, 200, 30, 250, 0, 120, 60, 90]
+    entries = [(f"img{i}.png", _png(level)) for i, level in enumerate(levels)]
+    entries.insert(3, ("broken.jpg", b"not an image"))
+    entries.insert(7, ("huge.jpg", None))
+    detector = StubDetector()
+
+    results = list(analyze_entries(entries, detector, batch_size=2, decode_workers=3))
+    summary = results.pop()["summary"]
+    assert [r["index"] for r in results] == list(range(len(entries)))
+    assert [r["filename"] for r in results] == [name for name, _ in entries]
+
+    errors = {r["filename"]: r for r in results if r["status"] == "error"}
+    assert set(errors) == {"broken.jpg", "huge.jpg"}
+    assert errors["huge.jpg"]["message"] == "File exceeds the maximum upload size"
+    images = [r for r in results if r["status"] == "success"]
+    assert [round(r["confidence"] * 255) for r in images] == levels
+    assert [r["emotion"] for r in images] == ["happiness" if level else "no_face" for level in levels]
+    assert all("all_faces" in r for r in images if r["emotion"] != "no_face")
+
+    assert sum(detector.batches) == len(levels) and max(detector.batches) == 2
+    assert summary["images"] == len(entries) and summary["errors"] == 2 and summary["faces"] == 7
+
+
+def test_bulk_endpoint_streams_ndjson(monkeypatch):
+    import json
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services.model_manager import model_manager
+
+    monkeypatch.setattr(model_manager, "_detector", StubDetector())
+    monkeypatch.setattr(model_manager, "state", model_manager.READY)
+    archive = _zip({"a.png": _png(40), "b.png": _png(0), "c.jpg": b"garbage"})
+
+    response = TestClient(app).post(
+        "/api/v1/analyze/bulk?model_path=unused.pth&quality_gate=false",
+        files=[("files", ("set.zip", archive.getvalue(), "application/zip")), ("files", ("d.png", _png(80), "image/png"))],
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("filename") for line in lines[:-1]] == ["a.png", "b.png", "c.jpg", "d.png"]
+    assert [line["status"] for line in lines[:-1]] == ["success", "success", "error", "success"]
+    assert lines[1]["emotion"] == "no_face" and "quality_profile" in lines[0]
+    assert lines[-1]["summary"]["images"] == 4
+
+
+def _face_detector(tmp_path):
+    """A real EmotionDetector over a tiny scripted model that always favours happiness, and a stub face backend."""
+    import numpy as np
+    import torch
+
+    from app.services.emotion_detector import EmotionDetector
+    from app.services.face_backends import DetectedFace
+
+    model = torch.nn.Sequential(torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(), torch.nn.Linear(3, 7))
+    with torch.no_grad():
+        model[2].weight.zero_()
+        model[2].bias.copy_(torch.tensor([0.0, 4.0, 0, 0, 0, 0, 0]))
+    torch.jit.script(model).save(str(tmp_path / "model.pth"))
+
+    class BrightSquare:
+        """Finds the white square drawn on the frame."""
+        name = "stub"
+
+        def detect(self, frame):
+            ys, xs = np.nonzero(frame[:, :, 0] > 200)
+            if not len(xs):
+                return []
+            return [DetectedFace((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1))]
+
+    class Pool:
+        def get(self, requirements, preferred=None):
+            return BrightSquare()
+
+    detector = EmotionDetector(str(tmp_path / "model.pth"))
+    detector.face_backends = detector.image_backends = Pool()
+    detector.face_cache = None
+    detector.save_debug_faces = False
+    return detector
+
+
+def test_predict_batch_maps_faces_back_to_their_frames(tmp_path, monkeypatch):
+    import numpy as np
+
+    detector = _face_detector(tmp_path)
+    forwards = []
+    forward = detector._forward
+    monkeypatch.setattr(detector, "_forward", lambda crops: forwards.append(len(crops)) or forward(crops))
+
+    def frame(x=None):
+        image = np.full((240, 320, 3), 60, np.uint8)
+        if x is not None:
+            image[80:160, x:x + 80] = 240
+        return image
+
+    offsets = [None, 60, 180, None, 120]
+    frames = [frame(x) for x in offsets] + [np.zeros((0, 0, 3), np.uint8)]
+    results = detector.predict_batch(frames)
+
+    assert forwards == [3]  # every face in one forward pass
+    assert [r[0] for r in results] == ["no_face", "happiness", "happiness", "no_face", "happiness", "unknown"]
+    for x, (emotion, confidence, faces) in zip(offsets, results):
+        if x is None:
+            assert (confidence, faces) == (0.0, [])
+            continue
+        box = faces[0]["bounding_box"]
+        assert abs((box["left"] + box["right"]) / 2 - (x + 40)) <= 1
+        assert faces[0]["emotion"] == "happiness" and confidence > 0.5
+
+    # A failed forward pass fails the frames with faces only
+    monkeypatch.setattr(detector, "_forward", lambda crops: 1 / 0)
+    assert [r[0] for r in detector.predict_batch(frames[:3])] == ["no_face", "prediction_error", "prediction_error"]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from app.services.emotion_aggregates import EmotionAggregator
+
+
+def test_workers_share_one_summary(tmp_path):
+    """Two aggregators on one database (as in two worker processes) report the same totals."""
+    path = str(tmp_path / "aggregates.sqlite")
+    worker_a = EmotionAggregator(path, version_ttl=0)
+    worker_b = EmotionAggregator(path, version_ttl=0)
+    now = time.time() // 60 * 60
+    worker_a.record("happiness", 0.8, timestamp=now)
+    worker_a.record("happiness", 0.6, timestamp=now + 1)
+    worker_b.record("sadness", 0.5, timestamp=now + 61)
+    worker_a.flush()
+    worker_b.flush()
+
+    summary = worker_a.get_summary()["summary"]
+    assert summary == worker_b.get_summary()["summary"]
+    assert summary["total_frames"] == 3
+    assert summary["emotion_distribution"]["happiness"] == {"count": 2, "avg_confidence": 0.7}
+    assert [len(bucket) for bucket in summary["timeline"]] == [2, 2]
+    assert summary["timeline"][0]["happiness"] == 2
+    worker_a.stop()
+    worker_b.stop()
+
+
+def test_window_retention_and_buffer_cap(tmp_path):
+    aggregator = EmotionAggregator(str(tmp_path / "aggregates.sqlite"), retention_hours=1, max_pending=2, version_ttl=0)
+    aggregator.record("neutral", 0.9, timestamp=time.time() - 2 * 3600)
+    aggregator.record("neutral", 0.9)
+    aggregator.record("anger", 0.9)  # buffer full: dropped rather than blocking
+    assert aggregator.flush() == 2
+    # The old bucket was pruned on flush
+    assert aggregator.get_summary(time_window_hours=24)["summary"]["total_frames"] == 1
+    aggregator.stop()
+
+
+def test_background_flush_and_concurrent_record(tmp_path):
+    aggregator = EmotionAggregator(str(tmp_path / "aggregates.sqlite"), flush_interval=0.05, version_ttl=0)
+
+    def producer():
+        for _ in range(500):
+            aggregator.record("surprise", 0.5)
+
+    threads = [threading.Thread(target=producer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    deadline = time.time() + 5
+    while aggregator.get_summary()["summary"]["total_frames"] < 2000 and time.time() < deadline:
+        time.sleep(0.05)
+    assert aggregator.get_summary()["summary"]["total_frames"] == 2000
+    aggregator.stop()
+    assert aggregator.pending == 0
+
+
+def test_delta_returns_only_changed_buckets(tmp_path):
+    aggregator = EmotionAggregator(str(tmp_path / "aggregates.sqlite"), version_ttl=0)
+    minute = time.time() // 60 * 60
+    aggregator.record("happiness", 0.8, timestamp=minute - 120)
+    aggregator.record("neutral", 0.6, timestamp=minute - 60)
+    aggregator.flush()
+    cursor = aggregator.get_summary()["cursor"]
+
+    unchanged = aggregator.get_delta(cursor)
+    assert unchanged["cursor"] == cursor and unchanged["timeline"] == []
+    assert unchanged["total_frames"] == 2
+
+    aggregator.record("neutral", 0.4, timestamp=minute - 60)
+    aggregator.flush()
+    delta = aggregator.get_delta(cursor)
+    assert delta["cursor"] > cursor and not delta["reset"]
+    # Only the touched minute, complete
+    assert [bucket["neutral"] for bucket in delta["timeline"]] == [2]
+    assert delta["emotion_distribution"]["neutral"] == {"count": 2, "avg_confidence": 0.5}
+
+    # A cursor from a newer database than this one gets the full summary
+    assert aggregator.get_delta(delta["cursor"] + 100)["reset"] is True
+    aggregator.stop()
+
+
+def test_summary_endpoint_etag_and_delta(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import emotion_aggregates
+
+    aggregator = EmotionAggregator(str(tmp_path / "aggregates.sqlite"), version_ttl=0)
+    monkeypatch.setattr(emotion_aggregates, "emotion_aggregator", aggregator)
+    aggregator.record("sadness", 0.5)
+    aggregator.flush()
+
+    client = TestClient(app)
+    first = client.get("/api/v1/emotion-summary/")
+    assert first.status_code == 200 and first.json()["summary"]["total_frames"] == 1
+    etag = first.headers["etag"]
+    assert client.get("/api/v1/emotion-summary/", headers={"If-None-Match": etag}).status_code == 304
+
+    aggregator.record("sadness", 0.7)
+    aggregator.flush()
+    assert client.get("/api/v1/emotion-summary/", headers={"If-None-Match": etag}).status_code == 200
+    delta = client.get("/api/v1/emotion-summary/delta", params={"cursor": first.json()["cursor"]}).json()
+    assert delta["total_frames"] == 2 and len(delta["timeline"]) == 1
+    aggregator.stop()
@@ -0,0 +1,62 @@
+import pytest
+
+from app.services.face_backends import (
+    BACKENDS,
+    FaceRequirements,
+    available_backends,
+    resolve_backend_name,
+)
+
+
+def test_available_backends_sorted_by_cost():
+    """Available backends are listed cheapest first."""
+    costs = [BACKENDS[name].cost for name in available_backends()]
+    assert costs == sorted(costs)
+
+
+def test_auto_selects_cheapest_satisfying_backend():
+    """Auto selection honours landmark requirements."""
+    available = available_backends()
+    if not available:
+        pytest.skip("No face detector backend available")
+
+    assert resolve_backend_name(FaceRequirements(), "auto") == available[0]
+
+    dense = [name for name in available if BACKENDS[name].landmark_count >= 68]
+    if dense:
+        selected = resolve_backend_name(FaceRequirements(min_landmarks=68))
+        assert selected == dense[0]
+
+
+def test_explicit_backend_is_validated():
+    """Unknown or insufficient explicit backends are rejected."""
+    with pytest.raises(ValueError):
+        resolve_backend_name(FaceRequirements(), "does_not_exist")
+    with pytest.raises(ValueError):
+        resolve_backend_name(FaceRequirements(min_landmarks=68), "opencv_haar")
+
+
+def test_backends_accept_static_image_mode():
+    """Every backend can be built for unrelated images, as the benchmark and offline tools do."""
+    for name in available_backends():
+        backend = BACKENDS[name](max_faces=1, static_image=True)
+        try:
+            assert backend.static_image
+        finally:
+            backend.close()
+
+
+def test_pool_builds_backends_in_its_mode():
+    """A static-image pool never hands out a tracking backend."""
+    from app.services.face_backends import BackendPool
+
+    if not available_backends():
+        pytest.skip("No face detector backend available")
+    for static_image in (True, False):
+        pool = BackendPool(static_image=static_image)
+        try:
+            assert pool.get(FaceRequirements(), "auto").static_image is static_image
+            if "mediapipe_facemesh" in available_backends():
+                assert pool.get(FaceRequirements(), "mediapipe_facemesh").static_image is static_image
+        finally:
+            pool.close()
@@ -0,0 +1,71 @@
+import time
+
+import cv2
+import numpy as np
+
+from app.services.frame_change import FrameChangeDetector, StreamRegistry
+
+
+def _scene(dx=0, mouth=False):
+    frame = np.full((480, 640, 3), 90, np.uint8)
+    cv2.rectangle(frame, (0, 300), (640, 480), (60, 70, 80), -1)
+    cv2.ellipse(frame, (320 + dx, 220), (100, 130), 0, 0, 360, (200, 160, 140), -1)
+    cv2.circle(frame, (285 + dx, 190), 10, (40, 40, 40), -1)
+    cv2.circle(frame, (355 + dx, 190), 10, (40, 40, 40), -1)
+    cv2.ellipse(frame, (320 + dx, 280), (40, 25 if mouth else 6), 0, 0, 360, (90, 30, 40), -1)
+    return frame
+
+
+def _noisy(frame, rng):
+    noisy = np.clip(frame + rng.normal(0, 8, frame.shape), 0, 255).astype(np.uint8)
+    return cv2.imdecode(cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 70])[1], cv2.IMREAD_UNCHANGED)
+
+
+def test_still_frames_reuse_until_changed():
+    rng = np.random.default_rng(0)
+    detector = FrameChangeDetector()
+    reusable, signature = detector.unchanged(_noisy(_scene(), rng))
+    assert not reusable
+    detector.update({"emotion": "neutral"}, signature)
+
+    assert detector.unchanged(_noisy(_scene(), rng))[0]
+    assert detector.unchanged(np.clip(_scene().astype(int) + 15, 0, 255).astype(np.uint8))[0]  # exposure shift
+    assert not detector.unchanged(_noisy(_scene(mouth=True), rng))[0]
+    assert not detector.unchanged(_noisy(_scene(dx=12), rng))[0]
+    assert detector.result == {"emotion": "neutral"}
+
+
+def test_forced_refresh_and_reset():
+    detector = FrameChangeDetector(max_age=0.05)
+    _, signature = detector.unchanged(_scene())
+    detector.update({"emotion": "happiness"}, signature)
+    assert detector.unchanged(_scene())[0]
+    time.sleep(0.06)
+    assert not detector.unchanged(_scene())[0]
+
+    detector.update({"emotion": "happiness"}, signature)
+    detector.reset()
+    assert not detector.unchanged(_scene())[0]
+
+
+def test_overlapping_frames_keep_their_own_signature():
+    """A frame compared while another of the stream is being analyzed must not swap in its signature."""
+    detector = FrameChangeDetector()
+    _, still = detector.unchanged(_scene())
+    # A second request of the stream arrives before the first one's result
+    _, moved = detector.unchanged(_scene(dx=40))
+    detector.update({"emotion": "neutral"}, still)
+    assert detector.unchanged(_scene())[0]
+    assert not detector.unchanged(_scene(dx=40))[0]
+    detector.update({"emotion": "happiness"}, moved)
+    assert detector.unchanged(_scene(dx=40))[0]
+
+
+def test_registry_is_bounded():
+    registry = StreamRegistry(max_streams=2, idle_timeout=60)
+    first = registry.get("a")
+    assert registry.get("a") is first
+    registry.get("b")
+    registry.get("c")
+    assert len(registry) == 2
+    assert registry.get("a") is not first
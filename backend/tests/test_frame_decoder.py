@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.services.frame_decoder import (
+    PIXEL_FORMAT_BGR24,
+    PIXEL_FORMAT_I420,
+    PIXEL_FORMAT_RGB24,
+    FrameDecodeError,
+    decode_frame,
+    encode_raw_frame,
+    jpeg_dimensions,
+)
+
+
+def _frame(width: int = 1920, height: int = 1080) -> np.ndarray:
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = 200  # red in RGB
+    return frame
+
+
+def _jpeg(rgb: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))[1].tobytes()
+
+
+def test_jpeg_dimensions_from_header():
+    data = _jpeg(_frame(1920, 1080))
+    assert jpeg_dimensions(np.frombuffer(data, np.uint8)) == (1920, 1080)
+    assert jpeg_dimensions(np.frombuffer(b"not a jpeg", np.uint8)) is None
+
+
+def test_decode_jpeg_to_working_size_in_rgb():
+    img = decode_frame(_jpeg(_frame(1920, 1080)), max_dim=640)
+    assert img.shape == (360, 640, 3)
+    assert img[..., 0].mean() > 150 and img[..., 2].mean() < 50
+
+
+@pytest.mark.parametrize("pixel_format", [PIXEL_FORMAT_RGB24, PIXEL_FORMAT_BGR24, PIXEL_FORMAT_I420])
+def test_decode_raw_frames(pixel_format):
+    rgb = _frame(1280, 720)
+    if pixel_format == PIXEL_FORMAT_BGR24:
+        pixels = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    elif pixel_format == PIXEL_FORMAT_I420:
+        pixels = cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV_I420)
+    else:
+        pixels = rgb
+    img = decode_frame(encode_raw_frame(pixels, pixel_format), max_dim=640)
+    assert img.shape == (360, 640, 3)
+    assert img[..., 0].mean() > 150 and img[..., 2].mean() < 50
+
+
+def test_invalid_payloads_raise():
+    with pytest.raises(FrameDecodeError):
+        decode_frame(b"garbage")
+    truncated = encode_raw_frame(_frame(64, 64))[:-10]
+    with pytest.raises(FrameDecodeError):
+        decode_frame(truncated)
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.frame_quality import QualityThresholds, assess_frame, face_yaw_ratio
+
+FACES = sorted((Path(__file__).resolve().parent.parent / "debug_faces").glob("*.jpg"))
+
+
+@pytest.fixture
+def face():
+    if not FACES:
+        pytest.skip("no sample face crops")
+    return cv2.cvtColor(cv2.imread(str(FACES[0])), cv2.COLOR_BGR2RGB)
+
+
+def _sharp_scene():
+    rng = np.random.default_rng(0)
+    frame = np.full((240, 320, 3), 120, np.uint8)
+    for _ in range(40):
+        x, y = rng.integers(0, 300), rng.integers(0, 220)
+        cv2.rectangle(frame, (int(x), int(y)), (int(x) + 20, int(y) + 20), rng.integers(0, 255, 3).tolist(), -1)
+    return frame
+
+
+def test_sharp_frame_passes():
+    quality = assess_frame(_sharp_scene())
+    assert quality.ok, quality.reasons
+    assert set(quality.to_dict()) == {"sharpness", "brightness", "dark_fraction", "bright_fraction", "motion_coherence", "reasons"}
+
+
+def test_sample_face_passes(face):
+    assert assess_frame(face).ok
+
+
+def test_blur_and_exposure_are_rejected():
+    frame = _sharp_scene()
+    assert assess_frame(cv2.GaussianBlur(frame, (0, 0), 6)).reasons == ["blurry"]
+    assert "underexposed" in assess_frame((frame * 0.1).astype(np.uint8)).reasons
+    assert "overexposed" in assess_frame(np.full_like(frame, 250)).reasons
+
+
+def test_portrait_on_bright_or_dark_backdrop_passes():
+    """Only the middle of the frame has to be well exposed; a blown-out or black background is fine."""
+    subject = _sharp_scene()
+    for backdrop in (250, 5):
+        portrait = np.full_like(subject, backdrop)
+        cv2.ellipse(portrait, (160, 130), (60, 90), 0, 0, 360, (150, 150, 150), -1)
+        portrait[100:160, 120:200] = subject[100:160, 120:200]
+        # Shoulders fill the bottom of the frame
+        cv2.rectangle(portrait, (70, 200), (250, 240), (90, 90, 90), -1)
+        quality = assess_frame(portrait)
+        assert quality.ok, (backdrop, quality.reasons)
+
+
+def test_motion_blur_is_rejected(face):
+    kernel = np.zeros((1, 15), np.float32)
+    kernel[0, :] = 1 / 15
+    quality = assess_frame(cv2.filter2D(face, -1, kernel))
+    assert quality.motion_coherence > assess_frame(face).motion_coherence
+    assert not quality.ok
+
+
+def test_thresholds_are_configurable():
+    blurred = cv2.GaussianBlur(_sharp_scene(), (0, 0), 6)
+    assert assess_frame(blurred, QualityThresholds(min_sharpness=0.0, max_motion_coherence=1.0)).ok
+
+
+def test_face_yaw_ratio():
+    frontal = np.array([[30, 40], [70, 40], [50, 60], [0, 0], [0, 0], [0, 0]], float)
+    profile = frontal.copy()
+    profile[2, 0] = 72
+    assert face_yaw_ratio(frontal) == 0
+    assert face_yaw_ratio(profile) > 1
+    assert face_yaw_ratio(None) is None
+    assert face_yaw_ratio(np.zeros((5, 2))) is None
@@ -0,0 +1,37 @@
+import io
+import json
+import logging
+import queue
+
+from app.core import logs
+
+
+def test_event_sampler_keeps_one_in_n():
+    sampler = logs.EventSampler(logs.parse_sample_rates("probs=10, debug=3"))
+    assert sum(sampler("probs") for _ in range(100)) == 10
+    assert sum(sampler("debug") for _ in range(9)) == 3
+    assert all(sampler("other") for _ in range(5))
+
+
+def test_queued_json_records_carry_event_fields():
+    stream = io.StringIO()
+    logs.setup_logging(level="INFO", json_format=True, stream=stream)
+    try:
+        logs.log_event(logging.getLogger("app.test"), logging.INFO, "prediction", "Final prediction: %s (%.2f)",
+                       "happiness", 0.91, emotion="happiness")
+        logging.getLogger("app.test").debug("not emitted %s", "at INFO")
+    finally:
+        logs.shutdown_logging()
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(records) == 1
+    assert records[0]["message"] == "Final prediction: happiness (0.91)"
+    assert records[0]["event"] == "prediction"
+    assert records[0]["emotion"] == "happiness"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = logs._dropped.value()
+    for _ in range(3):
+        handler.emit(logging.makeLogRecord({"msg": "x"}))
+    assert logs._dropped.value() - before == 2
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from app.services.overload import InferenceExecutor, OverloadController, OverloadedError
+from app.services.scheduler import FairScheduler
+
+
+def test_degrades_after_dwell_and_recovers_after_cooldown():
+    """Quality steps down one profile at a time under sustained wait and back up once it drains."""
+    controller = OverloadController(target_wait=0.1, shed_wait=2.0, alpha=1.0, dwell=1.0, cooldown=5.0)
+    controller.observe(0.5, now=0.0)
+    assert controller.level == 0  # a single spike does not degrade
+    controller.observe(0.5, now=1.0)
+    assert controller.profile.name == "reduced"
+
+    controller.observe(0.0, now=2.0)
+    controller.observe(0.0, now=4.0)
+    assert controller.level == 1  # still inside the cooldown
+    controller.observe(0.0, now=7.0)
+    assert controller.level == 0
+    assert [t["to"] for t in controller.transitions] == ["reduced", "full"]
+
+
+def test_sheds_beyond_cheapest_profile():
+    controller = OverloadController(target_wait=0.1, shed_wait=1.0, alpha=1.0, dwell=0.0, cooldown=0.0)
+    for step in range(len(controller.profiles) + 1):
+        controller.observe(5.0, now=float(step))
+    assert controller.profile.name == "minimal"
+    assert controller.shedding
+
+    executor = InferenceExecutor(controller)
+    with pytest.raises(OverloadedError):
+        executor.submit(lambda profile: None)
+    # Jobs of an already admitted stream still run
+    assert executor.call(lambda profile: profile.name, shed=False) == ("minimal", controller.profile)
+
+    controller.observe(0.0, now=10.0)
+    controller.observe(0.0, now=11.0)
+    assert not controller.shedding
+
+
+def test_queue_limit_rejects_excess_jobs():
+    executor = InferenceExecutor(OverloadController(), max_queue=1)
+    release = threading.Event()
+    first = executor.submit(lambda profile: release.wait(5))
+    with pytest.raises(OverloadedError):
+        executor.submit(lambda profile: None)
+    release.set()
+    assert first.result()[0] is True
+    assert executor.depth == 0
+
+
+class IdleScheduler(FairScheduler):
+    """Lets the worker thread give up after a short idle spell."""
+
+    def pop(self, timeout=None):
+        return super().pop(timeout=0.01)
+
+
+def test_worker_restarts_after_going_idle():
+    executor = InferenceExecutor(OverloadController(), scheduler=IdleScheduler())
+    assert executor.call(lambda profile: "first", kind="interactive")[0] == "first"
+    worker = executor._worker
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert executor.submit(lambda profile: "second").result(timeout=5)[0] == "second"
+    assert executor.depth == 0
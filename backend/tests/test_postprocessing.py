@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import torch
+
+from app.services.postprocessing import (
+    Postprocessor,
+    RunnerUpRule,
+    StreamSmoother,
+    parse_fallbacks,
+    parse_runner_up,
+)
+
+LABELS = ["Neutral", "Happiness", "Sadness", "Surprise", "Fear", "Disgust", "Anger"]
+
+
+def _postprocessor(**kwargs):
+    return Postprocessor(
+        LABELS,
+        fallbacks={"anger": "neutral"},
+        runner_up=[RunnerUpRule("anger", 0.7, 0.8)],
+        **kwargs,
+    )
+
+
+def test_distribution_is_weighted_temperature_softmax():
+    logits = torch.randn(16, 7) * 3
+    weights = {"anger": 0.5, "happiness": 2.0}
+    probs = _postprocessor(temperature=1.5, class_weights=weights).distribution(logits)
+
+    expected = torch.softmax(logits / 1.5, dim=1) * torch.tensor([1.0, 2.0, 1.0, 1.0, 1.0, 1.0, 0.5])
+    expected = expected / expected.sum(dim=1, keepdim=True)
+    assert np.allclose(probs, expected.numpy(), atol=1e-6)
+
+
+def test_override_rules_apply_per_row():
+    postprocessor = _postprocessor()
+    probs = np.array([
+        [0.05, 0.80, 0.03, 0.03, 0.03, 0.03, 0.03],  # confident happiness
+        [0.16, 0.14, 0.14, 0.14, 0.14, 0.14, 0.14],  # too unsure: uncertain
+        [0.14, 0.14, 0.14, 0.14, 0.14, 0.10, 0.20],  # unsure anger falls back to neutral
+        [0.00, 0.00, 0.45, 0.00, 0.00, 0.00, 0.55],  # narrow anger: the runner-up wins
+        [0.00, 0.00, 0.25, 0.00, 0.00, 0.00, 0.75],  # clear anger stays
+    ])
+    decisions = postprocessor.decide(probs)
+    assert decisions.label == ["happiness", "uncertain", "neutral", "sadness", "anger"]
+    assert decisions.low_confidence == [False, True, True, False, False]
+    assert decisions.overridden == [False, False, False, True, False]
+    # The confidence reported stays the top score
+    assert decisions.confidence[3] == pytest.approx(0.55)
+
+    # The batch gives the same answers as its rows one at a time
+    for row in range(len(probs)):
+        assert postprocessor.decide(probs[row:row + 1]).label == [decisions.label[row]]
+
+
+def test_percentages_round_like_the_response_did():
+    postprocessor = _postprocessor()
+    (percent,) = postprocessor.percentages(np.array([[0.123456, 0.876544, 0, 0, 0, 0, 0]]))
+    assert percent["neutral"] == 12.35 and percent["happiness"] == 87.65 and list(percent) == [l.lower() for l in LABELS]
+
+
+def test_parse_rules_skip_malformed_entries():
+    assert parse_fallbacks("anger:neutral, bogus ,fear:") == {"anger": "neutral"}
+    assert parse_runner_up("anger:0.7:0.8,fear:x:1,sadness:0.5") == [RunnerUpRule("anger", 0.7, 0.8)]
+
+
+def _onehot(index, classes=3):
+    vector = np.zeros((1, classes))
+    vector[0, index] = 1.0
+    return vector
+
+
+def test_window_smoothing_weights_recent_frames_per_stream():
+    smoother = StreamSmoother(3, mode="window", window=3, min_history=2)
+    # Below min_history frames pass through
+    assert np.array_equal(smoother.smooth("a", _onehot(0), [True]), _onehot(0))
+    assert np.allclose(smoother.smooth("a", _onehot(1), [True]), [[1 / 3, 2 / 3, 0]])
+    assert np.allclose(smoother.smooth("a", _onehot(1), [True]), [[1 / 6, 5 / 6, 0]])
+    # The window slides: the first frame has dropped out
+    assert np.allclose(smoother.smooth("a", _onehot(2), [True]), [[0, 0.5, 0.5]])
+    # Frames left out of the history come back unchanged and leave it alone
+    assert np.array_equal(smoother.smooth("a", _onehot(0), [False]), _onehot(0))
+    assert np.allclose(smoother.smooth("a", _onehot(2), [True]), [[0, 1 / 6, 5 / 6]])
+    # Another stream has its own history
+    assert np.array_equal(smoother.smooth("b", _onehot(0), [True]), _onehot(0))
+
+
+def test_ema_smoothing_and_stream_limit():
+    smoother = StreamSmoother(3, mode="ema", alpha=0.5, min_history=1, max_streams=2)
+    smoother.smooth("a", _onehot(0), [True])
+    assert np.allclose(smoother.smooth("a", _onehot(1), [True]), [[0.5, 0.5, 0]])
+    # Consecutive frames in one call are folded in order
+    assert np.allclose(smoother.smooth("a", np.vstack([_onehot(1), _onehot(1)]), [True, True])[-1], [[0.125, 0.875, 0]])
+
+    smoother.smooth("b", _onehot(0), [True])
+    smoother.smooth("c", _onehot(0), [True])
+    assert len(smoother) == 2
+    # "a" was the least recently seen and starts over
+    assert np.array_equal(smoother.smooth("a", _onehot(2), [True]), _onehot(2))
+
+    with pytest.raises(ValueError):
+        StreamSmoother(3, mode="median")
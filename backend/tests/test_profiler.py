@@ -0,0 +1,82 @@
+import json
+import threading
+
+import pytest
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import profiling
+from app.core.config import settings
+from app.services.profiler import Profiler, ProfilerBusyError, SamplingSession
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_session_captures_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        session = SamplingSession(seconds=0.3, interval=0.005)
+        session.start()
+        assert session.done.wait(5)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert session.summary()["status"] == "done" and session.samples > 10
+    collapsed = session.render("collapsed").splitlines()
+    assert any(line.startswith("busy;") and ":_busy_loop:" in line for line in collapsed)
+
+    events = json.loads(session.render("chrome"))["traceEvents"]
+    begins = sum(e["ph"] == "B" for e in events)
+    assert begins and begins == sum(e["ph"] == "E" for e in events)
+
+
+class _Detector:
+    def predict_emotion(self, x):
+        return torch.nn.functional.relu(x @ x).sum().item()
+
+
+def test_torch_session_profiles_next_calls_then_unwraps():
+    detector = _Detector()
+    profiler = Profiler()
+    session = profiler.start_torch(detector, calls=2)
+    assert "predict_emotion" in vars(detector)
+    with pytest.raises(ProfilerBusyError):
+        profiler.start_cpu(1)
+
+    x = torch.randn(8, 8)
+    for _ in range(3):
+        assert detector.predict_emotion(x) == _Detector().predict_emotion(x)
+    assert session.done.is_set() and "predict_emotion" not in vars(detector)
+
+    summary = session.summary()
+    assert summary["calls_profiled"] == 2
+    ops = {op["op"]: op for op in summary["ops"]}
+    assert ops["predict_emotion"]["count"] == 2 and "aten::relu" in ops
+    assert json.loads(session.render("chrome"))["traceEvents"]
+    assert profiler.list()[0]["id"] == session.id
+
+
+def test_endpoints_require_admin_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(profiling.router, prefix="/profile")
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.get("/profile/").status_code == 404
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    assert client.get("/profile/", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    auth = {"Authorization": "Bearer secret"}
+    started = client.post("/profile/cpu?seconds=0.1", headers=auth)
+    assert started.status_code == 202
+    session_id = started.json()["id"]
+    assert client.get(f"/profile/{session_id}?wait=5", headers=auth).json()["status"] == "done"
+    download = client.get(f"/profile/{session_id}/download?format=collapsed", headers=auth)
+    assert download.headers["content-disposition"].endswith('.folded"')
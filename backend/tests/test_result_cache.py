@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+
+from app.services.result_cache import ResultCache, content_key, face_key, perceptual_hash
+
+
+def test_lru_eviction_by_entry_count():
+    """The least recently used entry is evicted first."""
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_bounded_by_bytes_and_ttl():
+    """Entries are evicted when the byte budget is exceeded and expire after the TTL."""
+    cache = ResultCache(max_entries=100, max_bytes=100)
+    cache.put("a", "x" * 60)
+    cache.put("b", "y" * 60)
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] <= 100
+
+    expired = ResultCache(ttl_seconds=0)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_hit_miss_counters():
+    cache = ResultCache()
+    cache.get("missing")
+    cache.put("k", 1)
+    cache.get("k")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_content_key_depends_on_bytes_model_and_params():
+    key = content_key(b"image", "model-a", landmarks=False)
+    assert key == content_key(b"image", "model-a", landmarks=False)
+    assert key != content_key(b"image2", "model-a", landmarks=False)
+    assert key != content_key(b"image", "model-a", landmarks=True)
+    assert key != content_key(b"image", "model-b", landmarks=False)
+
+
+def _face(mouth_height):
+    face = np.full((112, 96, 3), 200, np.uint8)
+    cv2.ellipse(face, (48, 56), (40, 52), 0, 0, 360, (190, 150, 130), -1)
+    cv2.circle(face, (34, 44), 5, (40, 40, 40), -1)
+    cv2.circle(face, (62, 44), 5, (40, 40, 40), -1)
+    cv2.ellipse(face, (48, 82), (14, mouth_height), 0, 0, 360, (110, 40, 50), -1)
+    return face
+
+
+def test_face_key_separates_settings_and_expressions():
+    face = _face(3)
+    key = face_key("model-a", face, enhance=True, max_dim=640)
+    assert key == face_key("model-a", face, max_dim=640, enhance=True)
+    assert key != face_key("model-a", face, enhance=False, max_dim=640)
+    assert key != face_key("model-a", face, enhance=True, max_dim=320)
+    assert key != face_key("model-b", face, enhance=True, max_dim=640)
+
+    # Opening the mouth slips through an 8x8 hash but not the face key
+    opened = _face(7)
+    assert perceptual_hash(opened) == perceptual_hash(face)
+    assert face_key("model-a", opened, enhance=True, max_dim=640) != key
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from app.services.overload import DeadlineExceededError, InferenceExecutor, OverloadController, QuotaExceededError
+from app.services.scheduler import FairScheduler, client_address, parse_networks, parse_weights
+
+
+def _drain(scheduler):
+    order = []
+    while True:
+        job = scheduler.pop(timeout=0)
+        if job is None:
+            return order
+        order.append((job.kind, job.client))
+
+
+def test_classes_run_in_priority_order():
+    scheduler = FairScheduler()
+    scheduler.push(None, "batch", "a")
+    scheduler.push(None, "interactive", "a")
+    scheduler.push(None, "live", "a")
+    assert [kind for kind, _ in _drain(scheduler)] == ["live", "interactive", "batch"]
+
+
+def test_flooding_client_gets_fair_share():
+    scheduler = FairScheduler()
+    for _ in range(10):
+        scheduler.push(None, "interactive", "flood")
+    scheduler.push(None, "interactive", "polite")
+    scheduler.push(None, "interactive", "polite")
+    clients = [client for _, client in _drain(scheduler)]
+    # The two late jobs interleave with the flood instead of waiting behind all ten
+    assert clients.index("polite") <= 1
+    assert clients[:4].count("polite") == 2
+
+
+def test_weights_and_cost():
+    scheduler = FairScheduler(weights=parse_weights("heavy=3, bad=x, =2"))
+    for _ in range(6):
+        scheduler.push(None, "batch", "heavy")
+        scheduler.push(None, "batch", "light")
+    assert _drain(scheduler)[:8].count(("batch", "heavy")) == 6
+
+    scheduler = FairScheduler()
+    scheduler.push(None, "batch", "big", cost=16)
+    for _ in range(3):
+        scheduler.push(None, "batch", "small")
+    assert [client for _, client in _drain(scheduler)] == ["small", "small", "small", "big"]
+
+
+def test_quota_rejects_interactive_and_throttles_batch():
+    controller = OverloadController()
+    executor = InferenceExecutor(controller, scheduler=FairScheduler(rates={"interactive": 2, "batch": 20}))
+    executor.call(lambda p: None, kind="interactive", client="a")
+    executor.call(lambda p: None, kind="interactive", client="a")
+    with pytest.raises(QuotaExceededError) as error:
+        executor.submit(lambda p: None, kind="interactive", client="a")
+    assert 0 < error.value.retry_after <= 0.5
+    executor.call(lambda p: None, kind="interactive", client="b")  # quotas are per client
+
+    start = time.monotonic()
+    for _ in range(3):
+        executor.call(lambda p: None, kind="batch", shed=False, client="a", cost=10)
+    assert time.monotonic() - start >= 0.4  # 30 images at 20/s with a 20 image burst
+
+
+def test_stale_live_frames_are_dropped():
+    executor = InferenceExecutor(OverloadController(), scheduler=FairScheduler(deadlines={"live": 0.05}))
+    started, release = threading.Event(), threading.Event()
+    blocker = executor.submit(lambda p: started.set() or release.wait(5), kind="batch")
+    started.wait(5)
+    stale = executor.submit(lambda p: "ran", kind="live", client="ws")
+    time.sleep(0.1)
+    release.set()
+    blocker.result(timeout=5)
+    with pytest.raises(DeadlineExceededError):
+        stale.result(timeout=5)
+    assert executor.call(lambda p: "ran", kind="live", client="ws")[0] == "ran"
+    assert executor.depth == 0
+    status = executor.status()["classes"]
+    assert status["live"]["deadline_dropped"] >= 1
+    assert status["live"]["queue_wait"]["count"] >= 2
+
+
+def test_clients_behind_trusted_proxies():
+    proxies = parse_networks("127.0.0.1, 10.0.0.0/8, ::1, bogus")
+    assert len(proxies) == 3
+    # Direct connections are their own client, whatever they claim
+    assert client_address("203.0.113.9", "198.51.100.1", proxies) == "203.0.113.9"
+    assert client_address("127.0.0.1", None, proxies) == "127.0.0.1"
+    # Through the proxies, the first untrusted hop from the right is the client; forged entries left of it are ignored
+    assert client_address("127.0.0.1", "198.51.100.1", proxies) == "198.51.100.1"
+    assert client_address("127.0.0.1", "6.6.6.6, 198.51.100.1, 10.1.2.3", proxies) == "198.51.100.1"
+    assert client_address("::1", "10.1.2.3", proxies) == "10.1.2.3"
+    assert client_address(None, "198.51.100.1", proxies) is None
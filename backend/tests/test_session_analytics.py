@@ -0,0 +1,106 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import sessions
+from app.core.config import settings
+from app.services import session_analytics
+from app.services.session_analytics import AnalyticsParams, DwellStats, SessionAnalytics, SessionAnalyticsRegistry
+
+PARAMS = AnalyticsParams(window=10.0, max_gap=2.0, episode_tau=2.0, episode_enter=0.6, episode_exit=0.4,
+                         episode_min_seconds=5.0, negative=frozenset({"sadness", "anger"}))
+
+
+def _feed(session, labels, start=0.0, fps=10):
+    for i, label in enumerate(labels):
+        session.observe(label, 0.8, t=start + i / fps)
+    return start + len(labels) / fps
+
+
+def test_transitions_and_dwell_times():
+    session = SessionAnalytics("s", params=PARAMS)
+    _feed(session, ["neutral"] * 30 + ["happiness"] * 10 + ["neutral"] * 20)
+    report = session.finalize(now=6.0)
+
+    assert report["transitions"] == {"neutral": {"happiness": 1}, "happiness": {"neutral": 1}}
+    assert report["dwell"]["neutral"]["count"] == 2
+    # The open run lasts until the session ends: 3s, then 2s
+    assert report["dwell"]["neutral"]["total_seconds"] == 5.0
+    assert report["dwell"]["happiness"] == {"count": 1, "total_seconds": 1.0, "mean_seconds": 1.0,
+                                            "p50_seconds": 1.0, "p90_seconds": 1.0, "max_seconds": 1.0}
+    assert report["emotions"]["neutral"]["count"] == 50 and report["episodes_total"] == 0
+
+
+def test_gap_ends_dwell_without_a_transition():
+    session = SessionAnalytics("s", params=PARAMS)
+    end = _feed(session, ["neutral"] * 10)
+    _feed(session, ["happiness"] * 10, start=end + 5.0)
+    snapshot = session.snapshot(now=end + 6.0)
+    assert snapshot["transitions"] == {} and snapshot["gaps"] == 1
+    assert snapshot["dwell"]["neutral"]["total_seconds"] == 0.9
+    assert snapshot["current"]["emotion"] == "happiness"
+
+
+def test_rolling_entropy_and_switch_rate():
+    steady = SessionAnalytics("a", params=PARAMS)
+    _feed(steady, ["neutral"] * 100)
+    flicker = SessionAnalytics("b", params=PARAMS)
+    _feed(flicker, ["neutral", "happiness"] * 50)
+
+    assert steady.snapshot()["rolling"]["entropy_bits"] == 0.0
+    rolling = flicker.snapshot()["rolling"]
+    assert rolling["entropy_bits"] > 0.95
+    # One switch per frame at 10 fps
+    assert 500 < rolling["switches_per_minute"] < 700
+
+
+def test_sustained_negative_episode_is_detected_once():
+    session = SessionAnalytics("s", params=PARAMS)
+    t = _feed(session, ["neutral"] * 50)
+    # A short dip is not an episode
+    t = _feed(session, ["sadness"] * 20, start=t)
+    t = _feed(session, ["neutral"] * 50, start=t)
+    t = _feed(session, ["sadness"] * 60 + ["anger"] * 40, start=t)
+    live = session.snapshot(now=t)
+    assert live["current_episode"]["confirmed"] and live["episodes"] == []
+    _feed(session, ["neutral"] * 50, start=t)
+
+    report = session.finalize()
+    assert report["episodes_total"] == 1
+    (episode,) = report["episodes"]
+    # The episode opens once the negative share passes 0.6 and closes when it falls below 0.4
+    assert episode["dominant"] == "sadness" and episode["emotions"]["anger"] == 40
+    assert 8.0 < episode["duration_seconds"] < 11.0
+
+
+def test_dwell_quantiles_use_log_buckets():
+    stats = DwellStats()
+    for seconds in (0.1, 0.2, 0.3, 5.0, 40.0):
+        stats.add(seconds)
+    assert stats.quantile(0.5) == 0.5 and stats.quantile(1.0) == 40.0
+
+
+def test_registry_and_endpoints(monkeypatch):
+    registry = SessionAnalyticsRegistry(max_reports=1)
+    monkeypatch.setattr(session_analytics, "session_analytics", registry)
+    app = FastAPI()
+    app.include_router(sessions.router, prefix="/sessions")
+    client = TestClient(app)
+    first = registry.start("ws:a")
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.get(f"/sessions/{first.session_id}").status_code == 404
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    assert client.get("/sessions/").status_code == 401
+    client.headers["Authorization"] = "Bearer secret"
+
+    first.observe("happiness", 0.9)
+    assert client.get(f"/sessions/{first.session_id}").json()["status"] == "active"
+    registry.finish(first.session_id)
+    assert client.get(f"/sessions/{first.session_id}").json()["emotions"]["happiness"]["count"] == 1
+
+    second = registry.start("ws:b")
+    registry.finish(second.session_id)
+    listing = client.get("/sessions/").json()
+    assert listing["active"] == [] and [s["session_id"] for s in listing["finished"]] == [second.session_id]
+    assert "client" not in listing["finished"][0]
+    assert client.get(f"/sessions/{first.session_id}").status_code == 404
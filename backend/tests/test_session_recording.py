@@ -0,0 +1,78 @@
+import os
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services.session_recording import RecordingWebSocket, SessionWriter, read_session, start_recording
+
+
+def test_round_trip_pairs_frames_with_replies(tmp_path):
+    path = str(tmp_path / "a.session")
+    writer = SessionWriter(path, {"client": "ws:test"})
+    writer.frame(b"\xff\xd8one", t=0.0)
+    writer.reply({"emotion": "happiness", "confidence": 0.9}, t=0.02)
+    writer.frame(b"two", t=0.1)
+    writer.frame(b"three", t=0.2)
+    writer.reply({"error": "No face detected"}, t=0.25)
+    writer.close()
+
+    session = read_session(path)
+    assert session.metadata["client"] == "ws:test"
+    assert [f.data for f in session.frames] == [b"\xff\xd8one", b"two", b"three"]
+    assert session.frames[0].reply["emotion"] == "happiness" and abs(session.frames[0].latency - 0.02) < 1e-9
+    # Replies attach to frames in order
+    assert session.frames[1].reply == {"error": "No face detected"}
+    assert session.frames[2].reply is None
+    assert session.summary == {"frames": 3, "truncated": False}
+
+
+def test_size_cap_and_cut_off_file(tmp_path):
+    path = str(tmp_path / "b.session")
+    writer = SessionWriter(path, max_bytes=200)
+    for i in range(10):
+        writer.frame(b"x" * 40, t=i)
+    writer.close()
+    assert writer.truncated and 0 < writer.frames < 10
+    assert read_session(path).summary["truncated"]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-30])  # as if the process died mid-write
+    assert len(read_session(path).frames) <= writer.frames
+
+
+def test_recording_websocket_captures_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_RECORD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SESSION_RECORD_FRACTION", 1.0)
+    monkeypatch.setattr(settings, "SESSION_RECORD_MAX_FILES", 2)
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket):
+        await websocket.accept()
+        recording = start_recording("ws:test")
+        stream = RecordingWebSocket(websocket, recording)
+        try:
+            for _ in range(2):
+                data = await stream.receive_bytes()
+                await stream.send_json({"size": len(data)})
+        finally:
+            recording.close()
+
+    client = TestClient(app)
+    for _ in range(3):
+        with client.websocket_connect("/ws") as ws:
+            ws.send_bytes(b"abc")
+            assert ws.receive_json() == {"size": 3}
+            ws.send_bytes(b"de")
+            ws.receive_json()
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2  # the oldest recording was pruned
+    session = read_session(str(tmp_path / files[-1]))
+    assert [(f.data, f.reply) for f in session.frames] == [(b"abc", {"size": 3}), (b"de", {"size": 2})]
+
+    monkeypatch.setattr(settings, "SESSION_RECORD_DIR", "")
+    assert start_recording("ws:test") is None
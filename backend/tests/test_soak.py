@@ -0,0 +1,44 @@
+from benchmarks.soak import Sample, Thresholds, evaluate
+
+
+def _samples(rss=None, fds=None, latency=None, count=12, interval=60.0):
+    """One sample per interval; each metric is a function of the sample index (flat by default)."""
+    rss = rss or (lambda i: 200.0)
+    fds = fds or (lambda i: 40)
+    latency = latency or (lambda i: 80.0)
+    return [
+        Sample(
+            elapsed=i * interval, rss_mb=rss(i), traced_mb=10.0, open_fds=fds(i), disk_mb=1.0,
+            requests=100 * i, errors=0, p95_latency_ms=latency(i),
+        )
+        for i in range(count)
+    ]
+
+
+def test_steady_run_passes():
+    # Noise, a spike during warmup and a single slow interval later are not growth
+    samples = _samples(
+        rss=lambda i: 500.0 if i == 0 else 200.0 + i % 3,
+        latency=lambda i: 400.0 if i in (0, 7) else 80.0 + i % 2 * 5,
+    )
+    assert evaluate(samples, warmup=60.0, thresholds=Thresholds()) == []
+
+
+def test_leaks_fail():
+    samples = _samples(rss=lambda i: 200.0 + 10 * i, fds=lambda i: 40 + 2 * i)
+    failures = evaluate(samples, warmup=60.0, thresholds=Thresholds())
+    assert any(f.startswith("RSS grew 100.0MB") for f in failures)
+    assert any(f.startswith("RSS trend") for f in failures)
+    assert any(f.startswith("Open file descriptors grew by 20") for f in failures)
+
+
+def test_latency_drift_fails():
+    samples = _samples(latency=lambda i: 80.0 if i < 6 else 200.0)
+    assert evaluate(samples, warmup=60.0, thresholds=Thresholds()) == [
+        "p95 latency drifted from 80ms to 200ms (limit 1.5x)"
+    ]
+    assert evaluate(samples, warmup=60.0, thresholds=Thresholds(max_latency_drift=3.0)) == []
+
+
+def test_too_few_samples_after_warmup_fail():
+    assert evaluate(_samples(count=3), warmup=150.0, thresholds=Thresholds()) != []
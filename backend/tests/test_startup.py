@@ -0,0 +1,61 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("torch", "torchvision", "mediapipe", "cv2")
+
+# Liveness probes must be answered within a second of launch
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def test_import_is_fast_and_lazy(tmp_path):
+    """Importing the app must not load ML libraries, the model, or touch the filesystem."""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env={"PYTHONPATH": str(BACKEND_DIR), "PATH": ""},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert report["heavy"] == []
+    assert report["elapsed"] < IMPORT_BUDGET_SECONDS
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_ready_reports_model_status(monkeypatch):
+    """/health answers immediately; /ready is 503 until the model is usable."""
+    from app.main import app
+    from app.services.model_manager import ModelManager
+    import app.main as main_module
+    import app.api.api_v1.api as api_module
+
+    manager = ModelManager()
+    for module in (main_module, api_module):
+        monkeypatch.setattr(module, "model_manager", manager)
+    monkeypatch.setattr(main_module.settings, "MODEL_PATH", "does/not/exist.pth")
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        assert client.get("/api/v1/health").status_code == 200
+        assert time.perf_counter() - start < 1.0
+
+        manager.wait(timeout=60)
+        response = client.get("/api/v1/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == ModelManager.FAILED
+        assert response.json()["error"]
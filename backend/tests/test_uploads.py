@@ -0,0 +1,65 @@
+import tempfile
+
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services.uploads import UploadLimitMiddleware, UploadTooLargeError, save_upload, upload_buffer
+
+
+def _app(limit: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, limits={"/upload": limit})
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        with upload_buffer(file.file, limit) as data:
+            return {"size": len(data)}
+
+    @app.post("/upload/raw")
+    async def upload_raw(request: Request):
+        return {"size": len(await request.body())}
+
+    return app
+
+
+def test_rejects_declared_and_streamed_oversize_bodies():
+    client = TestClient(_app(limit=4096))
+    assert client.post("/upload", files={"file": ("a.bin", b"x" * 1000)}).json() == {"size": 1000}
+
+    response = client.post("/upload", files={"file": ("a.bin", b"x" * 10000)})
+    assert response.status_code == 413
+    assert response.json()["detail"]["error_type"] == "UploadTooLargeError"
+
+    # No Content-Length: the body is counted while it streams in
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 1000
+
+    response = client.post("/upload/raw", content=chunks())
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("size", [100, 2 * 1024 * 1024])
+def test_upload_buffer_shares_spooled_bytes(size):
+    """Both in-memory and rolled-over spooled files are exposed without a copy."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write((bytes(range(256)) * (size // 256 + 1))[:size])
+    with upload_buffer(spooled, max_size=size) as data:
+        assert isinstance(data, memoryview)
+        assert len(data) == size
+        assert data[:3].tobytes() == b"\x00\x01\x02"
+    with pytest.raises(UploadTooLargeError):
+        with upload_buffer(spooled, max_size=10):
+            pass
+
+
+def test_save_upload_enforces_limit(tmp_path):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"x" * 5000)
+    path = tmp_path / "video.mp4"
+    assert save_upload(spooled, str(path), max_size=5000, chunk_size=1024) == 5000
+    assert path.stat().st_size == 5000
+    with pytest.raises(UploadTooLargeError):
+        save_upload(spooled, str(path), max_size=4000, chunk_size=1024)
+    assert not path.exists()
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import torch
+
+from app.services.emotion_detector import EmotionDetector
+from app.services.vector_store import VectorStore
+
+
+def clustered(n: int, dim: int = 32, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return centers[rng.integers(clusters, size=n)] + rng.normal(scale=0.3, size=(n, dim))
+
+
+def exact(vectors: np.ndarray, query: np.ndarray, k: int) -> set:
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return set(np.argsort(-(vectors @ (query / np.linalg.norm(query))))[:k].tolist())
+
+
+def test_search_without_index_is_exact(tmp_path):
+    vectors = clustered(500)
+    store = VectorStore(str(tmp_path / "store"), dim=32)
+    store.add(vectors, [{"n": i} for i in range(len(vectors))])
+    matches = store.search(vectors[7], k=5)[0]
+    assert {i for i, _ in matches} == exact(vectors, vectors[7], 5)
+    assert matches[0][0] == 7 and matches[0][1] == pytest.approx(1.0, abs=1e-3)
+    assert store.item(7) == {"n": 7}
+
+
+def test_ivf_recall_and_unindexed_tail(tmp_path):
+    vectors = clustered(4000)
+    store = VectorStore(str(tmp_path / "store"), dim=32)
+    store.add(vectors[:3500])
+    summary = store.build_index(nlist=32)
+    assert summary["vectors"] == 3500 and summary["nlist"] == 32
+
+    # Rows added after the build are searched too, without rebuilding
+    store.add(vectors[3500:])
+    assert store.stats()["unindexed"] == 500
+    recall = np.mean([
+        len({i for i, _ in store.search(vectors[q], k=10, nprobe=4)[0]} & exact(vectors, vectors[q], 10)) / 10
+        for q in range(0, 4000, 97)
+    ])
+    assert recall >= 0.9
+    assert store.search(vectors[3900], k=1, nprobe=1)[0][0][0] == 3900
+
+    # Probing every list is an exact search
+    assert {i for i, _ in store.search(vectors[11], k=10, nprobe=32)[0]} == exact(vectors, vectors[11], 10)
+
+
+def test_reopen_and_truncate_uncommitted_rows(tmp_path):
+    path = str(tmp_path / "store")
+    store = VectorStore(path, dim=32)
+    store.add(clustered(100), [{"n": i} for i in range(100)])
+    store.build_index(nlist=4)
+
+    # Simulate a crash after rows were written but before the count was committed
+    with open(tmp_path / "store" / "vectors.f16", "ab") as f:
+        f.write(np.zeros((3, 32), dtype=np.float16).tobytes())
+
+    reopened = VectorStore(path)
+    assert len(reopened) == 100 and reopened.indexed_count == 100
+    assert (tmp_path / "store" / "vectors.f16").stat().st_size == 100 * 32 * 2
+    assert reopened.item(99) == {"n": 99}
+    with pytest.raises(ValueError):
+        VectorStore(path, dim=16)
+    with pytest.raises(ValueError):
+        reopened.add(np.ones((1, 16)))
+
+
+class Backbone(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.body = torch.nn.Linear(3, 16)
+        self.fc = torch.nn.Linear(16, 7)
+
+    def extract_features(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.relu(self.body(x.mean(dim=(2, 3))))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.fc(self.extract_features(x))
+
+
+def feature_source(model: torch.nn.Module) -> EmotionDetector:
+    detector = EmotionDetector.__new__(EmotionDetector)
+    detector.model = torch.jit.script(model)
+    detector._feature_fn = None
+    detector.embedding_source = None
+    return detector
+
+
+@pytest.mark.parametrize("model, source, dim", [
+    (Backbone(), "extract_features", 16),
+    (torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(12, 10), torch.nn.Linear(10, 7)), "sequential", 10),
+    (torch.nn.Linear(2, 7), "logits", 7),
+])
+def test_feature_extractor_prefers_penultimate_features(model, source, dim):
+    detector = feature_source(model)
+    extract = detector._feature_extractor()
+    x = torch.zeros((2, 3, 2, 2)) if source != "logits" else torch.zeros((2, 2))
+    assert detector.embedding_source == source
+    assert extract(x).shape == (2, dim)
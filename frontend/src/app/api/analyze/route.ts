@@ -1,21 +1,45 @@
-import { NextResponse } from 'next/server';
+import { NextRequest, NextResponse } from 'next/server';
 
 export const runtime = 'nodejs';
 
-export async function POST(request: Request) {
+/**
+ * X-Forwarded-For for the backend, so it rate limits each user rather than this server.
+ *
+ * The caller's own header is only kept when this server sits behind a proxy that
+ * overwrites or appends to it (BEHIND_TRUSTED_PROXY=true); anywhere else a caller
+ * could name a new address on every request. The backend's TRUSTED_PROXIES must
+ * then list that proxy too.
+ */
+function forwardedFor(request: NextRequest): string | undefined {
+  // The connection's address, where the hosting platform provides it
+  const peer = request.ip;
+  const inbound = request.headers.get('x-forwarded-for');
+  if (process.env.BEHIND_TRUSTED_PROXY === 'true' && inbound) {
+    return peer ? `${inbound}, ${peer}` : inbound;
+  }
+  return peer;
+}
+
+export async function POST(request: NextRequest) {
   try {
     // Forward request body directly to backend to preserve multipart encoding
     const backendBase = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
     const url = new URL(`${backendBase}/api/v1/analyze/`);
     url.searchParams.append('model_path', 'models/torchscript_model_0_66_37_wo_gl.pth');
 
+    const headers: Record<string, string> = {
+      'Content-Type': request.headers.get('content-type') || '',
+    };
+    const clientChain = forwardedFor(request);
+    if (clientChain) {
+      headers['X-Forwarded-For'] = clientChain;
+    }
+
     const response = await fetch(
       url.toString(),
       {
         method: 'POST',
-        headers: {
-          'Content-Type': request.headers.get('content-type') || '',
-        },
+        headers,
         body: request.body,
         // @ts-ignore -- duplex is required by undici but not in lib types
         duplex: 'half',
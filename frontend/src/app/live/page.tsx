@@ -38,6 +38,8 @@ export default function LiveAnalysis() {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const mediaStreamRef = useRef<MediaStream | null>(null);
   const analysisInterval = useRef<NodeJS.Timeout | null>(null);
+  // Identifies this camera session so the server can reuse results for unchanged frames
+  const streamId = useRef<string>(Math.random().toString(36).slice(2) + Date.now().toString(36));
 
   const [isAnalyzing, setIsAnalyzing] = useState<boolean>(false);
   const [isPaused, setIsPaused] = useState<boolean>(false);
@@ -85,7 +87,8 @@ export default function LiveAnalysis() {
         // Add required query parameters
         const queryParams = new URLSearchParams({
           model_path: 'models/torchscript_model_0_66_37_wo_gl.pth',
-          landmark_path: 'models/shape_predictor_68_face_landmarks.dat'
+          landmark_path: 'models/shape_predictor_68_face_landmarks.dat',
+          stream_id: streamId.current
         });
         
         const response = await fetch(`${API_BASE_URL}/analyze?${queryParams}`, {
@@ -116,7 +119,13 @@ export default function LiveAnalysis() {
           setConfidence(0);
           return;
         }
-        
+
+        if (responseData.emotion === 'low_quality') {
+          // Frame rejected as blurry or badly exposed: keep showing the last reading, and keep it out of the history
+          setError(null);
+          return;
+        }
+
         const emotion = responseData.emotion as EmotionType;
         const newConfidence = responseData.confidence || 0;
         
@@ -1,26 +1,22 @@
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
 import cv2
 import dlib
-import torch
 import numpy as np
+import torch
 from torchvision import transforms
 from PIL import Image
-import csv
-import os
-from datetime import datetime
-from collections import Counter
-
-# --- Load face detector and shape predictor ---
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
 
-# --- Load TorchScript emotion model ---
-model_path = "EMO-AffectNetModel/backbone_models/torchscript_model_0_66_37_wo_gl.pth"
-model = torch.jit.load(model_path)
-model.eval()
-
-# --- Load emotion labels (same order as model output) ---
-with open("labels.txt", "r") as f:
-    labels = [line.strip() for line in f.readlines()]
+DEFAULT_MODEL = "EMO-AffectNetModel/backbone_models/torchscript_model_0_66_37_wo_gl.pth"
+DEFAULT_PREDICTOR = "shape_predictor_68_face_landmarks.dat"
 
 # --- Transform for model input (224x224 RGB) ---
 transform = transforms.Compose([
@@ -30,86 +26,373 @@ transform = transforms.Compose([
                          [0.229, 0.224, 0.225])
 ])
 
-# --- Setup webcam ---
-cap = cv2.VideoCapture(0, cv2.CAP_AVFOUNDATION)
-if not cap.isOpened():
-    print("Error: Cannot access webcam")
-    exit()
 
-# --- CSV logging setup ---
-os.makedirs("logs", exist_ok=True)
-csv_path = os.path.join("logs", "emotion_log.csv")
+class LatestSlot:
+    """
+    Single-item handoff between threads where the newest value wins.
 
-if not os.path.exists(csv_path):
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "emotion"])
+    Producers never block; a slow consumer simply skips the values it missed.
+    """
 
-# --- Emotion history buffer ---
-emotion_history = []
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self._closed = False
 
-# --- Main loop ---
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self._seq += 1
+            self._cond.notify_all()
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = detector(gray)
+    def get_newer(self, seq, timeout=None):
+        """Wait for a value newer than seq. Returns (seq, value), or (seq, None) on timeout/close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout)
+            if self._seq > seq:
+                return self._seq, self._value
+            return seq, None
 
-    for face in faces:
-        # Get landmarks
-        shape = predictor(gray, face)
+    def peek(self):
+        with self._cond:
+            return self._seq, self._value
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StageStats:
+    """Frame counter with a rate, shared by the pipeline stages."""
+
+    def __init__(self):
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a camera or video file and publishes the latest one."""
+
+    def __init__(self, cap, frames, max_frames=0, pace=False):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.frames = frames
+        self.max_frames = max_frames
+        # Video files are read much faster than real time; pacing replays them at their native rate
+        self.frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0) if pace else 0.0
+        self.stats = StageStats()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        next_due = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.stats.tick()
+                self.frames.put((self.stats.count, frame))
+                if self.max_frames and self.stats.count >= self.max_frames:
+                    break
+                if self.frame_interval:
+                    next_due += self.frame_interval
+                    delay = next_due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            self.frames.close()
+
+
+class InferenceThread(threading.Thread):
+    """
+    Runs face detection, landmarks and emotion classification on the newest frame.
+
+    Frames that arrive while a frame is being processed are skipped, so
+    inference never falls behind capture. A frame that fails is counted in
+    ``errors`` and skipped too; the thread carries on with the next one.
+    """
+
+    def __init__(self, frames, results, model, labels, detector, predictor, csv_writer, detect_scale=1.0):
+        super().__init__(name="inference", daemon=True)
+        self.frames = frames
+        self.results = results
+        self.model = model
+        self.labels = labels
+        self.detector = detector
+        self.predictor = predictor
+        self.csv_writer = csv_writer
+        self.detect_scale = detect_scale
+        self.stats = StageStats()
+        self.latency = deque(maxlen=200)
+        self.errors = 0
+
+    def process(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        # HOG detection cost grows with pixel count; detect on a downscaled copy
+        if self.detect_scale != 1.0:
+            small = cv2.resize(gray, None, fx=self.detect_scale, fy=self.detect_scale)
+            rects = [
+                dlib.rectangle(int(r.left() / self.detect_scale), int(r.top() / self.detect_scale),
+                               int(r.right() / self.detect_scale), int(r.bottom() / self.detect_scale))
+                for r in self.detector(small)
+            ]
+        else:
+            rects = list(self.detector(gray))
+
+        faces, tensors = [], []
+        for face in rects:
+            # Crop & preprocess face
+            x1, y1 = max(0, face.left()), max(0, face.top())
+            x2, y2 = face.right(), face.bottom()
+            face_crop = frame[y1:y2, x1:x2]
+            if face_crop.size == 0:
+                continue  # skip if invalid crop
 
-        # Crop & preprocess face
-        x1, y1 = face.left(), face.top()
-        x2, y2 = face.right(), face.bottom()
-        face_crop = frame[y1:y2, x1:x2]
+            landmarks = None
+            if self.predictor is not None:
+                shape = self.predictor(gray, face)
+                landmarks = [(shape.part(i).x, shape.part(i).y) for i in range(68)]
 
-        if face_crop.size == 0:
-            continue  # skip if invalid crop
+            face_pil = Image.fromarray(cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB))
+            tensors.append(transform(face_pil))
+            faces.append({"box": (x1, y1, x2, y2), "landmarks": landmarks})
 
-        face_pil = Image.fromarray(cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB))
-        input_tensor = transform(face_pil).unsqueeze(0)
+        # Predict emotion for all faces in one forward pass
+        if tensors:
+            with torch.no_grad():
+                preds = torch.argmax(self.model(torch.stack(tensors)), dim=1).tolist()
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for face, pred in zip(faces, preds):
+                face["emotion"] = self.labels[pred]
+                self.csv_writer.write([timestamp, face["emotion"]])
+        return faces
 
-        # Predict emotion
-        with torch.no_grad():
-            output = model(input_tensor)
-            pred = torch.argmax(output, dim=1).item()
-            emotion = labels[pred]
+    def run(self):
+        seq = 0
+        try:
+            while True:
+                seq, item = self.frames.get_newer(seq, timeout=0.5)
+                if item is None:
+                    if self.frames.closed:
+                        break
+                    continue
+                frame_no, frame = item
+                start = time.perf_counter()
+                try:
+                    faces = self.process(frame)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"inference: frame {frame_no} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                    continue
+                self.latency.append(time.perf_counter() - start)
+                self.stats.tick()
+                self.results.put((frame_no, faces))
+        finally:
+            self.results.close()
+
+
+class CSVWriterThread(threading.Thread):
+    """Appends rows to the CSV log from a background thread, flushing in batches."""
+
+    def __init__(self, path, flush_interval=1.0, batch_size=256):
+        super().__init__(name="csv-writer", daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self._sentinel = object()
+
+    def write(self, row):
+        self.queue.put_nowait(row)
+
+    def close(self):
+        self.queue.put(self._sentinel)
+        self.join()
+
+    def run(self):
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["timestamp", "emotion"])
+            done = False
+            while not done:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        row = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if row is self._sentinel:
+                        done = True
+                        break
+                    batch.append(row)
+                if batch:
+                    writer.writerows(batch)
+                    f.flush()
+
+
+def draw(frame, faces):
+    for face in faces:
+        x1, y1, x2, y2 = face["box"]
 
         # Draw face landmarks
-        for i in range(68):
-            x, y = shape.part(i).x, shape.part(i).y
-            cv2.circle(frame, (x, y), 1, (0, 255, 0), -1)
+        if face["landmarks"]:
+            for x, y in face["landmarks"]:
+                cv2.circle(frame, (x, y), 1, (0, 255, 0), -1)
 
         # Draw bounding box and label
         cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-        cv2.putText(frame, emotion, (x1, y1 - 10),
+        cv2.putText(frame, face.get("emotion", ""), (x1, y1 - 10),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        # --- Log to CSV ---
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(csv_path, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, emotion])
 
-        # --- Track emotion trends ---
-        emotion_history.append(emotion)
-        if len(emotion_history) > 100:
-            emotion_history.pop(0)
+def render_loop(frames, results, headless, writer=None):
+    """
+    Draw the most recent inference result on every captured frame.
+
+    Runs on the main thread because HighGUI windows must be driven from it on
+    macOS. Display rate follows capture, not inference.
+    """
+    stats = StageStats()
+    emotion_history = deque(maxlen=100)
+    result_seq, faces = 0, []
+    frame_seq = 0
+    last_report = time.perf_counter()
+
+    while True:
+        frame_seq, item = frames.get_newer(frame_seq, timeout=0.5)
+        if item is None:
+            if frames.closed:
+                break
+            continue
+        _, frame = item
+
+        # Overlay the newest available result, even if it belongs to an earlier frame
+        seq, latest = results.peek()
+        if seq != result_seq and latest is not None:
+            result_seq, (_, faces) = seq, latest
+            emotion_history.extend(face["emotion"] for face in faces if "emotion" in face)
+
+        frame = frame.copy()
+        draw(frame, faces)
+        stats.tick()
+
+        # Print top 3 recent emotions once per second
+        now = time.perf_counter()
+        if now - last_report >= 1.0:
+            last_report = now
+            print("Recent dominant emotions:", Counter(emotion_history).most_common(3))
+
+        if writer is not None:
+            writer.write(frame)
+        if not headless:
+            # Display the frame
+            cv2.imshow("Facial Landmark + Emotion Recognition", frame)
+
+            # Exit on 'q'
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    return stats
+
+
+def open_source(source):
+    if source.isdigit():
+        index = int(source)
+        # AVFoundation is the reliable backend on macOS
+        cap = cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION) if sys.platform == "darwin" else cv2.VideoCapture(index)
+        return cap, False
+    return cv2.VideoCapture(source), True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webcam / video facial landmark + emotion recognition")
+    parser.add_argument("--source", default="0", help="Camera index or path to a video file")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="TorchScript emotion model")
+    parser.add_argument("--predictor", default=DEFAULT_PREDICTOR, help="dlib 68-point shape predictor ('' to skip landmarks)")
+    parser.add_argument("--labels", default="labels.txt", help="Emotion labels, one per line in model output order")
+    parser.add_argument("--log-csv", default=os.path.join("logs", "emotion_log.csv"), help="CSV log of detected emotions")
+    parser.add_argument("--headless", action="store_true", help="Don't open a window (benchmarks, servers)")
+    parser.add_argument("--output", help="Write the annotated video to this file")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after this many captured frames")
+    parser.add_argument("--no-pace", action="store_true", help="Read video files as fast as possible instead of at their frame rate")
+    parser.add_argument("--detect-scale", type=float, default=1.0,
+                        help="Scale of the frame used for face detection; below 1.0 trades small or distant faces for speed")
+    args = parser.parse_args()
+
+    # --- Load face detector and shape predictor ---
+    detector = dlib.get_frontal_face_detector()
+    predictor = dlib.shape_predictor(args.predictor) if args.predictor else None
+
+    # --- Load TorchScript emotion model ---
+    model = torch.jit.load(args.model)
+    model.eval()
+
+    # --- Load emotion labels (same order as model output) ---
+    with open(args.labels, "r") as f:
+        labels = [line.strip() for line in f.readlines()]
+
+    # --- Setup capture ---
+    cap, is_file = open_source(args.source)
+    if not cap.isOpened():
+        print(f"Error: Cannot open video source {args.source}")
+        sys.exit(1)
+
+    # --- CSV logging setup ---
+    os.makedirs(os.path.dirname(args.log_csv) or ".", exist_ok=True)
+    csv_writer = CSVWriterThread(args.log_csv)
+
+    video_writer = None
+    if args.output:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        video_writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+    frames, results = LatestSlot(), LatestSlot()
+    capture = CaptureThread(cap, frames, args.max_frames, pace=is_file and not args.no_pace)
+    inference = InferenceThread(frames, results, model, labels, detector, predictor, csv_writer, args.detect_scale)
 
-    # Print top 3 recent emotions
-    top_emotions = Counter(emotion_history).most_common(3)
-    print("Recent dominant emotions:", top_emotions)
+    csv_writer.start()
+    inference.start()
+    capture.start()
+    try:
+        render_stats = render_loop(frames, results, args.headless, video_writer)
+    except KeyboardInterrupt:
+        render_stats = None
+    finally:
+        # Cleanup
+        capture.stop_event.set()
+        capture.join()
+        inference.join()
+        csv_writer.close()
+        cap.release()
+        if video_writer is not None:
+            video_writer.release()
+        cv2.destroyAllWindows()
 
-    # Display the frame
-    cv2.imshow("Facial Landmark + Emotion Recognition", frame)
+    latency = sorted(inference.latency)
+    p50 = latency[len(latency) // 2] * 1000 if latency else 0.0
+    print(f"capture:   {capture.stats.count} frames, {capture.stats.fps():.1f} fps")
+    print(f"inference: {inference.stats.count} frames, {inference.stats.fps():.1f} fps, p50 {p50:.1f} ms, "
+          f"{inference.errors} failed")
+    if render_stats is not None:
+        print(f"render:    {render_stats.count} frames, {render_stats.fps():.1f} fps")
 
-    # Exit on 'q'
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
 
-# Cleanup
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
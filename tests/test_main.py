@@ -0,0 +1,141 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+LABELS = ["neutral", "happy", "sad"]
+
+
+class Rect:
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def left(self):
+        return self._box[0]
+
+    def top(self):
+        return self._box[1]
+
+    def right(self):
+        return self._box[2]
+
+    def bottom(self):
+        return self._box[3]
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+class Shape:
+    def part(self, i):
+        return Point(i, i)
+
+
+def detector(gray):
+    """One face in the top left corner; a frame whose first pixel is white breaks detection."""
+    if gray[0, 0] == 255:
+        raise RuntimeError("detector failed")
+    return [Rect(0, 0, 40, 40)]
+
+
+def predictor(gray, face):
+    return Shape()
+
+
+def model(batch):
+    logits = torch.zeros((len(batch), len(LABELS)))
+    logits[:, 1] = 1.0
+    return logits
+
+
+class Rows:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+
+@pytest.fixture
+def main(monkeypatch):
+    """The live demo module, with dlib stubbed where it is not installed.
+
+    The tests drive InferenceThread with stand-in detectors, so all main needs
+    from dlib is its rectangle type.
+    """
+    try:
+        importlib.import_module("dlib")
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "dlib", types.SimpleNamespace(rectangle=Rect))
+        monkeypatch.delitem(sys.modules, "main", raising=False)
+    return importlib.import_module("main")
+
+
+def _frame(broken=False):
+    frame = np.full((120, 160, 3), 90, np.uint8)
+    if broken:
+        frame[0, 0] = 255
+    return frame
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_latest_slot_hands_over_the_newest_value(main):
+    slot = main.LatestSlot()
+    slot.put("a")
+    slot.put("b")
+    assert slot.get_newer(0, timeout=1) == (2, "b")
+    assert slot.get_newer(2, timeout=0.01) == (2, None)
+    threading.Timer(0.05, slot.close).start()
+    assert slot.get_newer(2, timeout=5) == (2, None)
+    assert slot.closed
+
+
+def test_inference_survives_a_failing_frame(main):
+    frames, results, rows = main.LatestSlot(), main.LatestSlot(), Rows()
+    inference = main.InferenceThread(frames, results, model, LABELS, detector, predictor, rows)
+    inference.start()
+
+    frames.put((1, _frame()))
+    seq, (frame_no, faces) = results.get_newer(0, timeout=5)
+    assert frame_no == 1
+    assert faces[0]["box"] == (0, 0, 40, 40) and faces[0]["emotion"] == "happy"
+    assert len(faces[0]["landmarks"]) == 68
+
+    frames.put((2, _frame(broken=True)))
+    _wait_for(lambda: inference.errors == 1)
+    assert inference.is_alive() and not results.closed
+
+    frames.put((3, _frame()))
+    seq, (frame_no, faces) = results.get_newer(seq, timeout=5)
+    assert frame_no == 3 and faces[0]["emotion"] == "happy"
+
+    frames.close()
+    inference.join(timeout=5)
+    assert not inference.is_alive() and results.closed
+    assert inference.stats.count == 2
+    assert [row[1] for row in rows.rows] == ["happy", "happy"]
+
+
+def test_downscaled_detection_maps_boxes_back(main):
+    frames, results = main.LatestSlot(), main.LatestSlot()
+    inference = main.InferenceThread(frames, results, model, LABELS, detector, None, Rows(), detect_scale=0.5)
+    inference.start()
+    frames.put((1, _frame()))
+    _, (_, faces) = results.get_newer(0, timeout=5)
+    frames.close()
+    inference.join(timeout=5)
+    assert faces[0]["box"] == (0, 0, 80, 80)